@@ -0,0 +1,286 @@
+"""Benchmarks de las rutas críticas: puerto serie, movimiento y cámara.
+
+Se ejecuta sin hardware, contra el GRBL virtual (tools/grbl_virtual.py) y una
+fuente de frames sintética o un vídeo, y escribe los resultados en JSON con
+percentiles para compararlos entre versiones:
+
+    python app/benchmark.py --output bench.json
+    python app/benchmark.py --video prueba.avi --ui-seconds 20
+
+Las pruebas de cámara y de interfaz necesitan Kivy y una ventana; si no están
+disponibles se marcan como omitidas.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tools.cnc import CNCController  # noqa: E402
+from tools.estimador import MotionEstimator  # noqa: E402
+from tools.grbl_virtual import VirtualGrbl  # noqa: E402
+
+
+def percentiles(samples, scale=1000.0):
+    """Resumen de una lista de tiempos en segundos, en milisegundos por defecto."""
+    values = np.asarray(samples, dtype=np.float64) * scale
+    if values.size == 0:
+        return {"count": 0}
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+class SyntheticCapture:
+    """Fuente de frames con la interfaz de cv2.VideoCapture.
+
+    Repite un vídeo en bucle o genera frames con una barra en movimiento, y
+    los entrega al ritmo de `fps` como una cámara real.
+    """
+
+    def __init__(self, width=1280, height=720, fps=30, video=None):
+        self.fps = fps
+        self._frames = []
+        if video is not None:
+            source = cv2.VideoCapture(video)
+            while len(self._frames) < 300:
+                ret, frame = source.read()
+                if not ret:
+                    break
+                self._frames.append(frame)
+            source.release()
+            if not self._frames:
+                raise ValueError(f"No se pudo leer el vídeo {video}")
+        else:
+            base = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+            for i in range(30):
+                frame = base.copy()
+                x = i * width // 30
+                frame[:, x:x + width // 30] = 255
+                self._frames.append(frame)
+        self._index = 0
+        self._next = time.monotonic()
+        self._opened = True
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self):
+        if not self._opened:
+            return False, None
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._next = max(self._next + 1.0 / self.fps, time.monotonic() - 1.0 / self.fps)
+        frame = self._frames[self._index % len(self._frames)]
+        self._index += 1
+        return True, frame
+
+    def release(self):
+        self._opened = False
+
+
+def _connected(time_scale=1.0):
+    grbl = VirtualGrbl(time_scale=time_scale)
+    cnc = CNCController([grbl.start()])
+    cnc.connect()
+    cnc.go_home()
+    return grbl, cnc
+
+
+def bench_connect(runs):
+    """Tiempo desde connect() hasta tener GRBL configurado y listo: abrir y
+    probar los puertos, leer el mensaje de bienvenida y aplicar los ajustes.
+    El GRBL virtual arranca sin retardo, así que no incluye el arranque de la
+    placa (el bootloader de un Arduino tarda del orden de un segundo)."""
+    samples = []
+    for _ in range(runs):
+        grbl = VirtualGrbl(boot_time=0.0)
+        cnc = CNCController([grbl.start()])
+        start = time.perf_counter()
+        cnc.connect()
+        samples.append(time.perf_counter() - start)
+        cnc.disconnect()
+        grbl.stop()
+    return {"connect_to_ready": percentiles(samples)}
+
+
+def bench_commands(cnc, samples):
+    """Latencia de ida y vuelta de send_command y comandos por segundo en
+    modo síncrono y en streaming. Se usan líneas sin movimiento para medir
+    solo el protocolo."""
+    rtt = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        cnc.send_command("G90")
+        rtt.append(time.perf_counter() - start)
+    sync_rate = len(rtt) / sum(rtt)
+
+    lines = ["G90"] * samples
+    start = time.perf_counter()
+    cnc.stream_commands(lines)
+    streamed_rate = len(lines) / (time.perf_counter() - start)
+    return {
+        "send_command_rtt": percentiles(rtt),
+        "sync_commands_per_s": sync_rate,
+        "streamed_commands_per_s": streamed_rate,
+    }
+
+
+def bench_settle(cnc, grbl, moves):
+    """Sobrecoste de wait_for_position_reached: tiempo real de cada movimiento
+    menos su duración según el modelo de movimiento del GRBL virtual."""
+    estimator = MotionEstimator.from_settings()
+    overhead = []
+    x = 10.0
+    cnc.move_to(x=x, y=0, z=0)
+    cnc.wait_for_position_reached(x=x, y=0, z=0, timeout=10)
+    for i in range(moves):
+        target = x + (2.0 if i % 2 == 0 else -2.0)
+        expected = estimator.estimate([f"G0 X{target}"], start=(x, 0.0, 0.0))[1] / grbl.time_scale
+        start = time.perf_counter()
+        cnc.move_to(x=target, y=0, z=0)
+        cnc.wait_for_position_reached(x=target, y=0, z=0, timeout=10)
+        overhead.append(time.perf_counter() - start - expected)
+        x = target
+    # Un sobrecoste negativo indica que el emulador y el modelo no coinciden:
+    # las muestras se dan tal cual y las negativas se cuentan y se avisan
+    negative = [value for value in overhead if value < 0]
+    if negative:
+        print(f"Aviso: {len(negative)} movimientos más rápidos que el modelo "
+              f"(hasta {min(negative) * 1000:.1f} ms)")
+    return {
+        "settle_overhead": percentiles(overhead),
+        "settle_negative_samples": len(negative),
+    }
+
+
+def bench_ui(capture, seconds, cnc):
+    """Coste de CameraController.update_frame, fps mostrados y tiempo de frame
+    de la interfaz mientras la CNC hace un recorrido en segundo plano."""
+    try:
+        from kivy.app import App
+        from kivy.clock import Clock
+        from kivy.uix.image import Image
+        from tools.camara import CameraController
+    except ImportError as e:
+        return {"skipped": f"Kivy no disponible: {e}"}
+
+    camera = CameraController()
+    update_costs = []
+    frame_times = []
+    shown = []
+    stop = threading.Event()
+
+    def cnc_activity():
+        i = 0
+        while not stop.is_set():
+            cnc.stream_commands([f"G0 X{20 + (i + k) % 40} Y{20 + (i * 3 + k) % 40}" for k in range(10)])
+            i += 1
+
+    class BenchmarkApp(App):
+        def build(self):
+            self.image = Image()
+            return self.image
+
+        def on_start(self):
+            camera.start_capture(capture)
+            camera._widget = self.image
+            self.started = time.perf_counter()
+            self.last = None
+            Clock.schedule_interval(self.tick, 0)
+            threading.Thread(target=cnc_activity, name="bench-cnc", daemon=True).start()
+
+        def tick(self, dt):
+            now = time.perf_counter()
+            if self.last is not None:
+                frame_times.append(now - self.last)
+            self.last = now
+            before = camera._shown_seq
+            start = time.perf_counter()
+            camera.update_frame(self.image)
+            if camera._shown_seq != before:
+                update_costs.append(time.perf_counter() - start)
+                shown.append(now)
+            if now - self.started > seconds:
+                stop.set()
+                self.stop()
+
+    BenchmarkApp().run()
+    camera.stop_camera()
+    fps = (len(shown) - 1) / (shown[-1] - shown[0]) if len(shown) > 1 else 0.0
+    return {
+        "update_frame_cost": percentiles(update_costs),
+        "displayed_fps": fps,
+        "ui_frame_time": percentiles(frame_times),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de CNC y cámara sin hardware")
+    parser.add_argument("--output", help="Fichero JSON de resultados (por defecto, salida estándar)")
+    parser.add_argument("--samples", type=int, default=500, help="Comandos por prueba de protocolo")
+    parser.add_argument("--connects", type=int, default=5, help="Conexiones medidas")
+    parser.add_argument("--moves", type=int, default=10, help="Movimientos para medir la espera")
+    parser.add_argument("--video", help="Vídeo a usar como cámara en lugar de frames generados")
+    parser.add_argument("--fps", type=float, default=30, help="Fps de la fuente de frames")
+    parser.add_argument("--ui-seconds", type=float, default=10, help="Duración de la prueba de interfaz")
+    parser.add_argument("--skip-ui", action="store_true", help="Omite la prueba de cámara e interfaz")
+    args = parser.parse_args()
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "units": "ms",
+    }
+
+    # Los mensajes de CNCController van a stderr para no mezclarse con el JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        run(args, results)
+
+    text = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text)
+    else:
+        print(text)
+
+
+def run(args, results):
+    print("Midiendo conexión...")
+    results["connect"] = bench_connect(args.connects)
+
+    grbl, cnc = _connected()
+    try:
+        print("Midiendo comandos...")
+        results["commands"] = bench_commands(cnc, args.samples)
+        results["commands"]["rx_overflows"] = grbl.rx_overflows
+        print("Midiendo movimientos...")
+        results["motion"] = bench_settle(cnc, grbl, args.moves)
+        if args.skip_ui:
+            results["ui"] = {"skipped": "--skip-ui"}
+        else:
+            print("Midiendo cámara e interfaz...")
+            capture = SyntheticCapture(fps=args.fps, video=args.video)
+            results["ui"] = bench_ui(capture, args.ui_seconds, cnc)
+    finally:
+        cnc.disconnect()
+        grbl.stop()
+
+
+if __name__ == '__main__':
+    main()
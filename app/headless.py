@@ -0,0 +1,640 @@
+"""API de control sin interfaz gráfica: HTTP y WebSocket sobre asyncio.
+
+Expone las máquinas de machines.json (CNCPool), sus coordenadas y la cámara
+sin la interfaz de Kivy, para automatizar calibraciones o lotes desde otro equipo
+de la línea:
+
+    python app/headless.py --port 8765
+    python app/headless.py --no-camera --no-connect
+
+Rutas HTTP (JSON salvo la imagen):
+
+    GET  /api/machines                     estado de todas las máquinas
+    GET  /api/machines/<m>                 estado de una máquina
+    POST /api/machines/<m>/connect         {"home": true} conecta (y va a home)
+    POST /api/machines/<m>/command         {"command": "G0 X10"} o {"realtime": "hold"}
+    POST /api/machines/<m>/job             G-code en texto, {"lines": [...]} o {"tags": [...]}
+    GET  /api/jobs/<id>                    estado de un trabajo
+    GET  /api/machines/<m>/tags            tags de la máquina
+    PUT  /api/machines/<m>/tags/<tag>      {"location": [x, y, z]}
+    GET  /api/snapshot                     último frame en JPEG
+
+`/ws` es un WebSocket que envía {"machine", "status"} con cada reporte de
+estado (al ritmo del sondeo), sin petición por actualización, y acepta
+{"id", "machine", "command"} con respuesta {"id", "response"}. Escucha en
+127.0.0.1 por defecto: no hay autenticación.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import os
+import struct
+import sys
+import time
+from collections import OrderedDict
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tools.captura import FrameCapture  # noqa: E402
+from tools.maquinas import CNCPool, MACHINES_FILE  # noqa: E402
+from tools.trabajos import JobBuilder  # noqa: E402
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC11B65"
+MAX_BODY = 4 * 1024 * 1024  # Programas G-code grandes caben de sobra
+MAX_WS_MESSAGE = 64 * 1024
+MAX_JOBS = 100  # Trabajos recordados para /api/jobs
+
+STATUS_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+                  405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+                  500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+def status_dict(name, state):
+    """MachineState en un diccionario serializable."""
+    return {
+        "machine": name,
+        "state": state.state,
+        "substate": state.substate,
+        "mpos": list(state.mpos),
+        "wpos": list(state.wpos),
+        "feed": state.feed,
+        "spindle": state.spindle,
+        "planner_free": state.planner_free,
+        "rx_free": state.rx_free,
+        "pins": state.pins,
+        "overrides": list(state.overrides),
+        "age": round(time.monotonic() - state.updated_at, 3) if state.updated_at else None,
+    }
+
+
+def parse_gcode(text):
+    """Líneas de un programa G-code sin comentarios ni líneas vacías."""
+    lines = []
+    for line in text.splitlines():
+        line = line.split(";", 1)[0]
+        while "(" in line and ")" in line:
+            start = line.index("(")
+            line = line[:start] + line[line.index(")", start) + 1:]
+        line = line.strip()
+        if line and not line.startswith("%"):
+            lines.append(line)
+    return lines
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class WebSocket:
+    """Conexión WebSocket (RFC 6455) del lado del servidor sobre streams de asyncio.
+
+    Solo lo necesario para la API: mensajes de texto o binarios, fragmentos,
+    ping/pong y cierre. Los frames del cliente llegan enmascarados; los del
+    servidor se envían sin máscara.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+
+    @staticmethod
+    def accept_key(key):
+        digest = hashlib.sha1((key + WS_GUID).encode()).digest()
+        return base64.b64encode(digest).decode()
+
+    @staticmethod
+    def frame(payload, opcode=0x1):
+        """Frame del servidor (FIN y sin máscara) con `payload` en bytes."""
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+        return header + payload
+
+    @staticmethod
+    def _unmask(payload, mask):
+        # XOR de todo el mensaje de una vez como entero, sin bucle por byte
+        n = len(payload)
+        if not n:
+            return payload
+        key = (mask * (n // 4 + 1))[:n]
+        return (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(n, "big")
+
+    async def send(self, payload, opcode=0x1):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        await self.send_raw(self.frame(payload, opcode))
+
+    async def send_raw(self, frame):
+        if self.closed:
+            return
+        self.writer.write(frame)
+        await self.writer.drain()
+
+    async def _read_frame(self):
+        first, second = await self.reader.readexactly(2)
+        fin, opcode = first & 0x80, first & 0x0F
+        if not second & 0x80:
+            raise HTTPError(400, "Frame del cliente sin máscara")
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", await self.reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", await self.reader.readexactly(8))[0]
+        if length > MAX_WS_MESSAGE:
+            raise HTTPError(413, "Mensaje WebSocket demasiado grande")
+        mask = await self.reader.readexactly(4)
+        payload = self._unmask(await self.reader.readexactly(length), mask)
+        return fin, opcode, payload
+
+    async def receive(self):
+        """Devuelve el siguiente mensaje de datos (str o bytes), o None al cerrarse."""
+        message, message_opcode = b"", None
+        while not self.closed:
+            fin, opcode, payload = await self._read_frame()
+            if opcode == 0x8:  # Cierre: se responde con el mismo código
+                await self.send(payload[:2], 0x8)
+                self.closed = True
+                return None
+            if opcode == 0x9:
+                await self.send(payload, 0xA)
+                continue
+            if opcode == 0xA:
+                continue
+            if opcode in (0x1, 0x2):
+                message, message_opcode = payload, opcode
+            elif opcode == 0x0 and message_opcode is not None:
+                message += payload
+                if len(message) > MAX_WS_MESSAGE:
+                    raise HTTPError(413, "Mensaje WebSocket demasiado grande")
+            else:
+                raise HTTPError(400, f"Opcode WebSocket no válido: {opcode}")
+            if fin:
+                return message.decode() if message_opcode == 0x1 else message
+        return None
+
+    async def close(self, code=1000):
+        if not self.closed:
+            try:
+                await self.send(struct.pack("!H", code), 0x8)
+            except (ConnectionError, OSError):
+                pass
+            self.closed = True
+
+
+class _StatusSubscriber:
+    """Cliente WebSocket suscrito al estado. Guarda solo el último frame de
+    cada máquina: un cliente lento recibe el estado actual, nunca una cola."""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.pending = OrderedDict()  # máquina -> frame ya codificado
+        self.ready = asyncio.Event()
+
+    def push(self, name, frame):
+        self.pending[name] = frame
+        self.pending.move_to_end(name)
+        self.ready.set()
+
+    async def run(self):
+        try:
+            while not self.websocket.closed:
+                await self.ready.wait()
+                self.ready.clear()
+                frames, self.pending = list(self.pending.values()), OrderedDict()
+                for frame in frames:
+                    await self.websocket.send_raw(frame)
+        except (ConnectionError, OSError):
+            self.websocket.closed = True
+
+
+class HeadlessServer:
+    """Servidor HTTP/WebSocket de la API sobre un CNCPool y, opcionalmente, la cámara.
+
+    Los comandos se encolan en el hilo de E/S de cada CNCController y se
+    esperan con `asyncio.wrap_future`, así el bucle de eventos nunca se
+    bloquea esperando a GRBL. Los reportes de estado llegan desde los hilos
+    de E/S, se codifican una sola vez por reporte y se reparten a todos los
+    suscriptores desde el bucle.
+    """
+
+    def __init__(self, pool, camera=None, host="127.0.0.1", port=8765, jpeg_quality=80):
+        self.pool = pool
+        self.camera = camera
+        self.host = host
+        self.port = port
+        self.jpeg_quality = jpeg_quality
+        self._loop = None
+        self._server = None
+        self._subscribers = set()
+        self._tasks = set()  # Conexiones y peticiones WebSocket en curso
+        self._jobs = OrderedDict()  # id -> {"machine", "lines", "future", "submitted"}
+        self._job_ids = itertools.count(1)
+        self.status_pushed = 0  # Reportes repartidos a los clientes
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self.pool.add_listener("status", self._on_status)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        print(f"API sin interfaz en http://{self.host}:{self.port}/ (WebSocket en /ws)")
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        """Cierra los clientes, cancela sus tareas y deja de escuchar."""
+        if self._server is None:
+            return
+        # Tras cerrar el bucle, call_soon_threadsafe fallaría con cada reporte
+        self.pool.remove_listener("status", self._on_status)
+        self._server.close()
+        for subscriber in list(self._subscribers):
+            await subscriber.websocket.close(1001)
+        tasks = [task for task in self._tasks if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._server.wait_closed()
+        self._server = None
+
+    def _track(self, task):
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    # --- Estado ---
+
+    def _on_status(self, name, state):
+        # Hilo de E/S de la máquina: se copia el estado aquí, antes del siguiente reporte
+        if not self._subscribers:
+            return
+        payload = json.dumps({"machine": name, "status": status_dict(name, state)})
+        frame = WebSocket.frame(payload.encode())
+        try:
+            self._loop.call_soon_threadsafe(self._broadcast, name, frame)
+        except RuntimeError:
+            pass  # Bucle ya cerrado: el servidor se está deteniendo
+
+    def _broadcast(self, name, frame):
+        for subscriber in self._subscribers:
+            subscriber.push(name, frame)
+        self.status_pushed += 1
+
+    # --- HTTP ---
+
+    async def _handle(self, reader, writer):
+        self._track(asyncio.current_task())
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                try:
+                    method, path, headers = self._parse_head(head)
+                except HTTPError as e:
+                    self._respond(writer, e.status, "application/json", {"error": str(e)}, False)
+                    await writer.drain()
+                    break
+                if headers.get("upgrade", "").lower() == "websocket":
+                    await self._websocket(reader, writer, path, headers)
+                    break
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    body = await self._read_body(reader, headers)
+                    status, content_type, data = await self._route(method, path, body, headers)
+                except HTTPError as e:
+                    status, content_type, data = e.status, "application/json", {"error": str(e)}
+                except Exception as e:
+                    print(f"Error en la API: {e}")
+                    status, content_type, data = 500, "application/json", {"error": str(e)}
+                self._respond(writer, status, content_type, data, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # Cancelada por stop(): termina sin error, o asyncio.streams
+            # imprime la cancelación como una excepción del callback
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _parse_head(head):
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Línea de petición no válida")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+        return method.upper(), target.split("?", 1)[0], headers
+
+    @staticmethod
+    async def _read_body(reader, headers):
+        length = int(headers.get("content-length", 0) or 0)
+        if length > MAX_BODY:
+            raise HTTPError(413, "Cuerpo demasiado grande")
+        return await reader.readexactly(length) if length else b""
+
+    @staticmethod
+    def _respond(writer, status, content_type, data, keep_alive):
+        if content_type == "application/json":
+            data = json.dumps(data).encode()
+        head = (f"HTTP/1.1 {status} {STATUS_REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                "Cache-Control: no-store\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode() + data)
+
+    @staticmethod
+    def _json(body):
+        if not body:
+            return {}
+        try:
+            return json.loads(body)
+        except ValueError:
+            raise HTTPError(400, "JSON no válido")
+
+    def _machine(self, name):
+        try:
+            return self.pool[name]
+        except KeyError:
+            raise HTTPError(404, f"Máquina desconocida: {name}")
+
+    async def _route(self, method, path, body, headers):
+        parts = [part for part in path.split("/") if part]
+        if parts[:1] != ["api"]:
+            raise HTTPError(404, "Ruta desconocida")
+        parts = parts[1:]
+
+        if parts == ["machines"] and method == "GET":
+            return self._ok([status_dict(m.name, m.cnc.state) for m in self.pool])
+        if parts == ["snapshot"] and method == "GET":
+            return 200, "image/jpeg", self._snapshot()
+        if len(parts) == 2 and parts[0] == "jobs" and method == "GET":
+            return self._ok(self._job_info(parts[1]))
+        if len(parts) < 2 or parts[0] != "machines":
+            raise HTTPError(404, "Ruta desconocida")
+
+        machine = self._machine(parts[1])
+        action = parts[2:]
+        if not action and method == "GET":
+            return self._ok(status_dict(machine.name, machine.cnc.state))
+        if action == ["connect"] and method == "POST":
+            return await self._connect(machine, self._json(body))
+        if action == ["command"] and method == "POST":
+            return self._ok(await self._command(machine, self._json(body)))
+        if action == ["job"] and method == "POST":
+            return await self._job(machine, body, headers)
+        if action == ["tags"] and method == "GET":
+            return self._ok(machine.store.tags)
+        if len(action) == 2 and action[0] == "tags" and method == "PUT":
+            return self._ok(await self._edit_tag(machine, action[1], self._json(body)))
+        raise HTTPError(405 if action in (["connect"], ["command"], ["job"], ["tags"]) else 404,
+                        f"{method} no admitido en {path}")
+
+    @staticmethod
+    def _ok(data):
+        return 200, "application/json", data
+
+    # --- Acciones ---
+
+    async def _connect(self, machine, data):
+        cnc = machine.cnc
+
+        def connect():
+            cnc.connect()
+            if data.get("home"):
+                cnc.go_home()
+
+        await asyncio.wrap_future(cnc.run_in_background(connect))
+        return self._ok(status_dict(machine.name, cnc.state))
+
+    async def _command(self, machine, data):
+        """Envía una línea a GRBL o un comando en tiempo real."""
+        cnc = machine.cnc
+        if not cnc.connected:
+            raise HTTPError(409, f"La máquina {machine.name} no está conectada")
+        realtime = data.get("realtime")
+        if realtime is not None:
+            actions = {"hold": cnc.feed_hold, "resume": cnc.cycle_start,
+                       "reset": cnc.soft_reset, "jog_cancel": cnc.jog_cancel}
+            if realtime not in actions:
+                raise HTTPError(400, f"Comando en tiempo real desconocido: {realtime}")
+            return {"realtime": realtime, "latency": actions[realtime]()}
+        command = str(data.get("command", "")).strip()
+        if not command or "\n" in command:
+            raise HTTPError(400, "Falta 'command' (una sola línea)")
+        try:
+            response = await asyncio.wait_for(asyncio.wrap_future(cnc.submit(command)),
+                                              data.get("timeout", 60))
+        except asyncio.TimeoutError:
+            raise HTTPError(503, f"Sin respuesta de GRBL a '{command}'")
+        except ConnectionError as e:
+            raise HTTPError(409, str(e))
+        return {"command": command, "response": response}
+
+    async def _job(self, machine, body, headers):
+        """Encola un programa en la máquina y devuelve su id sin esperar a que termine."""
+        if not machine.cnc.connected:
+            raise HTTPError(409, f"La máquina {machine.name} no está conectada")
+        if headers.get("content-type", "").startswith("application/json"):
+            data = self._json(body)
+            if "tags" in data:
+                # Recorrido de tags con las alturas y el inventario de la máquina
+                job = JobBuilder(machine.store.data, height_map=machine.height_map)
+                occupancy = machine.occupancy or {}
+                try:
+                    for tag in data["tags"]:
+                        if occupancy.get(tag, True):
+                            job.visit(tag, dwell=data.get("dwell", 0.0),
+                                      pick=data.get("pick", False))
+                    lines = job.build()
+                except KeyError as e:
+                    raise HTTPError(400, f"Tag desconocido: {e}")
+                except ValueError as e:
+                    raise HTTPError(400, str(e))
+            else:
+                lines = [str(line).strip() for line in data.get("lines", []) if str(line).strip()]
+        else:
+            lines = parse_gcode(body.decode(errors="replace"))
+        if not lines:
+            raise HTTPError(400, "El trabajo no tiene líneas")
+
+        job_id = str(next(self._job_ids))
+        future = machine.cnc.run_in_background(machine.cnc.stream_commands, lines)
+        self._jobs[job_id] = {"machine": machine.name, "lines": len(lines), "future": future,
+                              "submitted": time.time()}
+        while len(self._jobs) > MAX_JOBS:
+            self._jobs.popitem(last=False)
+        return 202, "application/json", self._job_info(job_id)
+
+    def _job_info(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise HTTPError(404, f"Trabajo desconocido: {job_id}")
+        future = job["future"]
+        info = {"id": job_id, "machine": job["machine"], "lines": job["lines"],
+                "submitted": job["submitted"]}
+        if not future.done():
+            info["state"] = "running" if future.running() else "queued"
+        elif future.cancelled() or future.exception() is not None:
+            info["state"] = "error"
+            info["error"] = "cancelado" if future.cancelled() else str(future.exception())
+        else:
+            # stream_commands devuelve (línea, respuesta) por cada línea
+            errors = [(line, response) for line, response in future.result() if response != "ok"]
+            info["state"] = "error" if errors else "done"
+            info["errors"] = len(errors)
+            if errors:
+                info["error"] = "{}: {}".format(*errors[0])
+        return info
+
+    async def _edit_tag(self, machine, tag_id, data):
+        location = data.get("location")
+        if (not isinstance(location, list) or len(location) != 3
+                or not all(isinstance(v, (int, float)) for v in location)):
+            raise HTTPError(400, "'location' debe ser [x, y, z]")
+        if machine.store.tag(tag_id) is None:
+            raise HTTPError(404, f"Tag desconocido: {tag_id}")
+        # El guardado hace fsync: fuera del bucle de eventos
+        batch = await self._loop.run_in_executor(
+            None, lambda: machine.store.set_location(tag_id, location, source='api'))
+        return {"tag": machine.store.tag(tag_id), "batch": batch}
+
+    def _snapshot(self):
+        if self.camera is None:
+            raise HTTPError(503, "Cámara no disponible")
+        frame = self.camera.get_latest_frame()[2]
+        if frame is None:
+            raise HTTPError(503, "Sin frames de la cámara")
+        ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise HTTPError(500, "No se pudo codificar el frame")
+        return buffer.tobytes()
+
+    # --- WebSocket ---
+
+    async def _websocket(self, reader, writer, path, headers):
+        key = headers.get("sec-websocket-key")
+        if path != "/ws" or not key:
+            self._respond(writer, 404 if path != "/ws" else 400, "application/json",
+                          {"error": "WebSocket solo en /ws"}, False)
+            await writer.drain()
+            return
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\n"
+                      "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {WebSocket.accept_key(key)}\r\n\r\n").encode())
+        await writer.drain()
+
+        websocket = WebSocket(reader, writer)
+        subscriber = _StatusSubscriber(websocket)
+        # Estado actual de todas las máquinas al conectarse
+        for machine in self.pool:
+            subscriber.push(machine.name, WebSocket.frame(json.dumps(
+                {"machine": machine.name,
+                 "status": status_dict(machine.name, machine.cnc.state)}).encode()))
+        self._subscribers.add(subscriber)
+        sender = self._track(asyncio.ensure_future(subscriber.run()))
+        try:
+            while True:
+                message = await websocket.receive()
+                if message is None:
+                    break
+                self._track(asyncio.ensure_future(self._ws_request(websocket, message)))
+        except HTTPError as e:
+            await websocket.close(1009 if e.status == 413 else 1002)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._subscribers.discard(subscriber)
+            websocket.closed = True
+            subscriber.ready.set()
+            sender.cancel()
+
+    async def _ws_request(self, websocket, message):
+        """Comando recibido por el WebSocket: {"id", "machine", "command" o "realtime"}."""
+        request_id = None
+        try:
+            data = json.loads(message)
+            request_id = data.get("id")
+            reply = await self._command(self._machine(data.get("machine", "")), data)
+        except HTTPError as e:
+            reply = {"error": str(e)}
+        except (ValueError, AttributeError):
+            reply = {"error": "JSON no válido"}
+        reply["id"] = request_id
+        try:
+            await websocket.send(json.dumps(reply))
+        except (ConnectionError, OSError):
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API de control de las CNC sin interfaz gráfica")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--machines", default=MACHINES_FILE, help="archivo machines.json")
+    parser.add_argument("--camera", type=int, default=0, help="índice de la cámara")
+    parser.add_argument("--no-camera", action="store_true")
+    parser.add_argument("--no-connect", action="store_true",
+                        help="no conectar las máquinas al arrancar")
+    parser.add_argument("--home", action="store_true", help="ir a home al conectar")
+    args = parser.parse_args(argv)
+
+    pool = CNCPool.from_file(args.machines)
+    camera = None
+    if not args.no_camera:
+        camera = FrameCapture(camera_id=args.camera)
+        if not camera.start_capture():
+            print("No se pudo abrir la cámara; /api/snapshot no estará disponible")
+            camera = None
+
+    if not args.no_connect:
+        pool.power(True)
+
+        def connect(machine):
+            machine.cnc.connect()
+            if args.home:
+                machine.cnc.go_home()
+
+        def report(future):
+            if future.exception() is not None:
+                print(f"Error al conectar: {future.exception()}")
+
+        pool.run_all(connect, callback=report)
+
+    server = HeadlessServer(pool, camera, args.host, args.port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.power(False)
+        pool.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,30 @@
 import os
 import sys
+import threading
+import time
+
+_start_time = time.perf_counter()  # Para medir el tiempo hasta el primer frame
+
 from kivymd.app import MDApp
 from kivy.uix.screenmanager import ScreenManager
 from kivy.lang import Builder
-from screens import InicioScreen, CalibrarScreen
+from kivy.clock import Clock
+import screens
 from kivy.core.window import Window
 
-class MainApp(MDApp): 
+KV_DIR = "./app/screens/kv"
+
+# Pantallas: nombre -> (clase en el paquete screens, archivo kv). Solo la de
+# inicio se crea al arrancar; el resto, con su kv y sus dependencias (OpenCV,
+# pyserial, GPIO), al navegar a ellas por primera vez.
+SCREENS = {
+    'inicio': ('InicioScreen', 'inicio.kv'),
+    'calibrar': ('CalibrarScreen', 'calibrar.kv'),
+}
+STARTUP_KV = ('login_popup.kv',)
+
+
+class MainApp(MDApp):
     def build(self):
         # Asegurarse de que se pueda importar el módulo Ci24
         sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
@@ -15,17 +33,79 @@ class MainApp(MDApp):
         Window.rotation = 270
         #Window.size = (1024,768)
 
-        self.load_all_kv_files("./app/screens/kv")
+        self._loaded_kv = set()
+        self._preloads = {}
+        for kv_file in STARTUP_KV:
+            self.load_kv_file(kv_file)
 
         sm = ScreenManager()
-        sm.add_widget(InicioScreen(name='inicio'))
-        sm.add_widget(CalibrarScreen(name='calibrar'))
+        self.root = sm
+        self.show_screen('inicio')
+        Window.bind(on_flip=self._on_first_frame)
         return sm
 
-    def load_all_kv_files(self, kv_dir):
-        for kv_file in os.listdir(kv_dir):
-            if kv_file.endswith('.kv'):
-                Builder.load_file(os.path.join(kv_dir, kv_file))
+    def _on_first_frame(self, *args):
+        Window.unbind(on_flip=self._on_first_frame)
+        print(f"Primer frame de la pantalla de inicio en {time.perf_counter() - _start_time:.2f} s")
+
+    def on_stop(self):
+        """Libera el hardware de las pantallas cargadas (Screen no recibe on_stop)."""
+        for name in self._preloads:
+            screen_class = getattr(screens, SCREENS[name][0])
+            release = getattr(sys.modules[screen_class.__module__], 'release_hardware', None)
+            if release is not None:
+                release()
+
+    def load_kv_file(self, kv_file):
+        """Carga un archivo kv una sola vez."""
+        if kv_file not in self._loaded_kv:
+            Builder.load_file(os.path.join(KV_DIR, kv_file))
+            self._loaded_kv.add(kv_file)
+
+    def preload_screen(self, name):
+        """Prepara una pantalla sin crear widgets (p. ej. mientras se escribe
+        el login): importa su módulo y carga su kv en el siguiente frame y abre
+        su hardware en segundo plano."""
+        if name in self._preloads or self.root.has_screen(name):
+            return
+        Clock.schedule_once(lambda dt: self._import_screen(name))
+
+    def _import_screen(self, name):
+        """Importa el módulo de una pantalla y carga su kv en el hilo de Kivy
+        (kivymd y Builder cargan kv al importarse y no son seguros entre
+        hilos); solo `prepare_hardware` (cámara, puertos) va a otro hilo."""
+        if name in self._preloads:
+            return
+        start = time.perf_counter()
+        class_name, kv_file = SCREENS[name]
+        screen_class = getattr(screens, class_name)
+        self.load_kv_file(kv_file)
+        prepare = getattr(sys.modules[screen_class.__module__], 'prepare_hardware', None)
+        if prepare is None:
+            self._preloads[name] = None
+            return
+
+        def preload():
+            prepare()
+            print(f"Pantalla '{name}' preparada en {time.perf_counter() - start:.2f} s")
+
+        thread = threading.Thread(target=preload, name=f"preload-{name}", daemon=True)
+        self._preloads[name] = thread
+        thread.start()
+
+    def show_screen(self, name):
+        """Muestra una pantalla creándola (con su kv) la primera vez. Sin
+        precarga previa se prepara igual que con `preload_screen`."""
+        sm = self.root
+        if not sm.has_screen(name):
+            self._import_screen(name)
+            preload = self._preloads[name]
+            if preload is not None and preload.is_alive():
+                # Los widgets se crean en este hilo cuando termine la precarga
+                Clock.schedule_once(lambda dt: self.show_screen(name), 0.05)
+                return
+            sm.add_widget(getattr(screens, SCREENS[name][0])(name=name))
+        sm.current = name
 
 if __name__ == '__main__':
     MainApp().run()
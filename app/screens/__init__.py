@@ -1,6 +1,19 @@
+import importlib
 
-from .py.inicio import InicioScreen
-from .py.calibrar import CalibrarScreen
-from .py.login_popup import LoginPopup
+# Las pantallas se importan al usarlas por primera vez: calibrar arrastra
+# OpenCV, pyserial y GPIO, que no hacen falta para mostrar la de inicio.
+_MODULES = {
+    'InicioScreen': '.py.inicio',
+    'CalibrarScreen': '.py.calibrar',
+    'LoginPopup': '.py.login_popup',
+}
 
 __all__ = ['InicioScreen', 'CalibrarScreen','LoginPopup']
+
+
+def __getattr__(name):
+    if name in _MODULES:
+        value = getattr(importlib.import_module(_MODULES[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,19 +1,92 @@
 from kivy.uix.screenmanager import Screen
-from kivy.clock import Clock
-from kivy.properties import NumericProperty, StringProperty, ListProperty
+from kivy.clock import Clock, mainthread
+from kivy.properties import NumericProperty, StringProperty, ListProperty, BooleanProperty
 from kivymd.uix.menu import MDDropdownMenu
 from kivy.metrics import dp
+from kivy.vector import Vector
 from kivymd.uix.dialog import MDDialog
 
 from kivymd.uix.button import MDFlatButton 
 from kivy.uix.boxlayout import BoxLayout
 
-import json
-import shutil
+import os
+import threading
 
 from tools.camara import CameraController
 from tools.cnc import CNCController
-from tools.GPIO import GPIOController
+from tools.calibracion import AutoCalibrator, AutoFocus, CameraHomography
+from tools.rutas import TourPlanner, collect_stops
+from tools.trabajos import JobBuilder
+from tools.estimador import MotionEstimator
+from tools.jog import JogController, MoveCoalescer
+from tools.mjpeg import MJPEGServer
+from tools.grabacion import FrameRecorder
+from tools.altura import HeightProber, tag_bounds
+from tools.inventario import InventoryScanner
+from tools.maquinas import CNCPool, MACHINES_FILE
+
+HOMOGRAPHY_FILE = './app/config/camera_homography.json'
+INVENTORY_REFERENCE_FILE = './app/config/inventory_reference.json'
+
+class CalibrarHardware:
+    """Recursos de la pantalla de calibración que tardan en abrirse: cámara y,
+    por cada máquina de machines.json, GPIO, coordenadas y controlador CNC
+    (todavía sin conectar)."""
+
+    def __init__(self):
+        self.pool = CNCPool.from_file(MACHINES_FILE)
+        self.camera = CameraController(camera_id=0)
+        # La captura queda en pausa hasta que se entra en la pantalla (on_enter)
+        self.camera.pause()
+        self.camera.start_capture()
+        self.homography = CameraHomography.load(HOMOGRAPHY_FILE)
+
+        # Últimos segundos de vídeo, guardados al parar, reiniciar, ir a home o
+        # con alarmas de la máquina que lleva la cámara
+        self.recorder = FrameRecorder(self.camera)
+        self.recorder.attach(self.pool.camera_machine.cnc)
+        self.recorder.start()
+
+        # Vista previa opcional con los mismos frames: CNC_MJPEG_PORT=8080. Solo
+        # en esta máquina salvo que se publique a propósito: CNC_MJPEG_HOST=0.0.0.0
+        self.mjpeg = None
+        port = os.environ.get('CNC_MJPEG_PORT')
+        if port:
+            host = os.environ.get('CNC_MJPEG_HOST', '127.0.0.1')
+            self.mjpeg = MJPEGServer(self.camera, host=host, port=int(port))
+            self.mjpeg.start()
+
+
+_hardware = None
+_hardware_lock = threading.Lock()
+
+
+def prepare_hardware():
+    """Abre el hardware de la calibración una sola vez y lo devuelve. Se llama
+    en segundo plano al empezar el login para que la pantalla se cree al instante."""
+    global _hardware
+    with _hardware_lock:
+        if _hardware is None:
+            _hardware = CalibrarHardware()
+    return _hardware
+
+
+def release_hardware():
+    """Cierra lo abierto por `prepare_hardware`. Lo llama MainApp.on_stop."""
+    global _hardware
+    with _hardware_lock:
+        hardware, _hardware = _hardware, None
+    if hardware is None:
+        return
+    hardware.recorder.stop()
+    if hardware.mjpeg is not None:
+        hardware.mjpeg.stop()
+    hardware.camera.stop_camera()
+    for machine in hardware.pool:
+        machine.cnc.disconnect()
+    hardware.pool.power(False)
+    hardware.pool.cleanup()
+
 
 class DistanceDialogContent(BoxLayout):
     pass
@@ -25,36 +98,79 @@ class CalibrarScreen(Screen):
     gpio_controller = None
     selected_tag_location = ListProperty([0.0, 0.0, 0.0])  # Coordenadas del tag seleccionado
     new_location = ListProperty([0.0, 0.0, 0.0])  # Nuevas coordenadas para el movimiento manual
+    machine_position = ListProperty([0.0, 0.0, 0.0])  # Posición real reportada por GRBL
+    machine_state = StringProperty("Desconectada")  # Estado reportado por GRBL
+    machine_name = StringProperty("")  # Máquina seleccionada
+    machines_summary = StringProperty("")  # Estado de todas las máquinas
 
     # Límites de los ejes
-    MAX_X = 200.0
-    MAX_Y = 200.0
-    MIN_Z = -85.0  # Eje Z invertido: home es 0 y el máximo es -85
-    MIN_XY = 0.0  # El mínimo para X e Y es 0
+    MAX_X = CNCController.MAX_X
+    MAX_Y = CNCController.MAX_Y
+    MIN_Z = CNCController.MIN_Z
+    MIN_XY = CNCController.MIN_XY
 
     travel_distance_x_y = NumericProperty(20)  # Valor inicial para X e Y
     travel_distance_z = NumericProperty(10)    # Valor para Z
+    continuous_jog = BooleanProperty(True)  # Flechas: jog mientras se pulsan o pasos fijos
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.dialog = None
+        self.message_dialog = None
         self.update_time()
         Clock.schedule_interval(self.update_time, 1)
 
+        # Cámara, GPIO, JSON y CNC ya abiertos si se precargaron durante el login
+        hardware = prepare_hardware()
+
         # Iniciar cámara con controlador separado
-        self.camera_controller = CameraController(camera_id=0)
+        self.camera_controller = hardware.camera
         self.camera_controller.start_camera(self.ids.camera_image)
 
-        # Cargar los datos del JSON y configurar el menú
-        self.data = {}  # Variable para cargar los datos del JSON
-        self.load_dropdown_items()
-
-        # Conectar con el controlador CNC
-        self.cnc = CNCController(['/dev/ttyUSB0', '/dev/ttyUSB1'])
+        # Relación píxel-máquina para mover tocando la imagen (si ya se calibró)
+        self.homography = hardware.homography
 
-        self.gpio_controller = GPIOController()
+        # Máquinas: la pantalla actúa sobre la seleccionada y resume el resto
+        self.pool = hardware.pool
+        self.pool.add_listener("alarm", self.on_pool_alarm)
+        self.pool.add_listener("status", self.on_pool_status)
+        self._summary = ""
+        self.machine = None
+        self.select_machine(self.pool.names[0])
         self.controladora = True
 
+    def select_machine(self, name):
+        """Cambia la máquina sobre la que actúan los controles de la pantalla."""
+        if self.machine is not None and self.jog.active:
+            self.jog.stop()
+        self.machine = self.pool[name]
+        self.machine_name = name
+
+        # Datos del JSON de la máquina (init, áreas, tags...) para el menú
+        self.store = self.machine.store
+        self.data = self.store.data
+
+        self.cnc = self.machine.cnc
+        self.gpio_controller = self.machine.gpio
+        self.jog = JogController(self.cnc, init_commands=self.data.get('init'))
+        # Las pulsaciones seguidas de las flechas se envían como un solo movimiento
+        self.mover = MoveCoalescer(self.cnc, callback=self.on_cnc_done)
+        self._follow_position = False  # new_location sigue a la máquina durante el jog
+        self.on_cnc_status(self.cnc.state)
+
+    def next_machine(self):
+        """Selecciona la siguiente máquina del grupo."""
+        names = self.pool.names
+        self.select_machine(names[(names.index(self.machine_name) + 1) % len(names)])
+
+    def has_camera(self):
+        """La cámara solo sirve en la máquina que la lleva."""
+        if self.machine.camera:
+            return True
+        self.show_message_dialog(
+            "Cámara", f"La cámara está en la máquina {self.pool.camera_machine.name}.")
+        return False
+
     def modify_travel_distance(self):
         if not self.dialog:
             self.dialog = MDDialog(
@@ -91,10 +207,81 @@ class CalibrarScreen(Screen):
 
         # Cerrar el diálogo
         self.dialog.dismiss()
-        
+
+    def run_cnc(self, func, *args, **kwargs):
+        """Ejecuta una acción de la CNC en segundo plano para no bloquear la UI."""
+        return self.cnc.run_in_background(func, *args, callback=self.on_cnc_done, **kwargs)
+
+    def on_cnc_done(self, future):
+        """Informa en la UI de los errores de una acción de la CNC."""
+        error = future.exception()
+        if error is not None:
+            print(f"Error en la CNC: {error}")
+            self.show_message_dialog("Error CNC", str(error))
+
+    def on_pool_status(self, name, state):
+        """Reporte de cualquier máquina (hilo de E/S de esa máquina)."""
+        if name == self.machine_name:
+            self.on_cnc_status(state)
+        summary = "  ·  ".join(f"{n}: {s}" for n, s in self.pool.summary().items())
+        if summary != self._summary:
+            self._summary = summary
+            self.show_machines_summary(summary)
+
+    @mainthread
+    def show_machines_summary(self, summary):
+        self.machines_summary = summary
+
+    def on_pool_alarm(self, name, line):
+        self.on_cnc_alarm(f"{name}: {line}" if len(self.pool) > 1 else line)
+
+    @mainthread
+    def on_cnc_status(self, state):
+        """Refleja en la UI el último reporte de estado de la CNC."""
+        self.machine_state = state.state
+        self.machine_position = [round(v, 3) for v in state.wpos]
+        if self._follow_position:
+            self.new_location = list(self.machine_position)
+            if not self.jog.active and state.is_idle():
+                self._follow_position = False
+
+    @mainthread
+    def on_cnc_alarm(self, line):
+        """Muestra las alarmas de GRBL recibidas por el hilo de E/S."""
+        print(f"Alarma de GRBL: {line}")
+        self.show_message_dialog("Alarma CNC", line)
+
+    @mainthread
+    def show_message_dialog(self, title, message):
+        if not self.message_dialog:
+            self.message_dialog = MDDialog(
+                title=title,
+                text=message,
+                buttons=[
+                    MDFlatButton(
+                        text="OK",
+                        on_release=lambda *args: self.message_dialog.dismiss()
+                    ),
+                ],
+            )
+        else:
+            self.message_dialog.title = title
+            self.message_dialog.text = message
+        self.message_dialog.open()
+
     def stop_all_movement(self):
         """Detiene todo el movimiento de la CNC"""
-        self.cnc.stop_all() 
+        # Se llama en el hilo de la UI: el feed hold es un byte en tiempo real
+        # que no espera respuesta ni cola de comandos.
+        self.cnc.stop_all()
+
+    def resume_movement(self):
+        """Reanuda el movimiento tras una parada."""
+        self.cnc.cycle_start()
+
+    def reset_cnc(self):
+        """Reinicia GRBL descartando los movimientos pendientes."""
+        self.cnc.soft_reset()
 
     def toggle_zoom(self):
         """Alterna el estado de zoom de la cámara."""
@@ -103,23 +290,28 @@ class CalibrarScreen(Screen):
 
     def on_enter(self):
         """Al entrar en la pantalla de calibración, ir a home."""
+        self.camera_controller.resume()
         if self.controladora:  # Verificar si la variable controladora es True
-            self.gpio_controller.activate_cnc()
-        self.cnc.connect()
-        self.cnc.go_home()
+            self.pool.power(True)
+        # La conexión y el homing tardan segundos: se hacen fuera del hilo de la UI,
+        # en todas las máquinas a la vez
+        self.pool.run_all(self.connect_and_home, callback=self.on_cnc_done)
+
+    def on_leave(self):
+        """La cámara no se lee ni se dibuja mientras la pantalla no se ve."""
+        self.camera_controller.pause()
+
+    def connect_and_home(self, machine):
+        machine.cnc.connect()
+        machine.cnc.go_home()
 
     def update_time(self, *args):
         from datetime import datetime
         self.current_time = datetime.now().strftime("%H:%M:%S")
 
-    def on_stop(self):
-        """Libera los recursos de la cámara al detener la aplicación."""
-        self.camera_controller.stop_camera()
-        self.gpio_controller.cleanup()
-
     def go_back(self):
         self.manager.current = 'inicio'
-        self.gpio_controller.deactivate_cnc()
+        self.pool.power(False)
 
     def show_menu(self, caller):
         """Abre el menú desplegable con los números de tags."""
@@ -147,7 +339,7 @@ class CalibrarScreen(Screen):
         self.menu.dismiss()
 
         # Busca la ubicación en el JSON
-        tag_data = next((tag for tag in self.data['tags'] if str(tag['tag']) == tag_number), None)
+        tag_data = self.store.tag(tag_number)
         if tag_data and 'location' in tag_data:
             location = tag_data['location']
             self.selected_tag_location = location
@@ -158,20 +350,15 @@ class CalibrarScreen(Screen):
             print(f"No se encontró la ubicación para el tag: {tag_number}")
 
     def load_dropdown_items(self):
-        """Carga los ítems del dropdown desde un archivo JSON."""
-        try:
-            with open('./app/config/coordinates_10.json', 'r') as file:
-                self.data = json.load(file)
-        except FileNotFoundError:
-            print("Archivo JSON no encontrado.")
-        except json.JSONDecodeError:
-            print("Error al decodificar el archivo JSON.")
+        """Recarga los ítems del dropdown desde el archivo JSON."""
+        self.store.load()
+        self.data = self.store.data
 
     def move_to_tag(self):
         """Envía las coordenadas del tag seleccionado al CNC para que se mueva a dicha posición."""
         if self.selected_tag_location:
             x, y, z = self.selected_tag_location
-            self.cnc.move_to(x=x, y=y, z=0)  # Mover siempre a Z=0
+            self.run_cnc(self.cnc.move_to, x=x, y=y, z=0)  # Mover siempre a Z=0
             self.new_location = [x, y, 0]
             print(f"Moviendo a la posición del tag: X={x}, Y={y}, Z=0")
         else:
@@ -179,79 +366,261 @@ class CalibrarScreen(Screen):
 
     def save_settings(self):
         print(f"Guardando la nueva ubicación: {self.new_location}")
-
-        # Busca el tag seleccionado en los datos
-        for tag in self.data['tags']:
-            if str(tag['tag']) == self.ids.dropdown_button.text.split(" ")[1]:
-                tag['location'] = self.new_location
-                break
-
-        # Guarda los datos actualizados en el archivo JSON
-        with open('./app/config/coordinates_10.json', 'w') as file:
-            json.dump(self.data, file, indent=4)
-        
-        print("Configuración guardada.")
+        tag = self.selected_tag()
+        if tag is None:
+            print("No se ha seleccionado un tag.")
+            return
+        self.store.set_location(tag['tag'], list(self.new_location))
+
+    def auto_calibrate(self):
+        """Recalibra todos los tags detectando sus marcadores con la cámara."""
+        if not self.has_camera():
+            return
+        store = self.store
+        calibrator = AutoCalibrator(self.cnc, self.camera_controller, homography=self.homography)
+        tags = self.plan_tag_route(self.data.get('tags', []))
+        future = self.run_cnc(calibrator.run, tags)
+        future.add_done_callback(
+            lambda f: self.save_calibration(store, f.result()) if f.exception() is None else None)
+
+    def focus_tag(self):
+        """Enfoca la cámara sobre el tag seleccionado y guarda esa Z en su ubicación."""
+        if not self.has_camera():
+            return
+        tag = self.selected_tag()
+        if tag is None:
+            print("No se ha seleccionado un tag.")
+            return
+        x, y, z = tag['location']
+        # La máquina seleccionada puede cambiar antes de que termine el enfoque
+        cnc, store = self.cnc, self.store
+        focus = AutoFocus(cnc, self.camera_controller, z_range=(z - 15, z + 15))
+
+        def run():
+            cnc.move_to(z=0)
+            cnc.move_to(x=x, y=y)
+            return focus.run()
+
+        future = self.run_cnc(run)
+        future.add_done_callback(
+            lambda f: self.save_focus(store, tag['tag'], [x, y, round(f.result(), 2)])
+            if f.exception() is None else None)
+
+    @mainthread
+    def save_focus(self, store, tag_id, location):
+        store.set_location(tag_id, location, source='enfoque')
+        self.new_location = list(location)
+        self.show_message_dialog("Enfoque", f"Tag {tag_id}: Z={location[2]} guardada.")
+
+    def plan_tag_route(self, tags):
+        """Ordena los tags para recorrerlos en el menor tiempo de máquina."""
+        planner = TourPlanner.from_settings(self.data.get('init'))
+        by_id = {tag['tag']: tag for tag in tags}
+        stops, before, after = planner.plan(collect_stops({'tags': tags}, include_areas=False),
+                                            start=self.cnc.state.wpos[:2])
+        print(f"Recorrido de {len(stops)} tags: {before:.1f} s -> {after:.1f} s estimados")
+        return [by_id[name] for name, _ in stops]
+
+    def run_tag_tour(self):
+        """Recorre todos los tags en un único programa transmitido a GRBL."""
+        job = JobBuilder(self.data, height_map=self.machine.height_map)
+        tags = self.data.get('tags', [])
+        occupancy = self.machine.occupancy
+        if occupancy is not None:
+            # Solo se visitan las posiciones con placa
+            tags = [tag for tag in tags if occupancy.get(tag['tag'], True)]
+        for tag in self.plan_tag_route(tags):
+            job.visit(tag['tag'])
+        if 'delivery_area' in self.data:
+            job.move_to_point(self.data['delivery_area'])
+        try:
+            program = job.build()
+        except ValueError as e:
+            self.show_message_dialog("Programa no válido", str(e))
+            return
+        estimator = MotionEstimator.from_settings(self.data.get('init'))
+        _, total = estimator.estimate(program, start=self.cnc.state.wpos)
+        print(f"Programa de {len(program)} líneas, duración estimada {total:.1f} s")
+        self.run_cnc(self.cnc.stream_commands, program)
+
+    def map_heights(self):
+        """Mide la superficie bajo los tags y guarda el mapa de alturas."""
+        machine = self.machine
+        prober = HeightProber(self.cnc, tag_bounds(self.data))
+        future = self.run_cnc(prober.run)
+        future.add_done_callback(
+            lambda f: self.save_height_map(machine, f.result()) if f.exception() is None else None)
+
+    @mainthread
+    def save_height_map(self, machine, height_map):
+        machine.height_map = height_map
+        height_map.save(machine.height_map_file)
+        z = height_map.z
+        self.show_message_dialog(
+            "Mapa de alturas",
+            f"Mapa guardado: Z entre {z.min():.2f} y {z.max():.2f} mm.")
+
+    def scan_inventory(self):
+        """Comprueba con la cámara qué posiciones tienen placa. La primera vez,
+        con el tablero vacío, guarda la referencia."""
+        if not self.has_camera():
+            return
+        if self.homography is None:
+            self.show_message_dialog("Inventario", "Primero hay que calibrar la cámara.")
+            return
+        reference = InventoryScanner.load_reference(INVENTORY_REFERENCE_FILE)
+        scanner = InventoryScanner(self.cnc, self.camera_controller, self.homography,
+                                   self.data.get('tags', []), reference=reference)
+        if reference is None:
+            future = self.run_cnc(scanner.capture_reference)
+            future.add_done_callback(
+                lambda f: self.save_inventory_reference(f.result()) if f.exception() is None else None)
+        else:
+            machine = self.machine
+            future = self.run_cnc(scanner.scan)
+            future.add_done_callback(
+                lambda f: self.show_inventory(machine, f.result()) if f.exception() is None else None)
+
+    @mainthread
+    def save_inventory_reference(self, reference):
+        InventoryScanner.save_reference(reference, INVENTORY_REFERENCE_FILE)
+        self.show_message_dialog(
+            "Inventario", f"Referencia del tablero vacío guardada ({len(reference)} posiciones).")
+
+    @mainthread
+    def show_inventory(self, machine, occupancy):
+        machine.occupancy = occupancy
+        empty = sorted(tag for tag, present in occupancy.items() if not present)
+        self.show_message_dialog(
+            "Inventario",
+            f"{len(occupancy) - len(empty)} posiciones con placa."
+            + (f" Vacías: {', '.join(map(str, empty))}" if empty else ""))
+
+    def calibrate_camera(self):
+        """Ajusta la homografía píxel-máquina con el tag seleccionado (o el primero)."""
+        if not self.has_camera():
+            return
+        tag = self.selected_tag() or next(iter(self.data.get('tags', [])), None)
+        if tag is None:
+            return
+        tool_offset = self.data.get('calibration', {}).get('tags', [0, 0, 0])[:2]
+        calibrator = AutoCalibrator(self.cnc, self.camera_controller)
+        future = self.run_cnc(calibrator.fit_homography, tag, tool_offset=tool_offset)
+        future.add_done_callback(
+            lambda f: self.save_homography(f.result()) if f.exception() is None else None)
+
+    @mainthread
+    def save_homography(self, homography):
+        self.homography = homography
+        homography.save(HOMOGRAPHY_FILE)
+        self.show_message_dialog("Calibración de cámara", "Homografía guardada.")
+
+    def on_camera_touch_down(self, widget, touch):
+        """Reserva los toques que empiezan en la imagen (no en el botón de zoom)."""
+        if widget.collide_point(*touch.pos) and not self.ids.camera_zoom.collide_point(*touch.pos):
+            touch.grab(widget)
+        return False
+
+    def on_camera_touch(self, widget, touch):
+        """Mueve la máquina al punto tocado en la imagen de la cámara. Solo
+        cuentan las pulsaciones que empezaron y terminan en la imagen sin
+        arrastrar: ni el botón de zoom ni un deslizamiento del menú."""
+        if touch.grab_current is not widget:
+            return False
+        touch.ungrab(widget)
+        if (not widget.collide_point(*touch.pos) or self.ids.camera_zoom.collide_point(*touch.pos)
+                or Vector(touch.pos).distance(touch.opos) > dp(20)
+                or self.homography is None or not self.machine.camera):
+            return False
+        pixel = self.camera_controller.widget_to_image(*touch.pos)
+        if pixel is None:
+            return False
+
+        x, y = self.homography.target_for_pixel(*pixel, self.cnc.state.wpos)
+        target = self.mover.move_to(x=x, y=y)
+        x, y = target['X'], target['Y']
+        self.new_location = [x, y, self.new_location[2]]
+        print(f"Moviendo al punto tocado: X={x}, Y={y}")
+        return True
+
+    def selected_tag(self):
+        """Datos del tag elegido en el desplegable, o None."""
+        parts = self.ids.dropdown_button.text.split(" ")
+        if len(parts) < 2:
+            return None
+        return self.store.tag(parts[1])
+
+    @mainthread
+    def save_calibration(self, store, corrections):
+        """Aplica y guarda en un solo lote las ubicaciones corregidas."""
+        if not corrections:
+            self.show_message_dialog("Autocalibración", "No se detectó ningún tag.")
+            return
+        store.update_locations(corrections, source='autocalibración')
+        self.show_message_dialog(
+            "Autocalibración",
+            f"{len(corrections)} de {len(store.data.get('tags', []))} tags recalibrados.")
 
     def go_home(self):
-        self.cnc.go_home()
+        self.run_cnc(self.cnc.go_home)
         self.new_location = [0.0, 0.0, 0.0]
 
-    def reset_coordinates(self):
-        """Restablece las coordenadas copiando el contenido del archivo JSON backup."""
-        backup_file = './app/config/coordinates_10 copy.json'
-        target_file = './app/config/coordinates_10.json'
-        try:
-            shutil.copyfile(backup_file, target_file)
-            print(f"Coordenadas restablecidas desde {backup_file}")
-        except Exception as e:
-            print(f"Error al restablecer coordenadas: {e}")
+    def undo_coordinates(self):
+        """Deshace el último cambio de coordenadas; cada pulsación retrocede
+        un lote más en el historial."""
+        batch = self.store.undo()
+        if batch is None:
+            print("No hay cambios de coordenadas que deshacer.")
+            return
+        number, when, source, count = batch
+        print(f"Deshecho el lote {number} ({source}, {when}, {count} tags)")
+
+    # Jog continuo: las flechas mueven mientras se mantienen pulsadas
+    def start_jog(self, axis, direction):
+        if not self.continuous_jog:
+            return
+        if self.jog.start(axis, direction):
+            self._follow_position = True
+
+    def stop_jog(self, axis, direction):
+        if self.continuous_jog:
+            self.jog.stop()
+            return
+        # Modo por pasos: un movimiento de `travel_distance` al soltar
+        moves = {
+            ('X', 1): self.move_x_positive, ('X', -1): self.move_x_negative,
+            ('Y', 1): self.move_y_positive, ('Y', -1): self.move_y_negative,
+            ('Z', 1): self.move_z_positive, ('Z', -1): self.move_z_negative,
+        }
+        moves[(axis, direction)]()
+
+    def toggle_jog_mode(self):
+        self.continuous_jog = not self.continuous_jog
+        print(f"Modo de movimiento: {'jog continuo' if self.continuous_jog else 'por pasos'}")
 
     # Métodos para mover los ejes manualmente
+    def step_axis(self, axis, delta):
+        """Suma `delta` al destino de un eje. Las pulsaciones rápidas se
+        acumulan en MoveCoalescer y la CNC recibe solo el destino final."""
+        i = "XYZ".index(axis)
+        target = self.mover.move_to(**{axis.lower(): self.new_location[i] + delta})[axis]
+        self.new_location[i] = target
+        print(f"Moviendo eje {axis} a: {target}")
+
     def move_x_positive(self):
-        if self.new_location[0] + self.travel_distance_x_y <= self.MAX_X:
-            self.new_location[0] += self.travel_distance_x_y
-        else:
-            self.new_location[0] = self.MAX_X
-        self.cnc.move_to(x=self.new_location[0])
-        print(f"Moviendo eje X positivo a: {self.new_location[0]}")
+        self.step_axis('X', self.travel_distance_x_y)
 
     def move_x_negative(self):
-        if self.new_location[0] - self.travel_distance_x_y >= self.MIN_XY:
-            self.new_location[0] -= self.travel_distance_x_y
-        else:
-            self.new_location[0] = self.MIN_XY
-        self.cnc.move_to(x=self.new_location[0])
-        print(f"Moviendo eje X negativo a: {self.new_location[0]}")
+        self.step_axis('X', -self.travel_distance_x_y)
 
     def move_y_positive(self):
-        if self.new_location[1] + self.travel_distance_x_y <= self.MAX_Y:
-            self.new_location[1] += self.travel_distance_x_y
-        else:
-            self.new_location[1] = self.MAX_Y
-        self.cnc.move_to(y=self.new_location[1])
-        print(f"Moviendo eje Y positivo a: {self.new_location[1]}")
+        self.step_axis('Y', self.travel_distance_x_y)
 
     def move_y_negative(self):
-        if self.new_location[1] - self.travel_distance_x_y >= self.MIN_XY:
-            self.new_location[1] -= self.travel_distance_x_y
-        else:
-            self.new_location[1] = self.MIN_XY
-        self.cnc.move_to(y=self.new_location[1])
-        print(f"Moviendo eje Y negativo a: {self.new_location[1]}")
+        self.step_axis('Y', -self.travel_distance_x_y)
 
     def move_z_positive(self):
-        if self.new_location[2] + self.travel_distance_z <= 0:  
-            self.new_location[2] += self.travel_distance_z
-        else:
-            self.new_location[2] = 0
-        self.cnc.move_to(z=self.new_location[2])
-        print(f"Moviendo eje Z positivo a: {self.new_location[2]}")
+        self.step_axis('Z', self.travel_distance_z)
 
-    # Mover eje Z negativo
     def move_z_negative(self):
-        if self.new_location[2] - self.travel_distance_z >= self.MIN_Z:
-            self.new_location[2] -= self.travel_distance_z
-        else:
-            self.new_location[2] = self.MIN_Z
-        self.cnc.move_to(z=self.new_location[2])
-        print(f"Moviendo eje Z negativo a: {self.new_location[2]}")
\ No newline at end of file
+        self.step_axis('Z', -self.travel_distance_z)
@@ -1,6 +1,7 @@
 from kivy.uix.screenmanager import Screen
 from kivy.clock import Clock
 from kivy.properties import StringProperty
+from kivymd.app import MDApp
 from .login_popup import LoginPopup
 
 class InicioScreen(Screen):
@@ -16,5 +17,7 @@ class InicioScreen(Screen):
         self.current_time = datetime.now().strftime("%H:%M:%S")
 
     def show_login_popup(self):
+        # Mientras se escriben las credenciales se prepara la calibración
+        MDApp.get_running_app().preload_screen('calibrar')
         login_popup = LoginPopup()
         login_popup.show()
@@ -73,7 +73,7 @@ class LoginPopup:
                     print("Login exitoso")
                     self.dialog.dismiss()
                     app = MDApp.get_running_app()
-                    app.root.current = 'calibrar'
+                    app.show_screen('calibrar')
                 else:
                     print("Credenciales incorrectas")
                     self.dialog.content_cls.ids.username.text = ""
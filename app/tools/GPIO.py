@@ -2,12 +2,26 @@
 # --Control de modulo relé
 # ---- Activar moto bomba
 # ---- Activación de Controladora CNC
-import RPi.GPIO as GPIO
+GPIO = None  # RPi.GPIO, se importa al crear el primer controlador
+
+
+def _load_gpio():
+    """Importa RPi.GPIO la primera vez; fuera de una Raspberry Pi no existe."""
+    global GPIO
+    if GPIO is None:
+        try:
+            import RPi.GPIO as module
+        except (ImportError, RuntimeError) as e:
+            raise RuntimeError(f"RPi.GPIO no disponible: {e}") from e
+        GPIO = module
+    return GPIO
+
 
 class GPIOController:
-    def __init__(self):
-        self.pin_cnc = 22  # Pin para la CNC
+    def __init__(self, pin_cnc=22):
+        self.pin_cnc = pin_cnc  # Pin del relé de la CNC (cada máquina tiene el suyo)
         # Configurar el GPIO
+        _load_gpio()
         GPIO.setmode(GPIO.BCM)
         GPIO.setup(self.pin_cnc, GPIO.OUT)
         self.deactivate_cnc()  # Asegurarse de que la CNC esté desactivada al iniciar
@@ -23,6 +37,6 @@ class GPIOController:
         print(f"CNC desactivada en el pin {self.pin_cnc}")
 
     def cleanup(self):
-        """Limpia los pines GPIO al finalizar."""
-        GPIO.cleanup()
-        print("GPIO limpiado")
+        """Limpia el pin de esta CNC al finalizar, sin tocar los de otras máquinas."""
+        GPIO.cleanup(self.pin_cnc)
+        print(f"GPIO limpiado en el pin {self.pin_cnc}")
@@ -0,0 +1,228 @@
+import json
+import re
+import time
+
+import numpy as np
+
+PRB_PATTERN = re.compile(r"\[PRB:([-\d.]+),([-\d.]+),([-\d.]+):([01])\]")
+
+
+def tag_bounds(data, margin=0.0):
+    """Rectángulo (x0, x1, y0, y1) que cubre todos los tags con su ancho."""
+    tags = data.get('tags', [])
+    if not tags:
+        raise ValueError("No hay tags para delimitar el mapa de alturas")
+    x0 = min(t['location'][0] - t.get('width', 0) / 2 for t in tags) - margin
+    x1 = max(t['location'][0] + t.get('width', 0) / 2 for t in tags) + margin
+    y0 = min(t['location'][1] - t.get('width', 0) / 2 for t in tags) - margin
+    y1 = max(t['location'][1] + t.get('width', 0) / 2 for t in tags) + margin
+    return x0, x1, y0, y1
+
+
+class HeightMap:
+    """Mapa de alturas en una rejilla regular con interpolación bilineal.
+
+    `z[i][j]` es la Z de trabajo de la superficie en (x0 + j·dx, y0 + i·dy).
+    Los coeficientes bilineales de cada celda se calculan una vez al crear el
+    mapa, así que `height(x, y)` es un índice y cuatro multiplicaciones, unos
+    microsegundos, sin tocar la máquina. Fuera de la rejilla se usa el borde.
+    """
+
+    def __init__(self, origin, step, z):
+        self.origin = (float(origin[0]), float(origin[1]))
+        self.step = (float(step[0]), float(step[1]))
+        self.z = np.asarray(z, dtype=np.float64)
+        if self.z.ndim != 2 or min(self.z.shape) < 2:
+            raise ValueError("El mapa de alturas necesita al menos 2x2 puntos")
+        z00, z10 = self.z[:-1, :-1], self.z[:-1, 1:]
+        z01, z11 = self.z[1:, :-1], self.z[1:, 1:]
+        # z = a + b·u + c·v + d·u·v con (u, v) en [0, 1] dentro de la celda
+        self._coefficients = np.stack((z00, z10 - z00, z01 - z00, z11 - z10 - z01 + z00), axis=-1)
+        self._cells = self._coefficients.tolist()  # Listas: más rápidas que numpy para un punto
+
+    @property
+    def bounds(self):
+        rows, cols = self.z.shape
+        return (self.origin[0], self.origin[0] + (cols - 1) * self.step[0],
+                self.origin[1], self.origin[1] + (rows - 1) * self.step[1])
+
+    def height(self, x, y):
+        """Z de la superficie en (x, y), interpolada."""
+        rows, cols = self.z.shape
+        u = (x - self.origin[0]) / self.step[0]
+        v = (y - self.origin[1]) / self.step[1]
+        j = min(max(int(u), 0), cols - 2)
+        i = min(max(int(v), 0), rows - 2)
+        u = min(max(u - j, 0.0), 1.0)
+        v = min(max(v - i, 0.0), 1.0)
+        a, b, c, d = self._cells[i][j]
+        return a + b * u + c * v + d * u * v
+
+    def heights(self, xs, ys):
+        """Versión vectorizada de `height` para arrays de puntos."""
+        rows, cols = self.z.shape
+        u = (np.asarray(xs, dtype=np.float64) - self.origin[0]) / self.step[0]
+        v = (np.asarray(ys, dtype=np.float64) - self.origin[1]) / self.step[1]
+        j = np.clip(np.floor(u).astype(int), 0, cols - 2)
+        i = np.clip(np.floor(v).astype(int), 0, rows - 2)
+        u = np.clip(u - j, 0.0, 1.0)
+        v = np.clip(v - i, 0.0, 1.0)
+        a, b, c, d = np.moveaxis(self._coefficients[i, j], -1, 0)
+        return a + b * u + c * v + d * u * v
+
+    def save(self, path):
+        with open(path, 'w') as file:
+            json.dump({
+                "origin": list(self.origin),
+                "step": list(self.step),
+                "z": np.round(self.z, 3).tolist(),
+            }, file)
+
+    @classmethod
+    def load(cls, path):
+        """Carga el mapa guardado, o devuelve None si no existe."""
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return None
+        except json.JSONDecodeError:
+            print(f"Error al decodificar {path}")
+            return None
+        return cls(data["origin"], data["step"], data["z"])
+
+
+class HeightProber:
+    """Mide la superficie de trabajo en una rejilla adaptativa y crea un HeightMap.
+
+    Se empieza con celdas de `step` mm y se mide el centro de cada una: si se
+    aparta más de `tolerance` de la interpolación de sus esquinas, la celda se
+    divide en cuatro, hasta `levels` veces. Una superficie plana o inclinada se
+    resuelve con la rejilla gruesa y solo se densifica donde cambia (bordes,
+    placas más altas). Los puntos compartidos entre celdas se miden una vez.
+
+    Cada punto se mide con G38.2 (dos toques: uno rápido a `seek_feed` y otro
+    lento a `probe_feed` tras retroceder `backoff`). Entre puntos la máquina
+    viaja a `clearance` mm sobre el último toque, así que `clearance` debe
+    superar el desnivel entre puntos vecinos. Con `measure` se usa otro
+    sensor (p. ej. el láser): se llama con la máquina parada en el punto y
+    debe devolver la Z de trabajo de la superficie.
+    """
+
+    def __init__(self, cnc, bounds, step=40.0, levels=3, tolerance=0.1, min_z=None,
+                 safe_z=0.0, clearance=5.0, seek_feed=600, probe_feed=60, backoff=1.0,
+                 measure=None, timeout=120):
+        self.cnc = cnc
+        x0, x1, y0, y1 = bounds
+        # La zona no sale del recorrido de la máquina
+        x0, x1 = max(x0, cnc.MIN_XY), min(x1, cnc.MAX_X)
+        y0, y1 = max(y0, cnc.MIN_XY), min(y1, cnc.MAX_Y)
+        self.bounds = (x0, x1, y0, y1)
+        self.levels = levels
+        self.tolerance = tolerance  # mm de desviación que obliga a refinar
+        self.min_z = cnc.MIN_Z if min_z is None else min_z  # Fin de carrera del palpado
+        self.safe_z = safe_z
+        self.clearance = clearance
+        self.seek_feed = seek_feed
+        self.probe_feed = probe_feed
+        self.backoff = backoff
+        self.measure = measure
+        self.timeout = timeout
+
+        self._cols = max(1, int(np.ceil((x1 - x0) / step)))
+        self._rows = max(1, int(np.ceil((y1 - y0) / step)))
+        scale = 2 ** levels
+        # Rejilla final: las celdas gruesas son de `scale` unidades de rejilla
+        self._dx = (x1 - x0) / (self._cols * scale)
+        self._dy = (y1 - y0) / (self._rows * scale)
+        self._samples = {}  # (i, j) en unidades de rejilla -> Z medida
+        self._travel_z = None  # Z de viaje tras el último toque
+        self.probes = 0
+
+    def _point(self, i, j):
+        return self.bounds[0] + j * self._dx, self.bounds[2] + i * self._dy
+
+    def _sample(self, i, j):
+        if (i, j) not in self._samples:
+            self._samples[(i, j)] = self.probe(*self._point(i, j))
+        return self._samples[(i, j)]
+
+    def _command(self, command):
+        lines = self.cnc.submit(command).result(self.timeout)
+        if lines[-1] != "ok":
+            raise RuntimeError(f"GRBL rechazó '{command}': {lines[-1]}")
+        return lines
+
+    def _touch(self, target_z, feed):
+        """Baja con G38.2 hasta tocar y devuelve la Z de trabajo del contacto."""
+        for line in self._command(f"G38.2 Z{target_z:.3f} F{feed}"):
+            match = PRB_PATTERN.match(line)
+            if match:
+                if match.group(4) != "1":
+                    raise RuntimeError("El palpador no tocó la superficie")
+                # PRB viene en coordenadas de máquina
+                return float(match.group(3)) - self.cnc.state.wco[2]
+        raise RuntimeError("GRBL no devolvió el resultado del palpado")
+
+    def probe(self, x, y):
+        """Mide la Z de la superficie en (x, y)."""
+        if self._travel_z is None:
+            self._command(f"G0 Z{self.safe_z:.3f}")
+        self._command(f"G0 X{x:.3f} Y{y:.3f}")
+        if self.measure is not None:
+            self._command("G4 P0")  # Espera a que la máquina esté parada
+            z = float(self.measure())
+        else:
+            # Toque rápido desde la Z de viaje y otro lento para la medida
+            z = self._touch(self.min_z, self.seek_feed)
+            self._command(f"G0 Z{z + self.backoff:.3f}")
+            z = self._touch(z - self.backoff, self.probe_feed)
+        self._travel_z = min(z + self.clearance, self.safe_z)
+        self._command(f"G0 Z{self._travel_z:.3f}")
+        self.probes += 1
+        return z
+
+    def _cells(self):
+        """Celdas gruesas en serpentina para acortar los desplazamientos."""
+        scale = 2 ** self.levels
+        for row in range(self._rows):
+            cols = range(self._cols) if row % 2 == 0 else reversed(range(self._cols))
+            for col in cols:
+                yield row * scale, col * scale, scale
+
+    def _refine(self, i, j, size, leaves):
+        corners = [self._sample(i, j), self._sample(i, j + size),
+                   self._sample(i + size, j), self._sample(i + size, j + size)]
+        if size > 1:
+            half = size // 2
+            center = self._sample(i + half, j + half)
+            if abs(center - sum(corners) / 4) > self.tolerance:
+                for di, dj in ((0, 0), (0, half), (half, half), (half, 0)):
+                    self._refine(i + di, j + dj, half, leaves)
+                return
+        leaves.append((i, j, size, corners))
+
+    def run(self):
+        """Mide toda la zona y devuelve el HeightMap resultante."""
+        start = time.monotonic()
+        leaves = []
+        try:
+            for i, j, size in self._cells():
+                self._refine(i, j, size, leaves)
+        finally:
+            self._command(f"G0 Z{self.safe_z:.3f}")
+            self._travel_z = None
+
+        scale = 2 ** self.levels
+        z = np.zeros((self._rows * scale + 1, self._cols * scale + 1))
+        for i, j, size, (z00, z10, z01, z11) in leaves:
+            t = np.linspace(0.0, 1.0, size + 1)
+            u, v = t[np.newaxis, :], t[:, np.newaxis]
+            z[i:i + size + 1, j:j + size + 1] = (z00 * (1 - u) * (1 - v) + z10 * u * (1 - v)
+                                                 + z01 * (1 - u) * v + z11 * u * v)
+        # Los puntos medidos sustituyen a la interpolación de sus celdas
+        for (i, j), value in self._samples.items():
+            z[i, j] = value
+        print(f"Mapa de alturas: {self.probes} puntos medidos, {len(leaves)} celdas, "
+              f"{time.monotonic() - start:.1f} s")
+        return HeightMap((self.bounds[0], self.bounds[2]), (self._dx, self._dy), z)
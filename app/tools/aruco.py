@@ -0,0 +1,89 @@
+import cv2
+import numpy as np
+
+
+class TagDetection:
+    """Marcador ArUco encontrado en un frame, en píxeles del frame completo."""
+
+    def __init__(self, tag_id, corners):
+        self.tag_id = tag_id
+        self.corners = corners  # Array (4, 2) en orden de OpenCV
+        self.center = tuple(corners.mean(axis=0))
+        # Lado medio del cuadrado, útil para estimar la escala mm/píxel
+        self.side = float(np.mean(np.linalg.norm(corners - np.roll(corners, 1, axis=0), axis=1)))
+
+    def __repr__(self):
+        return f"<TagDetection {self.tag_id} centro=({self.center[0]:.1f}, {self.center[1]:.1f})>"
+
+
+class TagDetector:
+    """Detector de marcadores ArUco en dos pasos.
+
+    Primero busca en una versión reducida del frame y después refina el
+    marcador encontrado en una región de interés a resolución completa, con
+    precisión subpíxel en las esquinas.
+    """
+
+    def __init__(self, dictionary=cv2.aruco.DICT_4X4_100, search_width=640, roi_margin=0.5):
+        self.search_width = search_width  # Ancho de la imagen reducida de búsqueda
+        self.roi_margin = roi_margin  # Margen de la ROI, relativo al tamaño del marcador
+        self._dictionary = cv2.aruco.getPredefinedDictionary(dictionary)
+        self._parameters = cv2.aruco.DetectorParameters()
+        # OpenCV >= 4.7 usa ArucoDetector; las versiones anteriores, funciones sueltas
+        if hasattr(cv2.aruco, "ArucoDetector"):
+            self._detector = cv2.aruco.ArucoDetector(self._dictionary, self._parameters)
+        else:
+            self._detector = None
+
+    def _detect_markers(self, gray):
+        if self._detector is not None:
+            corners, ids, _ = self._detector.detectMarkers(gray)
+        else:
+            corners, ids, _ = cv2.aruco.detectMarkers(gray, self._dictionary, parameters=self._parameters)
+        if ids is None:
+            return []
+        return [(int(i), c.reshape(4, 2)) for i, c in zip(ids.flatten(), corners)]
+
+    def detect(self, frame, tag_id=None):
+        """Busca un marcador en un frame BGR o en escala de grises.
+
+        Si se indica `tag_id` solo acepta ese marcador; si no, devuelve el más
+        cercano al centro. Devuelve un TagDetection o None.
+        """
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        h, w = gray.shape
+
+        # Búsqueda rápida sobre la imagen reducida
+        scale = min(1.0, self.search_width / w)
+        small = gray if scale == 1.0 else cv2.resize(gray, None, fx=scale, fy=scale,
+                                                      interpolation=cv2.INTER_AREA)
+        found = [(i, c / scale) for i, c in self._detect_markers(small)
+                 if tag_id is None or i == tag_id]
+        if not found:
+            return None
+        center = np.array([w / 2, h / 2])
+        marker_id, corners = min(found, key=lambda m: np.linalg.norm(m[1].mean(axis=0) - center))
+
+        return self._refine(gray, marker_id, corners)
+
+    def _refine(self, gray, marker_id, corners):
+        """Repite la detección a resolución completa en una ROI alrededor del
+        marcador y ajusta las esquinas con precisión subpíxel."""
+        h, w = gray.shape
+        side = np.ptp(corners, axis=0).max()
+        margin = side * self.roi_margin
+        x0, y0 = np.maximum(corners.min(axis=0) - margin, 0).astype(int)
+        x1, y1 = np.minimum(corners.max(axis=0) + margin, (w, h)).astype(int)
+        roi = gray[y0:y1, x0:x1]
+
+        for i, roi_corners in self._detect_markers(roi):
+            if i == marker_id:
+                corners = roi_corners
+                break
+        else:
+            corners = corners - (x0, y0)  # Se usa la estimación de la imagen reducida
+
+        refined = np.ascontiguousarray(corners, dtype=np.float32).reshape(-1, 1, 2)
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 0.01)
+        cv2.cornerSubPix(roi, refined, (5, 5), (-1, -1), criteria)
+        return TagDetection(marker_id, refined.reshape(4, 2) + (x0, y0))
@@ -0,0 +1,274 @@
+import json
+
+import cv2
+import numpy as np
+
+from .aruco import TagDetector
+
+
+class CameraHomography:
+    """Relación entre píxeles del frame y desplazamientos XY de la máquina.
+
+    La cámara viaja con el cabezal, así que la homografía lleva cada píxel al
+    desplazamiento de máquina que pone ese punto bajo la cruz. Se ajusta en
+    píxeles del frame completo; el zoom se resuelve al convertir el toque en
+    píxel (CameraController.widget_to_image).
+    """
+
+    def __init__(self, matrix, reference_pixel, tool_offset=(0.0, 0.0)):
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+        self.reference_pixel = tuple(reference_pixel)  # Píxel de la cruz
+        self.tool_offset = tuple(tool_offset)  # Desplazamiento XY de calibration.tags
+        self._reference = self._apply(self.matrix, self.reference_pixel)
+
+    @staticmethod
+    def _apply(matrix, pixel):
+        u, v = pixel
+        x, y, w = matrix @ (u, v, 1.0)
+        return np.array((x / w, y / w))
+
+    def pixel_to_offset(self, u, v):
+        """Desplazamiento XY (mm) que lleva el punto del píxel bajo la cruz."""
+        return self._apply(self.matrix, (u, v)) - self._reference
+
+    def target_for_pixel(self, u, v, position):
+        """Destino XY de máquina para el punto visto en un píxel desde `position`."""
+        dx, dy = self.pixel_to_offset(u, v)
+        return (float(position[0] + dx + self.tool_offset[0]),
+                float(position[1] + dy + self.tool_offset[1]))
+
+    def machine_to_pixel(self, x, y, position):
+        """Píxel en el que se ve el punto de máquina (x, y) desde `position`."""
+        offset = np.array((x - position[0] - self.tool_offset[0],
+                           y - position[1] - self.tool_offset[1]))
+        return tuple(self._apply(np.linalg.inv(self.matrix), offset + self._reference))
+
+    @classmethod
+    def fit(cls, observations, reference_pixel, tool_offset=(0.0, 0.0)):
+        """Ajusta la homografía con observaciones (píxel, posición de máquina) de un
+        mismo punto fijo visto desde varias posiciones (al menos cuatro).
+
+        Desde la posición p el punto T se ve en u, así que H(u) - H(ref) = T - p:
+        basta ajustar u -> -p y la constante T queda absorbida en la homografía.
+        """
+        pixels = np.array([o[0] for o in observations], dtype=np.float64)
+        targets = -np.array([o[1] for o in observations], dtype=np.float64)
+        matrix, _ = cv2.findHomography(pixels, targets, 0)
+        if matrix is None:
+            raise ValueError("No se pudo ajustar la homografía")
+        return cls(matrix, reference_pixel, tool_offset)
+
+    def save(self, path):
+        with open(path, 'w') as file:
+            json.dump({
+                "matrix": self.matrix.tolist(),
+                "reference_pixel": list(self.reference_pixel),
+                "tool_offset": list(self.tool_offset),
+            }, file, indent=4)
+
+    @classmethod
+    def load(cls, path):
+        """Carga la homografía guardada, o devuelve None si no existe."""
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return None
+        except json.JSONDecodeError:
+            print(f"Error al decodificar {path}")
+            return None
+        return cls(data["matrix"], data["reference_pixel"], data.get("tool_offset", (0.0, 0.0)))
+
+
+class AutoCalibrator:
+    """Recalibra las ubicaciones de los tags detectando su marcador ArUco.
+
+    Visita cada tag a la altura de la cámara, detecta el marcador en un frame
+    nuevo de CameraController y corrige la ubicación con el desplazamiento del
+    marcador respecto a la cruz, convertido a milímetros. No guarda nada: las
+    correcciones se aplican después en un solo lote (TagStore.update_locations).
+    """
+
+    def __init__(self, cnc, camera, detector=None, camera_z=0, mm_per_pixel=None,
+                 axis_signs=(1, -1), settle_frames=2, max_correction=10.0, homography=None):
+        self.cnc = cnc
+        self.camera = camera
+        self.detector = detector or TagDetector()
+        self.homography = homography  # Si existe, sustituye a la escala y los signos
+        self.camera_z = camera_z  # Z a la que se mira con la cámara
+        # Escala fija; si es None se estima con el tamaño del marcador (ancho del tag)
+        self.mm_per_pixel = mm_per_pixel
+        # Signo de X e Y de máquina respecto a u (derecha) y v (abajo) de la imagen
+        self.axis_signs = axis_signs
+        self.settle_frames = settle_frames  # Frames descartados tras detenerse
+        self.max_correction = max_correction  # Correcciones mayores se descartan (mm)
+
+    def observe(self, tag, x, y):
+        """Mueve la cámara a (x, y) y detecta el marcador del tag en un frame nuevo.
+
+        Devuelve (detección, tamaño del frame) o None si no se encontró.
+        """
+        self.cnc.move_to(x=x, y=y, z=self.camera_z)
+        self.cnc.wait_for_position_reached(x=x, y=y, z=self.camera_z)
+
+        # Frames capturados durante el movimiento pueden llegar con retraso
+        seq = self.camera.get_latest_frame()[0]
+        latest = self.camera.wait_for_frame(after_seq=seq + self.settle_frames, timeout=2)
+        if latest is None:
+            print("No llegan frames de la cámara")
+            return None
+        frame = latest[2]
+
+        detection = self.detector.detect(frame, tag_id=tag['tag'])
+        if detection is None:
+            print(f"Tag {tag['tag']}: marcador no encontrado")
+            return None
+        h, w = frame.shape[:2]
+        return detection, (w, h)
+
+    def cross_pixel(self, size):
+        w, h = size
+        return self.camera.cross_position or (w / 2, h / 2)
+
+    def measure_tag(self, tag):
+        """Mueve la cámara sobre un tag y devuelve (ubicación corregida, error en mm)
+        o None si no se encontró el marcador."""
+        x, y, z = tag['location']
+        observation = self.observe(tag, x, y)
+        if observation is None:
+            return None
+        detection, size = observation
+
+        if self.homography is not None:
+            dx, dy = self.homography.pixel_to_offset(*detection.center)
+        else:
+            cx, cy = self.cross_pixel(size)
+            scale = self.mm_per_pixel or tag.get('width', 20) / detection.side
+            dx = self.axis_signs[0] * (detection.center[0] - cx) * scale
+            dy = self.axis_signs[1] * (detection.center[1] - cy) * scale
+        error = (dx ** 2 + dy ** 2) ** 0.5
+        if error > self.max_correction:
+            print(f"Tag {tag['tag']}: corrección de {error:.2f} mm descartada")
+            return None
+
+        return [round(x + dx, 2), round(y + dy, 2), z], error
+
+    def run(self, tags, progress=None):
+        """Mide todos los tags y devuelve {número de tag: ubicación corregida}.
+
+        `progress(tag, resultado)` se llama después de cada tag.
+        """
+        corrections = {}
+        for tag in tags:
+            result = self.measure_tag(tag)
+            if result is not None:
+                location, error = result
+                corrections[tag['tag']] = location
+                print(f"Tag {tag['tag']}: {tag['location']} -> {location} ({error:.2f} mm)")
+            if progress is not None:
+                progress(tag, result)
+        print(f"Autocalibración: {len(corrections)} de {len(tags)} tags corregidos")
+        return corrections
+
+    def fit_homography(self, tag, step=5.0, tool_offset=(0.0, 0.0)):
+        """Ajusta la homografía píxel-máquina observando un tag desde varias
+        posiciones conocidas alrededor de su ubicación."""
+        x, y, _ = tag['location']
+        offsets = [(0, 0), (-step, -step), (step, -step), (step, step), (-step, step),
+                   (step, 0), (0, step), (-step, 0), (0, -step)]
+        observations = []
+        size = None
+        for ox, oy in offsets:
+            px, py = x + ox, y + oy
+            observation = self.observe(tag, px, py)
+            if observation is not None:
+                detection, size = observation
+                observations.append((detection.center, (px, py)))
+        if len(observations) < 4:
+            raise ValueError(f"Solo se vio el tag {tag['tag']} en {len(observations)} posiciones")
+
+        homography = CameraHomography.fit(observations, self.cross_pixel(size), tool_offset)
+        # Vuelve a dejar el tag bajo la cruz
+        self.cnc.move_to(x=x, y=y, z=self.camera_z)
+        print(f"Homografía ajustada con {len(observations)} observaciones")
+        return homography
+
+
+def sharpness(frame, roi=0.3):
+    """Nitidez del centro del frame: varianza del laplaciano sobre una región
+    central de `roi` veces el ancho y el alto. Mayor es más enfocado."""
+    h, w = frame.shape[:2]
+    rh, rw = max(8, int(h * roi)), max(8, int(w * roi))
+    top, left = (h - rh) // 2, (w - rw) // 2
+    region = frame[top:top + rh, left:left + rw]
+    if region.ndim == 3:
+        region = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+    _, std = cv2.meanStdDev(cv2.Laplacian(region, cv2.CV_32F))
+    return float(std[0, 0]) ** 2
+
+
+class AutoFocus:
+    """Busca la Z de mejor enfoque de la cámara sobre un punto.
+
+    Primero mide `coarse` alturas repartidas en `z_range` para acotar el
+    máximo (lejos del foco la nitidez es plana y una búsqueda por sección
+    áurea se perdería), y luego afina entre los vecinos del mejor con sección
+    áurea hasta `tolerance` mm. Cada medida es un G0 en Z, la espera a la
+    posición y un frame nuevo de la captura en marcha; las alturas ya medidas
+    no se repiten. Con los valores por defecto son menos de veinte medidas,
+    frente a cientos de un barrido completo con el mismo paso.
+    """
+
+    GOLDEN = (5 ** 0.5 - 1) / 2
+
+    def __init__(self, cnc, camera, z_range=(-85.0, 0.0), coarse=5, tolerance=0.2,
+                 settle_frames=2, roi=0.3):
+        self.cnc = cnc
+        self.camera = camera
+        self.z_range = (max(z_range[0], cnc.MIN_Z), min(z_range[1], 0.0))
+        self.coarse = coarse
+        self.tolerance = tolerance
+        self.settle_frames = settle_frames  # Frames descartados tras detenerse
+        self.roi = roi
+        self.scores = {}  # Z -> nitidez medida
+
+    def score_at(self, z):
+        """Mueve a la Z indicada y devuelve la nitidez de un frame nuevo."""
+        z = round(z, 3)
+        if z in self.scores:
+            return self.scores[z]
+        self.cnc.move_to(z=z)
+        self.cnc.wait_for_position_reached(z=z)
+        seq = self.camera.get_latest_frame()[0]
+        latest = self.camera.wait_for_frame(after_seq=seq + self.settle_frames, timeout=2)
+        if latest is None:
+            raise RuntimeError("No llegan frames de la cámara")
+        self.scores[z] = sharpness(latest[2], self.roi)
+        return self.scores[z]
+
+    def run(self):
+        """Devuelve la Z de mejor enfoque y deja la máquina en ella."""
+        low, high = self.z_range
+        step = (high - low) / (self.coarse - 1)
+        zs = [low + i * step for i in range(self.coarse)]
+        # Del lado más alto al más bajo: la cámara se aleja primero de la pieza
+        scores = [self.score_at(z) for z in reversed(zs)][::-1]
+        best = max(range(len(zs)), key=scores.__getitem__)
+        a = zs[max(best - 1, 0)]
+        b = zs[min(best + 1, len(zs) - 1)]
+
+        # Sección áurea en [a, b]
+        c = b - self.GOLDEN * (b - a)
+        d = a + self.GOLDEN * (b - a)
+        while b - a > self.tolerance:
+            if self.score_at(c) >= self.score_at(d):
+                b, d = d, c
+                c = b - self.GOLDEN * (b - a)
+            else:
+                a, c = c, d
+                d = a + self.GOLDEN * (b - a)
+
+        z = max(self.scores, key=self.scores.get)
+        self.cnc.move_to(z=z)
+        print(f"Enfoque: Z={z:.2f} con {len(self.scores)} medidas")
+        return z
@@ -1,88 +1,174 @@
-import cv2
 from kivy.clock import Clock
+from kivy.graphics import Color, Line
 from kivy.graphics.texture import Texture
 
-class CameraController:
-    def __init__(self, camera_id=0, update_interval=1.0 / 30):
-        self.camera_id = camera_id
-        self.capture = None
+from .captura import FrameCapture
+
+
+class CameraController(FrameCapture):
+    """FrameCapture con la vista previa en un widget Image de Kivy: textura,
+    zoom y cruz. La captura y el reparto de frames son los de FrameCapture."""
+
+    def __init__(self, camera_id=0, update_interval=1.0 / 30, zoom_factor=2):
+        super().__init__(camera_id)
         self.update_interval = update_interval
         self.cross_position = None  # Permite ajustar la posición de la cruz
         self.zoom_enabled = False  # Controla el estado del zoom
+        self.zoom_factor = zoom_factor
+
+        # Render: una textura por resolución y dos vistas (regiones) sobre ella,
+        # completa y con zoom, ya volteadas. El frame se sube tal cual en BGR.
+        self._texture = None
+        self._full_view = None
+        self._zoom_view = None
+        self._widget = None
+        self._cross_lines = None
+        self._clock_event = None
+        self._shown_seq = 0  # Último frame mostrado en la UI
+        self._placeholder = False  # La UI muestra la imagen predeterminada
 
     def start_camera(self, camera_image_widget):
         """Inicia la captura de video desde la cámara USB"""
-        self.capture = cv2.VideoCapture(self.camera_id)
-        if not self.capture.isOpened():
+        if not self.start_capture():
             # Si no se puede abrir la cámara, carga la imagen predeterminada
             camera_image_widget.source = './app/resources/img/cam.png'
             return False
-        
+
+        # La cruz es una instrucción del canvas que sigue al widget
+        self._widget = camera_image_widget
+        with camera_image_widget.canvas.after:
+            Color(1, 0, 0, 1)
+            self._cross_lines = (Line(points=[], width=1), Line(points=[], width=1))
+        camera_image_widget.bind(pos=self._update_cross, norm_image_size=self._update_cross)
+
         # Configura la actualización del frame en un intervalo regular
-        Clock.schedule_interval(lambda dt: self.update_frame(camera_image_widget), self.update_interval)
+        self._schedule_updates()
         return True
 
+    def _schedule_updates(self):
+        if self._clock_event is None and self._widget is not None:
+            widget = self._widget
+            self._clock_event = Clock.schedule_interval(
+                lambda dt: self.update_frame(widget), self.update_interval)
+
+    def pause(self):
+        """Deja de leer y mostrar frames sin cerrar la cámara (pantalla oculta)."""
+        super().pause()
+        if self._clock_event:
+            self._clock_event.cancel()
+            self._clock_event = None
+
+    def resume(self):
+        """Reanuda la lectura y el refresco en pantalla tras `pause`."""
+        super().resume()
+        self._schedule_updates()
+
     def update_frame(self, camera_image_widget):
         """Actualiza el frame de la cámara y lo muestra en la pantalla"""
-        ret, frame = self.capture.read()
-        if ret:
-            # Convierte el frame de BGR a RGB
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # Realizar zoom si está habilitado
-            if self.zoom_enabled:
-                frame = self.apply_zoom(frame)
-
-            # Añadir la cruz en la imagen
-            self.draw_cross(frame)
-
-            # Gira verticalmente la imagen
-            frame = frame[::-1]
-            # Convierte la imagen a una textura de Kivy
-            texture = Texture.create(size=(frame.shape[1], frame.shape[0]), colorfmt='rgb')
-            texture.blit_buffer(frame.tobytes(), colorfmt='rgb', bufferfmt='ubyte')
-            texture.flip_vertical()
-            # Actualiza la textura en el Image de Kivy
-            camera_image_widget.texture = texture
-        else:
-            # Si no se puede capturar, muestra la imagen predeterminada
+        seq, _, frame = self._latest
+        if frame is not None and self.capture_ok:
+            if seq == self._shown_seq:
+                return  # No hay frame nuevo desde el último tick
+            self._shown_seq = seq
+
+            h, w = frame.shape[:2]
+            if self._texture is None or self._texture.size != (w, h):
+                self._create_texture(w, h)
+
+            # El frame BGR de OpenCV se sube sin convertir a RGB ni voltear; el
+            # reshape a 1-D es una vista del mismo buffer (el frame es contiguo)
+            self._texture.blit_buffer(frame.reshape(-1), colorfmt='bgr', bufferfmt='ubyte')
+
+            view = self._zoom_view if self.zoom_enabled else self._full_view
+            if camera_image_widget.texture is not view:
+                camera_image_widget.texture = view
+                self._placeholder = False
+            else:
+                # Misma textura con contenido nuevo: solo hay que redibujar
+                camera_image_widget.canvas.ask_update()
+        elif not self.capture_ok and not self._placeholder:
+            # Si no se puede capturar, muestra la imagen predeterminada (una vez)
             camera_image_widget.source = './app/resources/img/cam.png'
+            self._placeholder = True
 
-    def apply_zoom(self, frame, zoom_factor=2):
-        """Aplica un zoom a la imagen recortando el centro y escalando"""
-        h, w, _ = frame.shape
-        center_x, center_y = w // 2, h // 2
-        new_w, new_h = w // zoom_factor, h // zoom_factor
+    def _create_texture(self, w, h):
+        """Crea la textura para una resolución y sus vistas completa y con zoom."""
+        self._texture = Texture.create(size=(w, h), colorfmt='bgr')
+        # OpenCV guarda las filas de arriba abajo y blit_buffer las sube empezando
+        # por abajo: se voltean las coordenadas UV de las vistas en lugar de copiar
+        # el frame. La fila v del frame queda en la fila v de la textura.
+        self._full_view = self._texture.get_region(0, 0, w, h)
+        self._full_view.flip_vertical()
+        u0, v0, zw, zh = self._zoom_rect(w, h)
+        self._zoom_view = self._texture.get_region(u0, v0, zw, zh)
+        self._zoom_view.flip_vertical()
+        if self._widget is not None:
+            self._widget.texture = self._full_view
 
-        # Recortar la imagen centrada
-        frame_cropped = frame[center_y - new_h // 2:center_y + new_h // 2,
-                              center_x - new_w // 2:center_x + new_w // 2]
-        # Escalar la imagen de nuevo a su tamaño original
-        return cv2.resize(frame_cropped, (w, h))
+    def _zoom_rect(self, w, h):
+        """Región central (x, y, ancho, alto) visible con zoom, en píxeles del frame."""
+        zw, zh = w // self.zoom_factor, h // self.zoom_factor
+        return (w - zw) // 2, (h - zh) // 2, zw, zh
 
-    def toggle_zoom(self):
-        """Alterna el estado del zoom"""
-        self.zoom_enabled = not self.zoom_enabled
+    def visible_rect(self):
+        """Región del frame (x, y, ancho, alto) que se ve en pantalla, con el
+        origen arriba a la izquierda como en OpenCV."""
+        if self._texture is None:
+            return None
+        w, h = self._texture.size
+        return self._zoom_rect(w, h) if self.zoom_enabled else (0, 0, w, h)
 
-    def draw_cross(self, frame, color=(255, 0, 0), thickness=2):
-        """Dibuja una cruz en la imagen"""
-        h, w, _ = frame.shape
+    def image_to_widget(self, u, v):
+        """Convierte un píxel del frame en coordenadas del widget de la cámara."""
+        rect = self.visible_rect()
+        if rect is None or self._widget is None:
+            return None
+        u0, v0, vw, vh = rect
+        dw, dh = self._widget.norm_image_size
+        x0 = self._widget.center_x - dw / 2
+        y0 = self._widget.center_y - dh / 2
+        return x0 + (u - u0) * dw / vw, y0 + dh - (v - v0) * dh / vh
+
+    def widget_to_image(self, x, y):
+        """Convierte un punto del widget de la cámara en un píxel del frame."""
+        rect = self.visible_rect()
+        if rect is None or self._widget is None:
+            return None
+        u0, v0, vw, vh = rect
+        dw, dh = self._widget.norm_image_size
+        x0 = self._widget.center_x - dw / 2
+        y0 = self._widget.center_y - dh / 2
+        return u0 + (x - x0) * vw / dw, v0 + (y0 + dh - y) * vh / dh
+
+    def _update_cross(self, *args):
+        """Recoloca las líneas de la cruz sobre la imagen mostrada."""
+        if self._cross_lines is None or self._texture is None:
+            return
+        w, h = self._texture.size
         # Si no se ha definido una posición, se dibuja en el centro
         cx, cy = (w // 2, h // 2) if self.cross_position is None else self.cross_position
+        x, y = self.image_to_widget(cx, cy)
+        # 30 píxeles del frame, a la escala de la región mostrada (completa o zoom)
+        size = 30 * self._widget.norm_image_size[0] / self.visible_rect()[2]
+        horizontal, vertical = self._cross_lines
+        horizontal.points = [x - size, y, x + size, y]
+        vertical.points = [x, y - size, x, y + size]
 
-        # Líneas de la cruz
-        cv2.line(frame, (cx - 30, cy), (cx + 30, cy), color, thickness)
-        cv2.line(frame, (cx, cy - 30), (cx, cy + 30), color, thickness)
+    def toggle_zoom(self):
+        """Alterna el estado del zoom"""
+        self.zoom_enabled = not self.zoom_enabled
+        if self._widget is not None and self._full_view is not None:
+            self._widget.texture = self._zoom_view if self.zoom_enabled else self._full_view
+        self._update_cross()
 
     def set_cross_position(self, x, y):
         """Establece la posición de la cruz"""
         self.cross_position = (x, y)
+        self._update_cross()
 
     def stop_camera(self):
         """Libera los recursos de la cámara al detener la aplicación"""
-        if self.capture:
-            self.capture.release()
-
-
-
-#on_touch_down: root.camera_controller.toggle_zoom()
+        if self._clock_event:
+            self._clock_event.cancel()
+            self._clock_event = None
+        self.stop_capture()
@@ -0,0 +1,120 @@
+import threading
+import time
+
+import cv2
+
+
+class FrameCapture:
+    """Hilo que lee la cámara sin parar y publica solo el último frame.
+
+    No depende de Kivy, así que sirve igual para la interfaz (CameraController
+    lo amplía con el dibujado) que para el servidor sin pantalla, la grabación
+    o la vista previa MJPEG.
+    """
+
+    def __init__(self, camera_id=0):
+        self.camera_id = camera_id
+        self.capture = None
+
+        # Publica solo el último frame como (número, instante, frame).
+        # Reemplazar la tupla es atómico, así que leerla no necesita bloqueo.
+        self._latest = (0, 0.0, None)
+        self._capture_thread = None
+        self._running = False
+        self._new_frame = threading.Condition()
+        self._frame_listeners = []
+        self.capture_ok = False  # False si la cámara dejó de entregar frames
+        self._active = threading.Event()  # Sin activar, la captura queda en pausa
+        self._active.set()
+        self._viewers = 0  # Consumidores remotos que mantienen la captura en pausa
+
+    def start_capture(self, capture=None):
+        """Abre la cámara y arranca el hilo que lee frames continuamente.
+
+        `capture` permite usar otra fuente con la interfaz de cv2.VideoCapture
+        (un vídeo o un generador de frames). Devuelve False si no se pudo abrir.
+        """
+        if self._running:
+            return True
+        self.capture = capture if capture is not None else cv2.VideoCapture(self.camera_id)
+        if not self.capture.isOpened():
+            return False
+
+        self._running = True
+        self._capture_thread = threading.Thread(target=self._capture_loop, name="camera", daemon=True)
+        self._capture_thread.start()
+        return True
+
+    def pause(self):
+        """Deja de leer frames sin cerrar la cámara."""
+        self._active.clear()
+
+    def resume(self):
+        """Reanuda la lectura tras `pause`."""
+        self._active.set()
+
+    def add_viewer(self):
+        """Un consumidor remoto (p. ej. MJPEGServer) sigue leyendo frames
+        aunque la captura esté en pausa, hasta `remove_viewer`."""
+        self._viewers += 1
+
+    def remove_viewer(self):
+        self._viewers = max(0, self._viewers - 1)
+
+    def _capture_loop(self):
+        """Lee frames sin parar y publica el más reciente, descartando los viejos."""
+        seq = 0
+        failures = 0
+        while self._running:
+            if not self._viewers and not self._active.wait(0.1):
+                continue
+            ret, frame = self.capture.read()
+            if not ret:
+                failures += 1
+                if failures >= 10:
+                    self.capture_ok = False
+                time.sleep(0.01)
+                continue
+
+            failures = 0
+            self.capture_ok = True
+            seq += 1
+            self._latest = (seq, time.monotonic(), frame)
+            with self._new_frame:
+                self._new_frame.notify_all()
+            for callback in self._frame_listeners:
+                try:
+                    callback(seq, frame)
+                except Exception as e:
+                    print(f"Error en el consumidor de frames: {e}")
+
+    def get_latest_frame(self):
+        """Devuelve (número, instante, frame) del último frame capturado.
+
+        El frame no se vuelve a escribir, pero es compartido: quien lo quiera
+        modificar debe copiarlo.
+        """
+        return self._latest
+
+    def wait_for_frame(self, after_seq=0, timeout=None):
+        """Espera un frame capturado después de `after_seq` y lo devuelve como
+        (número, instante, frame), o None si se agota `timeout`."""
+        with self._new_frame:
+            if not self._new_frame.wait_for(lambda: self._latest[0] > after_seq, timeout):
+                return None
+        return self._latest
+
+    def add_frame_listener(self, callback):
+        """Registra `callback(número, frame)`, llamado desde el hilo de captura
+        con cada frame nuevo. Debe ser rápido para no retrasar la captura."""
+        self._frame_listeners.append(callback)
+
+    def stop_capture(self):
+        """Detiene el hilo de captura y libera la cámara."""
+        self._running = False
+        self._active.set()
+        if self._capture_thread:
+            self._capture_thread.join(timeout=1)
+            self._capture_thread = None
+        if self.capture:
+            self.capture.release()
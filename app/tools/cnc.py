@@ -1,64 +1,529 @@
 import serial
 import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+from .grbl_state import MachineState
+
+# Tamaño del buffer de recepción serie de GRBL (bytes)
+GRBL_RX_BUFFER_SIZE = 128
+
+# Comandos en tiempo real de GRBL: un solo byte, sin salto de línea ni respuesta
+RT_STATUS = b"?"
+RT_FEED_HOLD = b"!"
+RT_CYCLE_START = b"~"
+RT_SOFT_RESET = b"\x18"
+RT_JOG_CANCEL = b"\x85"
+RT_FEED_OVR_RESET = b"\x90"
+RT_FEED_OVR_PLUS_10 = b"\x91"
+RT_FEED_OVR_MINUS_10 = b"\x92"
+RT_FEED_OVR_PLUS_1 = b"\x93"
+RT_FEED_OVR_MINUS_1 = b"\x94"
+RT_RAPID_OVR_100 = b"\x95"
+RT_RAPID_OVR_50 = b"\x96"
+RT_RAPID_OVR_25 = b"\x97"
+
+# Espera máxima por defecto de wait_until (s); un movimiento largo tarda menos
+WAIT_TIMEOUT = 120
+
+# Ajustes $ por defecto; normalmente se usan los del bloque "init" del JSON
+DEFAULT_INIT_COMMANDS = [
+    "$0=10", "$1=255", "$2=0", "$3=1", "$4=0", "$5=0",
+    "$6=0", "$10=18", "$11=0.010", "$12=0.002", "$13=0",
+    "$20=0", "$21=0", "$22=1", "$23=3", "$24=100", "$25=2000.000",
+    "$26=250", "$27=2", "$30=1000", "$31=0", "$32=0",
+    "$100=40", "$101=80", "$102=120", "$110=4000.000", "$111=4000.000",
+    "$112=800", "$120=50.000", "$121=50.000", "$122=50.000",
+    "$130=200.000", "$131=200.000", "$132=200.000"
+]
+
+
+def parse_settings(lines):
+    """Convierte líneas `$n=valor` en un diccionario {n: valor}."""
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+    settings = {}
+    for line in lines:
+        line = line.strip()
+        if line.startswith("$") and "=" in line:
+            key, _, value = line[1:].partition("=")
+            if key.isdigit():
+                settings[int(key)] = value.split()[0] if value.split() else value
+    return settings
+
+
+def _same_setting(current, desired):
+    if current is None:
+        return False
+    try:
+        return abs(float(current) - float(desired)) < 1e-6
+    except ValueError:
+        return current == desired
+
+
+class GrblCommand:
+    """Línea para GRBL junto con el futuro que recibirá su respuesta.
+
+    El resultado del futuro es la lista de líneas que GRBL devolvió para el
+    comando; la última es siempre `ok` o `error:N`.
+    """
+
+    def __init__(self, line):
+        self.line = line
+        self.data = f"{line}\n".encode()
+        # Los ajustes $ escriben en la EEPROM y GRBL deja de atender el puerto
+        # serie mientras tanto: se envían solos, con el buffer vacío.
+        self.sync = line.startswith("$") and not line.startswith("$J=")
+        self.lines = []
+        self.future = Future()
+
 
 class CNCController:
-    def __init__(self, serial_ports, baud_rate=115200):
+    # Límites de los ejes
+    MAX_X = 200.0
+    MAX_Y = 200.0
+    MIN_Z = -85.0  # Eje Z invertido: home es 0 y el máximo es -85
+    MIN_XY = 0.0  # El mínimo para X e Y es 0
+
+    def __init__(self, serial_ports, baud_rate=115200, poll_rate=10, init_commands=None,
+                 banner_timeout=3.0, boot_time=2.0, name="cnc"):
+        self.name = name  # Prefijo de los hilos, para distinguir varias máquinas
         self.serial_ports = serial_ports
         self.baud_rate = baud_rate
+        # Ajustes $ deseados: lista de comandos o texto como el bloque "init" del JSON
+        self.init_commands = init_commands or DEFAULT_INIT_COMMANDS
+        self.banner_timeout = banner_timeout  # Espera máxima del mensaje "Grbl x.y"
+        self.boot_time = boot_time  # Arranque del bootloader tras el reinicio por DTR
+        self.poll_rate = poll_rate  # Reportes de estado por segundo (5-50 Hz)
         self.grbl = None
         self.home_executed = False  # Para controlar si ya se fue a home la primera vez
 
+        # Hilo de E/S serie y colas de comandos
+        self._io_thread = None
+        self._running = False
+        self._outbox = queue.Queue()  # Comandos pendientes de enviar
+        self._next_cmd = None  # Sacado de la cola, esperando hueco en el buffer
+        self._in_flight = deque()  # Comandos enviados sin respuesta
+        self._rx_bytes = 0  # Bytes ocupados en el buffer RX de GRBL
+        self._write_lock = threading.Lock()
+        self._status_waiters = []
+        self.realtime_latency_last = 0.0  # Segundos desde la llamada hasta el byte enviado
+        self.realtime_latency_max = 0.0
+        self._listeners = {"status": [], "alarm": [], "message": [], "event": []}
+
+        # Estado de la máquina actualizado por el sondeo de reportes `?`
+        self.state = MachineState()
+        self._state_changed = threading.Condition()
+        self._interruptions = 0  # Alarmas, reinicios y desconexiones vistos
+        self._interrupt_error = None
+        self._poller_thread = None
+
+        # Secuencias largas (conexión, homing, movimientos) fuera del hilo de la UI
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{name}-job")
+
     def connect(self):
         """Establece conexión con la CNC buscando en los puertos disponibles."""
-        for port in self.serial_ports:
-            try:
-                self.grbl = serial.Serial(port, self.baud_rate)
-                time.sleep(2)  
-                print(f"Conectado a GRBL en {port}")
-                break
-            except serial.SerialException:
-                print(f"No se pudo conectar a {port}. Probando siguiente puerto...")
+        if self._running:
+            return  # Ya conectada: el hilo de E/S sigue atendiendo el puerto
 
-        if not self.grbl:
-            raise Exception("No se pudo conectar a ningún puerto serial.")
+        start = time.monotonic()
+        self.grbl, banner = self._probe_ports()
+        print(f"Conectado a GRBL en {self.grbl.port}: {banner} "
+              f"({time.monotonic() - start:.2f} s)")
 
-        # Resetear GRBL y desbloquear solo la primera vez
-        self.grbl.write(b"\r\n\r\n")
-        time.sleep(2)
-        self.grbl.flushInput()
+        self.start_io()
+        self.start_status_poller()
 
         # Inicializar GRBL con los parámetros
         self.initialize_grbl()
 
+    @property
+    def connected(self):
+        """True mientras el hilo de E/S atiende un puerto abierto."""
+        return self._running and self.grbl is not None and self.grbl.is_open
+
+    def _probe_ports(self):
+        """Prueba todos los puertos a la vez y se queda con el primero que
+        responde con el mensaje de bienvenida de GRBL."""
+        found = threading.Event()
+        winner = None
+        with ThreadPoolExecutor(max_workers=len(self.serial_ports)) as probes:
+            futures = [probes.submit(self._probe_port, port, found) for port in self.serial_ports]
+            for future in as_completed(futures):
+                result = future.result()
+                if result is None:
+                    continue
+                if winner is None:
+                    winner = result
+                    found.set()
+                else:
+                    result[0].close()  # Otro puerto respondió más tarde
+
+        if winner is None:
+            raise Exception("No se pudo conectar a ningún puerto serial.")
+        return winner
+
+    def _probe_port(self, port, found):
+        """Abre un puerto y espera el mensaje `Grbl x.y`.
+
+        Abrir el puerto suele reiniciar la placa, que envía el mensaje al
+        arrancar. Si no llega en `boot_time` (placa sin reinicio por DTR) se
+        pide con un reset por software; antes no, porque el bootloader del
+        Arduino descartaría el byte. Devuelve (puerto, mensaje) o None.
+        """
+        try:
+            ser = serial.Serial(port, self.baud_rate, timeout=0.05)
+        except serial.SerialException:
+            print(f"No se pudo conectar a {port}.")
+            return None
+
+        start = time.monotonic()
+        reset_sent = False
+        buffer = bytearray()
+        try:
+            while not found.is_set() and time.monotonic() - start < self.banner_timeout:
+                buffer.extend(ser.read(ser.in_waiting or 1))
+                while b"\n" in buffer:
+                    raw, _, rest = buffer.partition(b"\n")
+                    buffer = bytearray(rest)
+                    line = raw.decode(errors="replace").strip()
+                    if line.startswith("Grbl "):
+                        return ser, line
+                if not reset_sent and time.monotonic() - start > self.boot_time:
+                    ser.write(RT_SOFT_RESET)
+                    reset_sent = True
+        except (serial.SerialException, OSError) as e:
+            print(f"Error leyendo {port}: {e}")
+
+        ser.close()
+        if not found.is_set():
+            print(f"No se encontró GRBL en {port}.")
+        return None
+
+    def start_io(self):
+        """Arranca el hilo que lee y escribe el puerto serie."""
+        if self._io_thread and self._io_thread.is_alive():
+            return
+        self._running = True
+        self._io_thread = threading.Thread(target=self._io_loop, name=f"{self.name}-io", daemon=True)
+        self._io_thread.start()
+
+    def start_status_poller(self, rate=None):
+        """Arranca el sondeo periódico de estado (`?`) a `rate` Hz."""
+        if rate is not None:
+            self.poll_rate = rate
+        if self._poller_thread and self._poller_thread.is_alive():
+            return
+        self._poller_thread = threading.Thread(target=self._poll_loop, name=f"{self.name}-status", daemon=True)
+        self._poller_thread.start()
+
+    def _poll_loop(self):
+        next_poll = time.monotonic()
+        while self._running:
+            try:
+                self.send_realtime(RT_STATUS)
+            except (serial.SerialException, OSError) as e:
+                print(f"Error al pedir el estado a GRBL: {e}")
+                break
+            # Intervalo fijo sin acumular el tiempo de escritura
+            next_poll += 1.0 / self.poll_rate
+            time.sleep(max(0.0, next_poll - time.monotonic()))
+
     def initialize_grbl(self):
-        """Envía los comandos de configuración inicial a GRBL."""
-        init_commands = [
-            "$0=10", "$1=255", "$2=0", "$3=1", "$4=0", "$5=0",
-            "$6=0", "$10=18", "$11=0.010", "$12=0.002", "$13=0",
-            "$20=0", "$21=0", "$22=1", "$23=3", "$24=100", "$25=2000.000",
-            "$26=250", "$27=2", "$30=1000", "$31=0", "$32=0",
-            "$100=40", "$101=80", "$102=120", "$110=4000.000", "$111=4000.000",
-            "$112=800", "$120=50.000", "$121=50.000", "$122=50.000",
-            "$130=200.000", "$131=200.000", "$132=200.000"
-        ]
-        
-        for command in init_commands:
-            self.send_command(command)
-            time.sleep(0.1)
-
-    def send_command(self, command):
-        """Envía un comando a GRBL e imprime el comando enviado."""
+        """Aplica los ajustes $ de configuración que difieren de los de GRBL.
+
+        Lee `$$` y solo escribe los ajustes distintos, así una reconexión con la
+        configuración ya aplicada no espera ni gasta escrituras de EEPROM.
+        """
+        desired = parse_settings(self.init_commands)
+        current = self.read_settings()
+        changes = [f"${key}={value}" for key, value in desired.items()
+                   if not _same_setting(current.get(key), value)]
+
+        if changes:
+            self.stream_commands(changes)
+        print(f"Configuración de GRBL: {len(changes)} de {len(desired)} ajustes actualizados")
+
+    def read_settings(self, timeout=5):
+        """Lee los ajustes actuales de GRBL (`$$`) como diccionario {n: valor}."""
+        return parse_settings(self.submit("$$").result(timeout))
+
+    def submit(self, command):
+        """Encola un comando para el hilo de E/S y devuelve su futuro sin bloquear."""
+        cmd = GrblCommand(command.strip())
+        if not self._running:
+            cmd.future.set_exception(ConnectionError("CNC no conectada"))
+            return cmd.future
+        self._outbox.put(cmd)
+        # Despierta al hilo de E/S, que puede estar esperando datos en read()
+        self.grbl.cancel_read()
+        return cmd.future
+
+    def send_command(self, command, timeout=None):
+        """Envía un comando a GRBL y espera su respuesta (`ok` o `error:N`)."""
         print(f"Enviando comando: {command}")
-        self.grbl.write(f"{command}\n".encode())
-        time.sleep(0.1)
-        return self.grbl.readline().strip()
+        response = self.submit(command).result(timeout)[-1]
+        if response != "ok":
+            print(f"Error en el comando '{command}': {response}")
+        return response
+
+    def stream_commands(self, commands):
+        """Envía varias líneas a GRBL usando el protocolo de conteo de caracteres.
+
+        Todas las líneas se encolan de una vez y el hilo de E/S envía cada una
+        en cuanto cabe en el buffer RX de GRBL, de modo que el planificador
+        nunca se queda sin bloques. Acepta una lista de comandos o el texto de un
+        programa completo. Devuelve una lista de tuplas (comando, respuesta) con
+        el `ok` o `error:N` correspondiente a cada línea.
+        """
+        if isinstance(commands, str):
+            commands = commands.splitlines()
+
+        lines = [command.strip() for command in commands if command.strip()]
+        self._emit("event", "job")
+        futures = [self.submit(line) for line in lines]
+        resultados = [(line, future.result()[-1]) for line, future in zip(lines, futures)]
+
+        errores = [r for r in resultados if r[1] != "ok"]
+        for line, response in errores:
+            print(f"Error en la línea '{line}': {response}")
+        print(f"Programa enviado: {len(resultados)} líneas, {len(errores)} errores")
+        return resultados
+
+    def query_status(self):
+        """Pide un reporte de estado (`?`) y devuelve un futuro con la línea `<...>`."""
+        future = Future()
+        with self._write_lock:
+            self._status_waiters.append(future)
+        if self.send_realtime(RT_STATUS) is False:
+            with self._write_lock:
+                self._status_waiters.remove(future)
+            future.set_exception(ConnectionError("CNC no conectada"))
+        return future
+
+    def send_realtime(self, command):
+        """Escribe un comando en tiempo real de un byte directamente en el puerto.
+
+        No pasa por la cola de líneas del hilo de E/S: GRBL lo procesa en cuanto
+        lo recibe, aunque su buffer RX esté lleno. Para el reset por software se
+        descarta además todo lo pendiente de enviar, que GRBL ignoraría igualmente.
+        Registra la latencia desde la llamada hasta que el byte sale del puerto.
+        Devuelve False, sin enviar nada, si la CNC aún no está conectada.
+        """
+        if not self.connected:
+            print(f"CNC no conectada: comando en tiempo real {command!r} ignorado")
+            return False
+        start = time.perf_counter()
+        with self._write_lock:
+            if command == RT_SOFT_RESET:
+                self._discard_outbox(ConnectionError("Reset de GRBL"))
+                self.grbl.reset_output_buffer()
+            self.grbl.write(command)
+            self.grbl.flush()
+        latency = time.perf_counter() - start
+        self.realtime_latency_last = latency
+        self.realtime_latency_max = max(self.realtime_latency_max, latency)
+        return latency
+
+    def feed_hold(self):
+        """Pausa el movimiento decelerando sin perder posición (`!`)."""
+        latency = self.send_realtime(RT_FEED_HOLD)
+        if latency is not False:
+            self._emit("event", "stop")
+        return latency
+
+    def cycle_start(self):
+        """Reanuda el movimiento tras una pausa (`~`)."""
+        return self.send_realtime(RT_CYCLE_START)
+
+    def soft_reset(self):
+        """Reinicia GRBL (Ctrl-X) descartando los comandos pendientes."""
+        latency = self.send_realtime(RT_SOFT_RESET)
+        if latency is not False:
+            self._interrupt(RuntimeError("GRBL reiniciado (soft reset)"))
+            self._emit("event", "reset")
+        return latency
+
+    def jog_cancel(self):
+        """Cancela el jog en curso y vacía los jogs planificados (0x85)."""
+        return self.send_realtime(RT_JOG_CANCEL)
+
+    def feed_override(self, command):
+        """Ajusta el override de avance con uno de los bytes RT_FEED_OVR_*."""
+        return self.send_realtime(command)
+
+    def rapid_override(self, command):
+        """Ajusta el override de rápidos con uno de los bytes RT_RAPID_OVR_*."""
+        return self.send_realtime(command)
+
+    def run_in_background(self, func, *args, callback=None, **kwargs):
+        """Ejecuta una secuencia bloqueante de la CNC en el hilo de trabajos.
+
+        Las secuencias se ejecutan en orden, una detrás de otra. `callback`, si se
+        indica, recibe el futuro al terminar (desde el hilo de trabajos).
+        """
+        future = self._executor.submit(func, *args, **kwargs)
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
+
+    def add_listener(self, event, callback):
+        """Registra una función para los eventos `status`, `alarm`, `message` o `event`.
+
+        Las funciones se llaman desde el hilo de E/S; `status` recibe el
+        MachineState actualizado y el resto la línea recibida. `event` avisa de
+        las acciones pedidas a la máquina (`move`, `job`, `home`, `stop`,
+        `reset`) con su nombre, desde el hilo que las pide, y del cierre de la
+        conexión (`disconnect`, desde el hilo de E/S).
+        """
+        self._listeners[event].append(callback)
+
+    def remove_listener(self, event, callback):
+        """Quita una función registrada con `add_listener`."""
+        # Lista nueva en lugar de modificarla: _emit puede estar recorriéndola
+        self._listeners[event] = [c for c in self._listeners[event] if c is not callback]
+
+    def _emit(self, event, line):
+        for callback in self._listeners[event]:
+            try:
+                callback(line)
+            except Exception as e:
+                print(f"Error en el listener '{event}': {e}")
+
+    def _io_loop(self):
+        """Bucle del hilo de E/S: envía comandos con conteo de caracteres y
+        reparte las respuestas de GRBL."""
+        buffer = bytearray()
+        while self._running:
+            try:
+                # Enviar mientras quepa en el buffer RX de GRBL
+                while True:
+                    with self._write_lock:
+                        if self._next_cmd is None:
+                            try:
+                                self._next_cmd = self._outbox.get_nowait()
+                            except queue.Empty:
+                                break
+                        cmd = self._next_cmd
+                        if not self._can_send(cmd):
+                            break
+                        self._next_cmd = None
+                        self.grbl.write(cmd.data)
+                    self._in_flight.append(cmd)
+                    self._rx_bytes += len(cmd.data)
+
+                # Leer lo recibido (espera como máximo el timeout del puerto)
+                data = self.grbl.read(self.grbl.in_waiting or 1)
+            except (serial.SerialException, OSError) as e:
+                print(f"Error de comunicación con GRBL: {e}")
+                self._running = False
+                # El puerto no vuelve a servir: se cierra para que nadie escriba en él
+                with self._write_lock:
+                    try:
+                        self.grbl.close()
+                    except (serial.SerialException, OSError):
+                        pass
+                break
+
+            buffer.extend(data)
+            while b"\n" in buffer:
+                raw, _, rest = buffer.partition(b"\n")
+                buffer = bytearray(rest)
+                line = raw.decode(errors="replace").strip()
+                if line:
+                    self._dispatch(line)
+
+        # Ningún comando pendiente recibirá ya respuesta
+        error = ConnectionError("Conexión con GRBL cerrada")
+        with self._write_lock:
+            self._discard_outbox(error)
+        self._fail_pending(error)
+        self._interrupt(error)
+        self._emit("event", "disconnect")
+
+    def _can_send(self, cmd):
+        if not self._in_flight:
+            return True
+        if cmd.sync or self._in_flight[-1].sync:
+            return False
+        return self._rx_bytes + len(cmd.data) <= GRBL_RX_BUFFER_SIZE
+
+    def _dispatch(self, line):
+        """Asocia una línea recibida de GRBL a su comando o evento."""
+        if line == "ok" or line.startswith("error"):
+            if not self._in_flight:
+                return
+            cmd = self._in_flight.popleft()
+            self._rx_bytes -= len(cmd.data)
+            cmd.lines.append(line)
+            cmd.future.set_result(cmd.lines)
+        elif line.startswith("<"):
+            # El estado se actualiza antes de responder a query_status, así
+            # quien espera el reporte ya lo encuentra en `state`
+            with self._state_changed:
+                self.state.update(line)
+                self._state_changed.notify_all()
+            with self._write_lock:
+                waiters, self._status_waiters = self._status_waiters, []
+            for future in waiters:
+                future.set_result(line)
+            self._emit("status", self.state)
+        elif line.startswith("ALARM"):
+            self._interrupt(RuntimeError(f"GRBL en alarma: {line}"))
+            self._emit("alarm", line)
+        elif line.startswith("Grbl "):
+            # GRBL se reinició y descartó todo lo que tenía en el buffer
+            error = ConnectionError("GRBL se reinició")
+            self._fail_pending(error)
+            self._interrupt(error)
+            self._emit("message", line)
+        else:
+            if self._in_flight:
+                self._in_flight[0].lines.append(line)
+            self._emit("message", line)
+
+    def _discard_outbox(self, error):
+        """Descarta los comandos que aún no se enviaron a GRBL.
+
+        Debe llamarse con `_write_lock` tomado para no competir con el hilo de E/S.
+        """
+        if self._next_cmd is not None:
+            self._next_cmd.future.set_exception(error)
+            self._next_cmd = None
+        while True:
+            try:
+                cmd = self._outbox.get_nowait()
+            except queue.Empty:
+                break
+            cmd.future.set_exception(error)
+
+    def _interrupt(self, error):
+        """Despierta a las esperas de `wait_until`, que lanzan `error`."""
+        with self._state_changed:
+            self._interruptions += 1
+            self._interrupt_error = error
+            self._state_changed.notify_all()
+
+    def _fail_pending(self, error):
+        while self._in_flight:
+            cmd = self._in_flight.popleft()
+            if not cmd.future.done():
+                cmd.future.set_exception(error)
+        self._rx_bytes = 0
+        with self._write_lock:
+            waiters, self._status_waiters = self._status_waiters, []
+        for future in waiters:
+            future.set_exception(error)
 
     def go_home(self):
         """Mueve la máquina a la posición home."""
+        self._emit("event", "home")
         if not self.home_executed:
-            # Ir a home solo la primera vez
+            # Ir a home solo la primera vez. GRBL responde al $H cuando termina
+            # el ciclo de homing, así que no hace falta esperar un tiempo fijo.
             self.send_command("$H")  # Enviar homing
-            time.sleep(2)  # Esperar que se complete el homing
             self.send_command("$X")  # Desbloquear después del homing
             self.send_command("G92 X0 Y0 Z0")  # Establecer posición cero en la máquina
             self.home_executed = True
@@ -76,6 +541,7 @@ class CNCController:
             command += f" Y{y}"
         if z is not None:
             command += f" Z{z}"
+        self._emit("event", "move")
         self.send_command(command)
         print(f"Moviendo a X={x}, Y={y}, Z={z}...")
 
@@ -96,31 +562,51 @@ class CNCController:
             print(f"Moviendo luego a Z={z}...")
             self.wait_for_position_reached(z=z)
 
-    def wait_for_position_reached(self, x=None, y=None, z=None):
-        """Espera hasta que los ejes hayan alcanzado las coordenadas indicadas."""
-        while True:
-            status = self.send_command("?")  # Obtener el estado de la máquina
-            pos_str = status.decode().split('|')[1].replace('MPos:', '')
-            positions = list(map(float, pos_str.split(',')))  # Convertir la posición en floats
+    def wait_until(self, predicate, timeout=WAIT_TIMEOUT):
+        """Bloquea hasta que `predicate(state)` sea cierto con el estado recibido.
 
-            current_x, current_y, current_z = positions[0], positions[1], positions[2]
+        Se despierta con cada reporte del sondeo, sin enviar nada por su cuenta.
+        Lanza TimeoutError si se agota `timeout` y la excepción de la causa si
+        durante la espera llega una alarma, un reinicio o se cierra la conexión,
+        ya que entonces la condición no se cumplirá.
+        """
+        with self._state_changed:
+            start = self._interruptions
 
-            # Verificar si X e Y (o Z) han alcanzado las coordenadas deseadas
-            if (x is None or abs(current_x - x) < 0.01) and \
-            (y is None or abs(current_y - y) < 0.01) and \
-            (z is None or abs(current_z - z) < 0.01):
-                break  # Si todas las coordenadas han sido alcanzadas, salir del bucle
+            def done():
+                return self._interruptions != start or predicate(self.state)
 
-            time.sleep(0.1)  # Esperar antes de verificar nuevamente
+            if not self._state_changed.wait_for(done, timeout):
+                raise TimeoutError(f"La CNC no llegó al estado esperado en {timeout} s")
+            if self._interruptions != start:
+                raise self._interrupt_error
+            return True
 
+    def wait_for_position_reached(self, x=None, y=None, z=None, tolerance=0.01, timeout=WAIT_TIMEOUT):
+        """Espera hasta que los ejes hayan alcanzado las coordenadas indicadas."""
+        # Posición de trabajo, que es en la que se dan los G0 tras el G92
+        return self.wait_until(
+            lambda state: state.is_idle() and state.at_position(x, y, z, tolerance),
+            timeout)
 
     def stop_all(self):
         """Función para detener todo movimiento de la CNC inmediatamente."""
-        self.send_command("!")  # Feed hold para detener todos los movimientos de inmediato
-        print("Movimiento detenido inmediatamente.")
+        latency = self.feed_hold()  # Feed hold para detener todos los movimientos de inmediato
+        if latency is False:
+            return
+        print(f"Movimiento detenido inmediatamente ({latency * 1000:.2f} ms, "
+              f"máximo {self.realtime_latency_max * 1000:.2f} ms).")
 
     def disconnect(self):
         """Cierra la conexión serial con GRBL."""
+        self._running = False
+        self._interrupt(ConnectionError("CNC desconectada"))
+        if self._poller_thread:
+            self._poller_thread.join(timeout=1)
+            self._poller_thread = None
+        if self._io_thread:
+            self._io_thread.join(timeout=1)
+            self._io_thread = None
         if self.grbl:
             self.grbl.close()
             print("Conexión cerrada.")
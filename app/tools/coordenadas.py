@@ -0,0 +1,197 @@
+import json
+import os
+import tempfile
+import time
+
+
+class TagStore:
+    """Coordenadas de los tags con índice por número, guardado atómico e historial.
+
+    Carga el JSON de coordenadas (`data` es el diccionario completo, con
+    `init`, `calibration`, áreas y tags) e indexa los tags por número. Cada
+    cambio de ubicación se anota antes en un diario de solo añadir, una línea
+    JSON por tag con la ubicación anterior, la nueva, la hora y el lote al
+    que pertenece; después el JSON se reescribe en un fichero temporal que
+    sustituye al original con `os.replace`, así un corte a mitad de escritura
+    nunca deja el fichero a medias. Con el diario se puede volver al estado
+    de cualquier lote anterior sin guardar copias completas.
+    """
+
+    def __init__(self, path, journal_path=None):
+        self.path = path
+        self.journal_path = journal_path or os.path.splitext(path)[0] + '.history.jsonl'
+        self.data = {}
+        self._index = {}
+        self._journal = []
+        self.load()
+
+    @staticmethod
+    def _key(tag_id):
+        # Los tags llegan como número o como texto del desplegable ("12")
+        try:
+            return int(tag_id)
+        except (TypeError, ValueError):
+            return tag_id
+
+    def load(self):
+        """Carga el JSON y el diario. Devuelve False si el JSON no se pudo leer."""
+        try:
+            with open(self.path, 'r') as file:
+                self.data = json.load(file)
+        except FileNotFoundError:
+            print("Archivo JSON no encontrado.")
+            return False
+        except json.JSONDecodeError:
+            print("Error al decodificar el archivo JSON.")
+            return False
+        self._index = {self._key(tag['tag']): tag for tag in self.data.get('tags', [])}
+        self._journal = self._read_journal()
+        self._recover()
+        return True
+
+    def _read_journal(self):
+        entries = []
+        try:
+            with open(self.journal_path, 'r') as file:
+                for line in file:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        pass  # Línea cortada por un apagado mientras se escribía
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _recover(self):
+        """Completa el último lote si el diario se escribió pero el JSON no."""
+        if not self._journal:
+            return
+        batch = self._journal[-1]['batch']
+        pending = [e for e in self._journal if e['batch'] == batch
+                   and e['tag'] in self._index and self._index[e['tag']].get('location') == e['old']]
+        if pending:
+            for entry in pending:
+                self._index[entry['tag']]['location'] = entry['new']
+            self.save()
+            print(f"Recuperados {len(pending)} cambios sin guardar del lote {batch}")
+
+    # --- Consulta ---------------------------------------------------------
+
+    @property
+    def tags(self):
+        return self.data.get('tags', [])
+
+    def tag(self, tag_id):
+        """Datos del tag, o None si no existe."""
+        return self._index.get(self._key(tag_id))
+
+    def location(self, tag_id):
+        tag = self.tag(tag_id)
+        return tag.get('location') if tag else None
+
+    # --- Cambios ----------------------------------------------------------
+
+    def set_location(self, tag_id, location, source='manual'):
+        """Cambia la ubicación de un tag y guarda."""
+        return self.update_locations({tag_id: location}, source)
+
+    def update_locations(self, locations, source='manual'):
+        """Cambia varias ubicaciones {tag: [x, y, z]} como un único lote: una
+        escritura del diario y un guardado. Devuelve el número del lote, o None
+        si no cambió nada."""
+        batch = self._journal[-1]['batch'] + 1 if self._journal else 1
+        now = time.strftime("%Y-%m-%dT%H:%M:%S")
+        entries = []
+        for tag_id, location in locations.items():
+            tag = self.tag(tag_id)
+            if tag is None:
+                print(f"No existe el tag {tag_id}")
+                continue
+            location = list(location)
+            if tag.get('location') == location:
+                continue
+            entries.append({"t": now, "batch": batch, "source": source,
+                            "tag": self._key(tag_id), "old": tag.get('location'), "new": location})
+        if not entries:
+            return None
+
+        self._append_journal(entries)
+        for entry in entries:
+            self._index[entry['tag']]['location'] = entry['new']
+        self.save()
+        return batch
+
+    def _append_journal(self, entries):
+        with open(self.journal_path, 'a') as file:
+            file.write("".join(json.dumps(e, separators=(',', ':')) + "\n" for e in entries))
+            file.flush()
+            os.fsync(file.fileno())
+        self._journal.extend(entries)
+
+    def save(self):
+        """Escribe el JSON de forma atómica: fichero temporal, fsync y rename."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump(self.data, file, indent=4)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        # El rename es duradero cuando se sincroniza el directorio
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        print("Configuración guardada.")
+
+    # --- Historial --------------------------------------------------------
+
+    def history(self, tag_id=None):
+        """Entradas del diario, de todos los tags o de uno."""
+        if tag_id is None:
+            return list(self._journal)
+        key = self._key(tag_id)
+        return [e for e in self._journal if e['tag'] == key]
+
+    def batches(self):
+        """Resumen de los lotes: [(lote, hora, origen, tags cambiados)]."""
+        summary = {}
+        for entry in self._journal:
+            batch = summary.setdefault(entry['batch'], [entry['batch'], entry['t'], entry['source'], 0])
+            batch[3] += 1
+        return [tuple(b) for b in summary.values()]
+
+    def rollback(self, batch):
+        """Deshace el lote indicado y todos los posteriores, dejando las
+        ubicaciones como estaban antes de él. La vuelta atrás es a su vez un
+        lote nuevo, así que también se puede deshacer."""
+        restored = {}
+        for entry in reversed(self._journal):
+            if entry['batch'] >= batch:
+                restored[entry['tag']] = entry['old']
+        restored = {tag: location for tag, location in restored.items() if location is not None}
+        return self.update_locations(restored, source=f'rollback:{batch}')
+
+    def undo(self):
+        """Deshace el último lote que sigue vigente y lo devuelve como
+        (lote, hora, origen, tags cambiados), o None si no queda nada.
+
+        Los lotes `rollback:N` no se deshacen: marcan que N y los posteriores
+        ya están deshechos, así que cada llamada retrocede un lote más en el
+        historial en lugar de rehacer el último cambio.
+        """
+        undone_from = None
+        for batch in reversed(self.batches()):
+            number, _, source, _ = batch
+            if source.startswith('rollback:'):
+                target = int(source.split(':', 1)[1])
+                undone_from = target if undone_from is None else min(undone_from, target)
+            elif undone_from is None or number < undone_from:
+                self.rollback(number)
+                return batch
+        return None
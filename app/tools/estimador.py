@@ -0,0 +1,192 @@
+import re
+
+import numpy as np
+
+from .cnc import DEFAULT_INIT_COMMANDS, parse_settings
+
+_WORD = re.compile(r"([A-Z])\s*(-?\d*\.?\d+)")
+
+
+class Segments:
+    """Movimientos de un programa como arrays, uno por fila."""
+
+    def __init__(self, starts, ends, feeds, rapid, dwell, stop, lines):
+        self.starts = np.asarray(starts, dtype=np.float64).reshape(-1, 3)
+        self.ends = np.asarray(ends, dtype=np.float64).reshape(-1, 3)
+        self.feeds = np.asarray(feeds, dtype=np.float64)  # mm/min (ignorado en rápidos)
+        self.rapid = np.asarray(rapid, dtype=bool)
+        self.dwell = np.asarray(dwell, dtype=np.float64)  # Espera tras el movimiento (s)
+        self.stop = np.asarray(stop, dtype=bool)  # La máquina se detiene al final
+        self.lines = lines  # Índice de la línea del programa de cada movimiento
+
+    def __len__(self):
+        return len(self.feeds)
+
+
+def parse_program(program, start=(0.0, 0.0, 0.0)):
+    """Convierte líneas G-code (o los comandos que enviaría CNCController) en
+    Segments. Entiende G0/G1, G4, G90/G91, G92, G38.x y jogs `$J=`; el resto de
+    líneas no generan movimiento."""
+    if isinstance(program, str):
+        program = program.splitlines()
+
+    position = list(start)
+    absolute = True
+    motion = 0
+    feed = 0.0
+    starts, ends, feeds, rapid, dwell, stop, lines = [], [], [], [], [], [], []
+
+    for index, raw in enumerate(program):
+        line = raw.split(';')[0].upper().strip()
+        jog = line.startswith("$J=")
+        if jog:
+            line = line[3:]
+        elif line.startswith("$") or not line:
+            continue
+
+        words = _WORD.findall(line.replace(" ", ""))
+        codes = [float(v) for k, v in words if k == "G"]
+        values = {k: float(v) for k, v in words if k != "G"}
+        line_absolute = absolute
+
+        for code in codes:
+            if code == 90:
+                line_absolute = True
+            elif code == 91:
+                line_absolute = False
+            elif code in (0, 1) or 38 <= code < 39:
+                motion = code
+        if not jog:
+            absolute = line_absolute  # En los jogs G90/G91 solo afectan a la línea
+        if "F" in values:
+            feed = values["F"]
+
+        if 4 in codes:
+            if dwell:
+                dwell[-1] += values.get("P", 0.0)
+                stop[-1] = True
+            continue
+        if 92 in codes:
+            position = [values.get(axis, p) for axis, p in zip("XYZ", position)]
+            continue
+        if not any(axis in values for axis in "XYZ"):
+            continue
+
+        target = [values[axis] if axis in values and line_absolute else
+                  p + values.get(axis, 0.0) for axis, p in zip("XYZ", position)]
+        if target != position:
+            starts.append(position)
+            ends.append(target)
+            feeds.append(feed)
+            rapid.append(motion == 0 and not jog)
+            dwell.append(0.0)
+            # Los sondeos G38 terminan parados
+            stop.append(38 <= motion < 39)
+            lines.append(index)
+        position = target
+
+    return Segments(starts, ends, feeds, rapid, dwell, stop, lines)
+
+
+class MotionEstimator:
+    """Estimador offline del tiempo de movimiento con el modelo del planificador de GRBL.
+
+    Cada movimiento es lineal, con velocidad y aceleración limitadas por el eje
+    más exigido ($110-$112, $120-$122). La velocidad en las uniones se limita
+    con la desviación de unión ($11) y el perfil de cada movimiento es
+    trapezoidal. Todo se calcula con arrays de NumPy, sin bucles por movimiento,
+    así que miles de segmentos se estiman en milisegundos y sin hardware.
+    """
+
+    def __init__(self, max_rates, accels, junction_deviation=0.01):
+        self.max_rates = np.asarray(max_rates, dtype=np.float64) / 60.0  # mm/s
+        self.accels = np.asarray(accels, dtype=np.float64)  # mm/s²
+        self.junction_deviation = junction_deviation  # mm
+
+    @classmethod
+    def from_settings(cls, init_commands=None):
+        """Crea el estimador con los ajustes $ de GRBL (lista o bloque "init")."""
+        settings = parse_settings(init_commands or DEFAULT_INIT_COMMANDS)
+        return cls([float(settings[key]) for key in (110, 111, 112)],
+                   [float(settings[key]) for key in (120, 121, 122)],
+                   float(settings.get(11, 0.01)))
+
+    def _axis_limited(self, limits, units):
+        """Límite a lo largo de cada dirección: el del eje que antes lo alcanza."""
+        with np.errstate(divide='ignore'):
+            return np.min(limits / np.abs(units), axis=-1)
+
+    def estimate_segments(self, segments):
+        """Devuelve el tiempo (s) de cada movimiento, incluida su espera."""
+        n = len(segments)
+        if n == 0:
+            return np.zeros(0)
+
+        delta = segments.ends - segments.starts
+        length = np.linalg.norm(delta, axis=1)
+        units = delta / length[:, None]
+        v_max = self._axis_limited(self.max_rates, units)
+        accel = self._axis_limited(self.accels, units)
+        nominal = np.where(segments.rapid, v_max, np.minimum(segments.feeds / 60.0, v_max))
+        nominal = np.maximum(nominal, 1e-6)  # GRBL rechaza G1 sin avance
+
+        # Límite de velocidad² en cada nodo (n + 1 nodos: inicio, uniones y final)
+        limit = np.zeros(n + 1)
+        if n > 1:
+            prev_u, next_u = units[:-1], units[1:]
+            cos_theta = np.clip(-np.sum(prev_u * next_u, axis=1), -1.0, 1.0)
+            sin_half = np.sqrt(0.5 * (1.0 - cos_theta))
+            junction = next_u - prev_u
+            norm = np.linalg.norm(junction, axis=1)
+            junction_accel = np.where(
+                norm > 0, self._axis_limited(self.accels, junction / np.maximum(norm, 1e-12)[:, None]),
+                np.minimum(accel[:-1], accel[1:]))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                v2 = junction_accel * self.junction_deviation * sin_half / (1.0 - sin_half)
+            v2 = np.where(cos_theta < -0.999999, np.inf, v2)  # En línea recta
+            v2 = np.where(cos_theta > 0.999999, 0.0, v2)  # Inversión de sentido
+            v2 = np.minimum(v2, np.minimum(nominal[:-1], nominal[1:]) ** 2)
+            limit[1:-1] = np.where(segments.stop[:-1], 0.0, v2)
+
+        # Pasadas hacia atrás y hacia delante sin bucles: con c = 2·a·d por
+        # movimiento y C su suma acumulada, la velocidad² máxima de cada nodo es
+        # min_m(limit_m + |C_k - C_m|), que se separa en dos mínimos acumulados.
+        c = 2.0 * accel * length
+        cumulative = np.concatenate(([0.0], np.cumsum(c)))
+        backward = np.minimum.accumulate((limit + cumulative)[::-1])[::-1] - cumulative
+        forward = np.minimum.accumulate(limit - cumulative) + cumulative
+        speed2 = np.minimum(limit, np.minimum(backward, forward))
+        v_entry = np.sqrt(np.maximum(speed2[:-1], 0.0))
+        v_exit = np.sqrt(np.maximum(speed2[1:], 0.0))
+
+        # Perfil trapezoidal, o triangular si no llega a la velocidad nominal
+        accel_dist = (nominal ** 2 - v_entry ** 2) / (2.0 * accel)
+        decel_dist = (nominal ** 2 - v_exit ** 2) / (2.0 * accel)
+        cruise = length - accel_dist - decel_dist
+        peak = np.sqrt(np.maximum((2.0 * accel * length + v_entry ** 2 + v_exit ** 2) / 2.0, 0.0))
+        peak = np.where(cruise >= 0, nominal, peak)
+        times = (peak - v_entry) / accel + (peak - v_exit) / accel
+        times += np.where(cruise >= 0, cruise / nominal, 0.0)
+        return times + segments.dwell
+
+    def estimate(self, program, start=(0.0, 0.0, 0.0)):
+        """Estima un programa: devuelve (tiempo de cada movimiento, total) en segundos."""
+        times = self.estimate_segments(parse_program(program, start))
+        return times, float(times.sum())
+
+    def pairwise_times(self, points):
+        """Matriz de tiempos de ir en línea recta de cada punto a cada otro,
+        partiendo y terminando parado."""
+        points = np.asarray(points, dtype=np.float64)
+        if points.shape[1] < 3:
+            points = np.pad(points, ((0, 0), (0, 3 - points.shape[1])))
+        delta = points[None, :, :] - points[:, None, :]
+        length = np.linalg.norm(delta, axis=-1)
+        safe = np.where(length > 0, length, 1.0)
+        units = delta / safe[..., None]
+        v_max = self._axis_limited(self.max_rates, units)
+        accel = self._axis_limited(self.accels, units)
+        with np.errstate(invalid='ignore'):
+            triangular = length < v_max ** 2 / accel
+            times = np.where(triangular, 2.0 * np.sqrt(length / accel), length / v_max + v_max / accel)
+        return np.where(length > 0, times, 0.0)
@@ -0,0 +1,150 @@
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+class FrameRecorder:
+    """Anillo de frames recientes para grabar lo ocurrido antes y después de un evento.
+
+    Los frames se guardan reducidos (`width` de ancho, a `fps`) en un anillo
+    preasignado sobre un np.memmap, así no se reserva memoria por frame y el
+    anillo puede vivir en un fichero (por defecto en /dev/shm, en RAM, para no
+    desgastar la tarjeta SD). El hilo de captura solo deja una referencia al
+    frame en una cola; el escalado, la copia al anillo y los guardados los hace
+    un hilo propio, así que el anillo no cambia mientras se guarda.
+
+    `trigger(evento)` programa el guardado de los `pre` segundos anteriores y
+    los `post` siguientes en un AVI MJPG. Los eventos que llegan mientras hay un
+    guardado pendiente amplían su ventana en lugar de crear otro fichero.
+    """
+
+    def __init__(self, camera, output_dir='./app/recordings', pre=5.0, post=5.0, fps=10,
+                 width=640, buffer_path=None, events=('stop', 'reset', 'home', 'alarm')):
+        self.camera = camera
+        self.output_dir = output_dir
+        self.pre = pre
+        self.post = post
+        self.fps = fps
+        self.width = width
+        self.events = events  # Eventos de la CNC que disparan una grabación
+        self.capacity = int((pre + post) * fps) + 1
+        shm = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        self.buffer_path = buffer_path or os.path.join(shm, f'cnc-frames-{os.getpid()}.raw')
+
+        self._frames = None  # np.memmap (capacidad, alto, ancho, 3), creado con el primer frame
+        self._times = np.zeros(self.capacity)  # Instante de cada hueco (0 = vacío)
+        self._write_count = 0  # Frames escritos en total; el hueco es count % capacity
+        self._incoming = deque(maxlen=4)  # Referencias dejadas por el hilo de captura
+        self._wakeup = threading.Condition()
+        self._next_time = 0.0  # Próximo instante en que se admite un frame
+        self._running = False
+        self._thread = None
+        self._pending = None  # [inicio, fin, nombre] del guardado programado
+        self.saved = []  # Rutas de las grabaciones guardadas
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self.camera.add_frame_listener(self._on_frame)
+        self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        with self._wakeup:
+            self._wakeup.notify_all()
+        if self._thread:
+            self._thread.join(timeout=2)
+        if self._frames is not None:
+            del self._frames
+            self._frames = None
+
+    def attach(self, cnc):
+        """Graba automáticamente con los eventos y alarmas de la CNC."""
+        cnc.add_listener("event", self.trigger)
+        cnc.add_listener("alarm", lambda line: self.trigger("alarm"))
+
+    def _on_frame(self, seq, frame):
+        # Se llama en el hilo de captura: solo se guarda la referencia
+        now = time.monotonic()
+        if now < self._next_time:
+            return
+        interval = 1.0 / self.fps
+        self._next_time = max(self._next_time + interval, now - interval)
+        self._incoming.append((now, frame))
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def _allocate(self, frame):
+        h, w = frame.shape[:2]
+        height = int(round(h * self.width / w)) if w > self.width else h
+        width = min(self.width, w)
+        self._size = (width, height)
+        self._frames = np.memmap(self.buffer_path, dtype=np.uint8, mode='w+',
+                                 shape=(self.capacity, height, width, 3))
+        # La proyección sigue valiendo sin el nombre: así el fichero (decenas de
+        # MB en /dev/shm) desaparece al cerrar el proceso aunque no se llame a stop
+        os.unlink(self.buffer_path)
+
+    def _store(self, timestamp, frame):
+        if self._frames is None:
+            self._allocate(frame)
+        slot = self._write_count % self.capacity
+        target = self._frames[slot]
+        if frame.shape[1::-1] == self._size:
+            np.copyto(target, frame)
+        else:
+            cv2.resize(frame, self._size, dst=target, interpolation=cv2.INTER_AREA)
+        self._times[slot] = timestamp
+        self._write_count += 1
+
+    def trigger(self, event):
+        """Programa la grabación alrededor de ahora. Se puede llamar desde cualquier hilo."""
+        if event not in self.events:
+            return
+        now = time.monotonic()
+        with self._wakeup:
+            if self._pending is not None and now - self.pre <= self._pending[1]:
+                # Evento durante una ventana pendiente: se alarga
+                self._pending[1] = min(now + self.post, self._pending[0] + (self.capacity - 1) / self.fps)
+            else:
+                name = time.strftime("%Y%m%d-%H%M%S") + f"_{event}.avi"
+                self._pending = [now - self.pre, now + self.post, name]
+            self._wakeup.notify()
+
+    def _run(self):
+        while self._running:
+            with self._wakeup:
+                self._wakeup.wait_for(lambda: self._incoming or self._due() or not self._running,
+                                      timeout=0.5)
+                due = self._due()
+                if due:
+                    pending, self._pending = self._pending, None
+            while self._incoming:
+                self._store(*self._incoming.popleft())
+            if due:
+                self._save(*pending)
+
+    def _due(self):
+        return self._pending is not None and time.monotonic() >= self._pending[1]
+
+    def _save(self, start, end, name):
+        if self._frames is None:
+            return
+        slots = [s for s in np.argsort(self._times) if start <= self._times[s] <= end]
+        if not slots:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, name)
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), self.fps, self._size)
+        for slot in slots:
+            writer.write(np.asarray(self._frames[slot]))
+        writer.release()
+        self.saved.append(path)
+        print(f"Grabación guardada: {path} ({len(slots)} frames, {end - start:.1f} s)")
@@ -0,0 +1,80 @@
+import time
+
+
+def _parse_floats(value):
+    return tuple(float(v) for v in value.split(','))
+
+
+class MachineState:
+    """Estado de la máquina a partir de los reportes de estado `<...>` de GRBL.
+
+    GRBL envía MPos o WPos según `$10` y solo incluye WCO de vez en cuando, así
+    que se guarda el último WCO recibido para calcular siempre ambas posiciones.
+    """
+
+    def __init__(self):
+        self.state = "Unknown"  # Idle, Run, Hold, Jog, Alarm, Door, Check, Home, Sleep
+        self.substate = None  # Código tras los dos puntos, p. ej. Hold:0
+        self.mpos = (0.0, 0.0, 0.0)  # Posición de máquina
+        self.wpos = (0.0, 0.0, 0.0)  # Posición de trabajo
+        self.wco = (0.0, 0.0, 0.0)  # Desplazamiento de trabajo (último recibido)
+        self.planner_free = None  # Bf: bloques libres del planificador
+        self.rx_free = None  # Bf: bytes libres del buffer RX
+        self.feed = 0.0  # FS: avance actual (mm/min)
+        self.spindle = 0.0  # FS: velocidad del husillo
+        self.pins = ""  # Pn: entradas activas (X, Y, Z, P, D, H, R, S)
+        self.overrides = (100, 100, 100)  # Ov: avance, rápidos y husillo (%)
+        self.updated_at = 0.0  # time.monotonic() del último reporte
+
+    def update(self, report):
+        """Actualiza el estado con una línea `<...>` recibida de GRBL."""
+        fields = report.strip().strip('<>').split('|')
+        state, _, substate = fields[0].partition(':')
+        self.state = state
+        self.substate = int(substate) if substate else None
+
+        mpos = wpos = None
+        self.pins = ""  # Pn solo aparece si hay alguna entrada activa
+        for field in fields[1:]:
+            key, _, value = field.partition(':')
+            if key == "MPos":
+                mpos = _parse_floats(value)
+            elif key == "WPos":
+                wpos = _parse_floats(value)
+            elif key == "WCO":
+                self.wco = _parse_floats(value)
+            elif key == "Bf":
+                self.planner_free, self.rx_free = (int(v) for v in value.split(','))
+            elif key == "FS":
+                self.feed, self.spindle = _parse_floats(value)
+            elif key == "F":
+                self.feed = float(value)
+            elif key == "Pn":
+                self.pins = value
+            elif key == "Ov":
+                self.overrides = tuple(int(v) for v in value.split(','))
+
+        # WPos = MPos - WCO
+        if mpos is not None:
+            self.mpos = mpos
+            self.wpos = tuple(m - o for m, o in zip(mpos, self.wco))
+        elif wpos is not None:
+            self.wpos = wpos
+            self.mpos = tuple(w + o for w, o in zip(wpos, self.wco))
+
+        self.updated_at = time.monotonic()
+        return self
+
+    def is_idle(self):
+        return self.state == "Idle"
+
+    def at_position(self, x=None, y=None, z=None, tolerance=0.01):
+        """Indica si la posición de trabajo coincide con las coordenadas dadas."""
+        for target, current in zip((x, y, z), self.wpos):
+            if target is not None and abs(current - target) >= tolerance:
+                return False
+        return True
+
+    def __repr__(self):
+        x, y, z = self.wpos
+        return f"<MachineState {self.state} WPos:{x:.3f},{y:.3f},{z:.3f}>"
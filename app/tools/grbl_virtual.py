@@ -0,0 +1,534 @@
+"""Emulador de GRBL 1.1 sobre un pseudo-terminal para trabajar sin la máquina.
+
+Expone una ruta /dev/pts/N que acepta CNCController(serial_ports=[...]). Imita
+el protocolo de líneas con su buffer RX de 128 bytes, la cola del
+planificador, los comandos en tiempo real, los ajustes $, el homing, los
+reportes de estado y las alarmas, con movimientos que duran lo que durarían en
+la máquina según MotionEstimator. Abrir el puerto reinicia la placa como el
+DTR de un Arduino: el mensaje de bienvenida llega tras `boot_time`.
+
+Uso desde app/:  python -m tools.grbl_virtual
+"""
+import fcntl
+import os
+import re
+import struct
+import termios
+import threading
+import time
+import tty
+from collections import deque
+
+from .cnc import DEFAULT_INIT_COMMANDS, GRBL_RX_BUFFER_SIZE, parse_settings
+from .estimador import MotionEstimator, Segments
+
+PLANNER_BLOCKS = 15  # Bloques útiles del planificador de GRBL en un ATmega328p
+BANNER = "Grbl 1.1h ['$' for help]"
+_WORD = re.compile(r"([A-Z])(-?\d*\.?\d+)")
+
+
+class _Block:
+    """Movimiento en la cola del planificador, en coordenadas de máquina."""
+
+    def __init__(self, start, end, feed, rapid, jog=False, probe=None, dwell=0.0):
+        self.start = start
+        self.end = end
+        self.feed = feed
+        self.rapid = rapid
+        self.jog = jog
+        self.probe = probe  # None, "G38.2", "G38.3"...
+        self.dwell = dwell  # Solo para G4: espera sin movimiento
+
+
+class VirtualGrbl:
+    def __init__(self, settings=None, time_scale=1.0, eeprom_delay=0.005, probe_surface=None,
+                 boot_time=0.05):
+        self.settings = parse_settings(settings or DEFAULT_INIT_COMMANDS)
+        self.time_scale = time_scale  # >1 acelera la simulación
+        self.eeprom_delay = eeprom_delay  # Tiempo sin atender el puerto al escribir un ajuste
+        self.probe_surface = probe_surface  # z = f(x, y) de la superficie para G38.x
+        self.boot_time = boot_time  # Segundos desde que se abre el puerto hasta el mensaje
+
+        self.port = None
+        self._master = None
+        self._slave = None
+        self._running = False
+        self._threads = []
+        self._write_lock = threading.Lock()
+        self._lock = threading.Condition()
+
+        # Buffer RX y estadísticas del protocolo
+        self._rx = bytearray()
+        self.rx_overflows = 0  # Bytes perdidos por llenar el buffer RX
+        self.rx_dropped = 0  # Bytes perdidos mientras se escribía la EEPROM
+        self._eeprom_busy_until = 0.0
+        self.lines_received = 0
+
+        # Estado de la máquina
+        self._planner = deque()
+        self._current = None  # Bloque en ejecución
+        self._block_start = 0.0
+        self._block_duration = 0.0
+        self._block_elapsed = 0.0
+        self._probe_result = None
+        self.mpos = [0.0, 0.0, 0.0]
+        self.wco = [0.0, 0.0, 0.0]
+        self.state = "Idle"
+        self.hold = False
+        self.overrides = [100, 100, 100]
+        self._absolute = True
+        self._motion = 0
+        self._feed = 0.0
+        self._reports = 0
+        self._reset_generation = 0
+        self._estimator = self._make_estimator()
+
+    # --- Puerto -----------------------------------------------------------
+
+    def start(self):
+        """Crea el pseudo-terminal y arranca el emulador. Devuelve la ruta del puerto."""
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        # Modo paquete: el vaciado de entrada que hace pyserial al abrir el
+        # puerto llega como un aviso, que aquí hace de reinicio por DTR
+        fcntl.ioctl(self._master, termios.TIOCPKT, struct.pack('i', 1))
+        self.port = os.ttyname(self._slave)
+        self._running = True
+        for target, name in ((self._reader, "grbl-rx"), (self._processor, "grbl-lines"),
+                             (self._executor, "grbl-motion")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self._boot()
+        return self.port
+
+    def stop(self):
+        self._running = False
+        with self._lock:
+            self._lock.notify_all()
+        for fd in (self._slave, self._master):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+
+    def _send(self, text):
+        with self._write_lock:
+            if self._master is not None:
+                os.write(self._master, f"{text}\r\n".encode())
+
+    def _boot(self):
+        self._send("")
+        self._send(BANNER)
+        if self.settings.get(22, "0") not in ("0", "0.000"):
+            self.state = "Alarm"  # Con homing activo GRBL arranca bloqueado
+            self._send("[MSG:'$H'|'$X' to unlock]")
+
+    # --- Recepción y comandos en tiempo real ------------------------------
+
+    def _reader(self):
+        while self._running:
+            try:
+                packet = os.read(self._master, 1025)
+            except OSError:
+                break
+            if packet[0] != termios.TIOCPKT_DATA:
+                if packet[0] & termios.TIOCPKT_FLUSHREAD:
+                    self._port_opened()
+                continue
+            data = packet[1:]
+            now = time.monotonic()
+            with self._lock:
+                for byte in data:
+                    if self._realtime(byte):
+                        continue
+                    if now < self._eeprom_busy_until:
+                        self.rx_dropped += 1
+                    elif len(self._rx) >= GRBL_RX_BUFFER_SIZE:
+                        self.rx_overflows += 1
+                    else:
+                        self._rx.append(byte)
+                self._lock.notify_all()
+
+    def _realtime(self, byte):
+        """Atiende un byte en tiempo real. Se llama con `_lock` tomado."""
+        if byte == ord('?'):
+            self._send(self._status_report())
+        elif byte == ord('!'):
+            if self.state in ("Run", "Jog"):
+                self.hold = True
+                self.state = "Hold:0"
+        elif byte == ord('~'):
+            if self.hold:
+                self.hold = False
+                self.state = "Jog" if self._current and self._current.jog else "Run"
+        elif byte == 0x18:
+            self._soft_reset()
+        elif byte == 0x85:
+            if self.state == "Jog" or (self._current and self._current.jog):
+                self._stop_motion()
+        elif 0x90 <= byte <= 0x94:
+            steps = {0x91: 10, 0x92: -10, 0x93: 1, 0x94: -1}
+            self.overrides[0] = 100 if byte == 0x90 else min(200, max(10, self.overrides[0] + steps[byte]))
+        elif 0x95 <= byte <= 0x97:
+            self.overrides[1] = {0x95: 100, 0x96: 50, 0x97: 25}[byte]
+        else:
+            return False
+        return True
+
+    def _stop_motion(self):
+        """Detiene el movimiento donde esté y vacía el planificador."""
+        self.mpos = self._interpolated_position()
+        self._planner.clear()
+        self._current = None
+        self.hold = False
+        if not self.state.startswith("Alarm"):
+            self.state = "Idle"
+        self._lock.notify_all()
+
+    def _soft_reset(self):
+        moving = self._current is not None
+        self._stop_motion()
+        self._rx.clear()
+        self._reset_generation += 1
+        self._send("")
+        self._send(BANNER)
+        if moving:
+            # Posición perdida: GRBL exige homing o desbloqueo
+            self.state = "Alarm"
+            self._send("ALARM:3")
+        elif self.state == "Alarm":
+            self._send("[MSG:'$H'|'$X' to unlock]")
+
+    def _port_opened(self):
+        """Reinicio al abrir el puerto: se pierde todo y arranca tras `boot_time`."""
+        with self._lock:
+            self._stop_motion()
+            self._rx.clear()
+            self._reset_generation += 1
+            self.state = "Idle"
+        timer = threading.Timer(self.boot_time, self._boot)
+        timer.daemon = True
+        timer.start()
+
+    def trigger_alarm(self, code):
+        """Provoca una alarma como las de GRBL (p. ej. 1 = límite físico)."""
+        with self._lock:
+            self._stop_motion()
+            self.state = "Alarm"
+            self._send(f"ALARM:{code}")
+
+    def _status_report(self):
+        position = self._interpolated_position()
+        report_mpos = int(float(self.settings.get(10, 1))) & 1
+        if report_mpos:
+            fields = ["MPos:" + ",".join(f"{v:.3f}" for v in position)]
+        else:
+            fields = ["WPos:" + ",".join(f"{p - o:.3f}" for p, o in zip(position, self.wco))]
+        fields.append(f"Bf:{PLANNER_BLOCKS - len(self._planner)},{GRBL_RX_BUFFER_SIZE - len(self._rx)}")
+        feed = 0.0
+        if self._current is not None and not self.hold and self._block_duration > 0:
+            length = sum((b - a) ** 2 for a, b in zip(self._current.start, self._current.end)) ** 0.5
+            feed = length / self._block_duration * 60.0  # Avance medio del bloque
+        fields.append(f"FS:{feed:.0f},0")
+        # WCO y Ov no van en todos los reportes, como en GRBL
+        if self._reports % 10 == 0:
+            fields.append("WCO:" + ",".join(f"{v:.3f}" for v in self.wco))
+        elif self._reports % 10 == 1:
+            fields.append("Ov:" + ",".join(str(v) for v in self.overrides))
+        self._reports += 1
+        state = "Hold:0" if self.hold else self.state
+        return "<" + "|".join([state] + fields) + ">"
+
+    # --- Procesado de líneas -----------------------------------------------
+
+    def _processor(self):
+        while self._running:
+            with self._lock:
+                self._lock.wait_for(lambda: b"\n" in self._rx or not self._running)
+                if not self._running:
+                    break
+                raw, _, rest = bytes(self._rx).partition(b"\n")
+                generation = self._reset_generation
+            line = raw.decode(errors="replace").strip().replace(" ", "").upper()
+            self.lines_received += 1
+            response = self._execute(line, generation)
+            with self._lock:
+                # El buffer RX se libera cuando GRBL termina con la línea
+                if generation == self._reset_generation:
+                    del self._rx[:len(raw) + 1]
+                    if response is not None:
+                        self._send(response)
+
+    def _execute(self, line, generation):
+        if not line:
+            return "ok"
+        if line.startswith("$"):
+            return self._system_command(line, generation)
+        if self.state == "Alarm":
+            return "error:9"
+        return self._gcode(line, generation)
+
+    def _system_command(self, line, generation):
+        if line == "$$":
+            for key, value in sorted(self.settings.items()):
+                self._send(f"${key}={value}")
+            return "ok"
+        if line == "$H":
+            return self._home(generation)
+        if line == "$X":
+            if self.state == "Alarm":
+                self.state = "Idle"
+                self._send("[MSG:Caution: Unlocked]")
+            return "ok"
+        if line == "$G":
+            mode = "G90" if self._absolute else "G91"
+            self._send(f"[GC:G{self._motion:g} G54 G17 G21 {mode} G94 M5 M9 T0 F{self._feed:g} S0]")
+            return "ok"
+        if line == "$I":
+            self._send("[VER:1.1h.20190825:]")
+            return "ok"
+        if line.startswith("$J="):
+            if self.state not in ("Idle", "Jog"):
+                return "error:8"
+            return self._gcode(line[3:], generation, jog=True)
+        match = re.fullmatch(r"\$(\d+)=(-?\d*\.?\d+)", line)
+        if match:
+            key = int(match.group(1))
+            if key not in self.settings:
+                return "error:3"
+            self.settings[key] = match.group(2)
+            self._estimator = self._make_estimator()
+            # Mientras escribe la EEPROM GRBL no atiende el puerto serie
+            with self._lock:
+                self._eeprom_busy_until = time.monotonic() + self.eeprom_delay
+            time.sleep(self.eeprom_delay)
+            return "ok"
+        return "ok" if line in ("$#", "$N", "$C", "$SLP") else "error:3"
+
+    def _home(self, generation):
+        if self.settings.get(22, "0") in ("0", "0.000"):
+            return "error:5"
+        self._wait_idle(generation)
+        self.state = "Home"
+        seek = float(self.settings.get(25, 500)) / 60.0
+        distance = max(abs(v) for v in self.mpos) or 1.0
+        self._sleep(distance / seek + 0.5, generation)  # Búsqueda, retroceso y localización
+        with self._lock:
+            if generation != self._reset_generation:
+                return None
+            self.mpos = [0.0, 0.0, 0.0]
+            self.state = "Idle"
+        return "ok"
+
+    def _gcode(self, line, generation, jog=False):
+        words = _WORD.findall(line)
+        if not words or len(words) != len(re.findall(r"[A-Z]", line)):
+            return "error:1"
+        codes = [float(v) for k, v in words if k == "G"]
+        values = {k: float(v) for k, v in words if k != "G"}
+        absolute = self._absolute
+        motion = self._motion
+        for code in codes:
+            if code == 90:
+                absolute = True
+            elif code == 91:
+                absolute = False
+            elif code in (0, 1) or 38.2 <= code <= 38.5:
+                motion = code
+            elif code not in (4, 92, 17, 21, 54, 94):
+                return "error:20"
+        if not jog:
+            self._absolute, self._motion = absolute, motion
+        if "F" in values:
+            if not jog:
+                self._feed = values["F"]
+        feed = values.get("F", 0.0 if jog else self._feed)  # Los jogs exigen su propio F
+
+        if 4 in codes:
+            # G4 espera a que termine todo lo planificado antes de contestar
+            self._wait_idle(generation)
+            self._sleep(values.get("P", 0.0), generation)
+            return "ok"
+        if 92 in codes:
+            self._wait_idle(generation)
+            with self._lock:
+                self.wco = [self.mpos[i] - values[a] if a in values else self.wco[i]
+                            for i, a in enumerate("XYZ")]
+            return "ok"
+        if not any(axis in values for axis in "XYZ"):
+            return "ok"
+        if (motion == 1 or jog or motion >= 38) and feed <= 0:
+            return "error:22"
+
+        end = self._planned_end()
+        target = []
+        for i, axis in enumerate("XYZ"):
+            if axis not in values:
+                target.append(end[i])
+            elif absolute:
+                target.append(values[axis] + self.wco[i])
+            else:
+                target.append(end[i] + values[axis])
+
+        if target == end:
+            return "ok"  # GRBL descarta los bloques de longitud cero
+
+        probe = None
+        if motion >= 38:
+            probe = f"G{motion:g}"
+        block = _Block(end, target, feed, rapid=(motion == 0 and not jog), jog=jog, probe=probe)
+
+        # Sin hueco en el planificador la línea espera y el buffer RX se llena
+        with self._lock:
+            self._lock.wait_for(lambda: len(self._planner) < PLANNER_BLOCKS or
+                                generation != self._reset_generation or not self._running)
+            if generation != self._reset_generation:
+                return None
+            self._planner.append(block)
+            if self.state == "Idle":
+                self.state = "Jog" if jog else "Run"
+            self._lock.notify_all()
+
+        if probe is not None:
+            # Los sondeos se sincronizan: el ok llega al terminar
+            self._wait_idle(generation)
+            if generation != self._reset_generation:
+                return None
+        return "ok"
+
+    def _planned_end(self):
+        with self._lock:
+            if self._planner:
+                return list(self._planner[-1].end)
+            if self._current is not None:
+                return list(self._current.end)
+            return list(self.mpos)
+
+    def _wait_idle(self, generation):
+        with self._lock:
+            self._lock.wait_for(lambda: (not self._planner and self._current is None) or
+                                generation != self._reset_generation or not self._running)
+
+    def _sleep(self, seconds, generation):
+        deadline = time.monotonic() + seconds / self.time_scale
+        while time.monotonic() < deadline and generation == self._reset_generation and self._running:
+            time.sleep(min(0.005, max(0.0, deadline - time.monotonic())))
+
+    # --- Ejecución de movimientos ------------------------------------------
+
+    def _make_estimator(self):
+        return MotionEstimator([float(self.settings[k]) for k in (110, 111, 112)],
+                               [float(self.settings[k]) for k in (120, 121, 122)],
+                               float(self.settings.get(11, 0.01)))
+
+    def _block_time(self, previous, block, following):
+        """Duración del bloque con la velocidad de unión que permiten sus vecinos."""
+        chain = ([previous] if previous is not None else []) + [block] + following[:PLANNER_BLOCKS]
+        segments = Segments([b.start for b in chain], [b.end for b in chain],
+                            [b.feed for b in chain], [b.rapid for b in chain],
+                            [0.0] * len(chain), [b.probe is not None for b in chain], None)
+        times = self._estimator.estimate_segments(segments)
+        seconds = float(times[1 if previous is not None else 0])
+        override = self.overrides[1] if block.rapid else self.overrides[0]
+        return seconds * 100.0 / override
+
+    def _interpolated_position(self):
+        if self._current is None or self._block_duration <= 0:
+            return list(self.mpos)
+        elapsed = self._block_elapsed
+        if not self.hold:
+            elapsed += (time.monotonic() - self._block_start) * self.time_scale
+        fraction = min(1.0, elapsed / self._block_duration)
+        return [a + (b - a) * fraction for a, b in zip(self._current.start, self._current.end)]
+
+    def _executor(self):
+        previous = None
+        while self._running:
+            with self._lock:
+                self._lock.wait_for(lambda: self._planner or not self._running)
+                if not self._running:
+                    break
+                block = self._planner.popleft()
+                if self.state == "Idle":
+                    self.state = "Jog" if block.jog else "Run"
+                self._current = block
+                self._probe_result = None
+                self._block_duration = self._block_time(previous, block, list(self._planner))
+                self._block_elapsed = 0.0
+                self._block_start = time.monotonic()
+                self._lock.notify_all()
+            generation = self._reset_generation
+
+            finished = self._run_block(block, generation)
+            with self._lock:
+                if generation == self._reset_generation and self._current is block:
+                    if finished:
+                        self.mpos = list(block.end)
+                    self._current = None
+                    previous = block if finished and block.probe is None else None
+                else:
+                    previous = None  # Reinicio, parada o sondeo que tocó: se parte de parado
+                if not self._planner:
+                    # Planificador vacío: la máquina se detiene y el siguiente
+                    # bloque arranca desde parado
+                    previous = None
+                    if self._current is None and not self.state.startswith("Alarm"):
+                        self.state = "Idle"
+                self._lock.notify_all()
+
+    def _run_block(self, block, generation):
+        """Espera lo que dura el bloque respetando las pausas. Devuelve True si
+        el bloque llegó a su destino."""
+        while self._running and generation == self._reset_generation and self._current is block:
+            with self._lock:
+                if self.hold:
+                    self._lock.wait(0.01)
+                    if not self.hold:
+                        self._block_start = time.monotonic()
+                    continue
+                now = time.monotonic()
+                self._block_elapsed += (now - self._block_start) * self.time_scale
+                self._block_start = now
+                if block.probe is not None and self._probe_touched(block):
+                    return False
+                if self._block_elapsed >= self._block_duration:
+                    if block.probe is not None:
+                        self._probe_failed(block)
+                    return True
+            time.sleep(0.002)
+        return False
+
+    def _probe_touched(self, block):
+        """Comprueba si el sondeo tocó la superficie. Se llama con `_lock` tomado."""
+        if self.probe_surface is None:
+            return False
+        position = self._interpolated_position()
+        # La superficie se da en coordenadas de trabajo
+        surface = self.probe_surface(position[0] - self.wco[0], position[1] - self.wco[1])
+        if position[2] - self.wco[2] > surface:
+            return False
+        position[2] = surface + self.wco[2]
+        self.mpos = position
+        self._probe_result = position
+        self._send("[PRB:" + ",".join(f"{v:.3f}" for v in position) + ":1]")
+        self._current = None
+        self._planner.clear()
+        return True
+
+    def _probe_failed(self, block):
+        self._probe_result = None
+        self._send("[PRB:" + ",".join(f"{v:.3f}" for v in block.end) + ":0]")
+        if block.probe in ("G38.2", "G38.4"):
+            self._planner.clear()
+            self.state = "Alarm"
+            self._send("ALARM:5")
+
+
+if __name__ == '__main__':
+    grbl = VirtualGrbl()
+    print(f"GRBL virtual en {grbl.start()}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        grbl.stop()
@@ -0,0 +1,174 @@
+import json
+
+import cv2
+import numpy as np
+
+
+class InventoryScanner:
+    """Detecta qué posiciones tienen placa con uno o pocos frames del tablero.
+
+    Con la homografía píxel-máquina se calcula desde dónde ve la cámara cada
+    tag (`location` y `width`), se agrupan los tags en las menos vistas
+    posibles y, en cada frame, se recortan todas sus regiones a la vez a un
+    tamaño común. La media y la densidad de bordes de todas las regiones se
+    calculan juntas con NumPy y se comparan con las del tablero vacío
+    (`reference`, medida con `capture_reference`): una posición está ocupada
+    si alguna de las dos se aparta más de su tolerancia.
+    """
+
+    def __init__(self, cnc, camera, homography, tags, reference=None, camera_z=0,
+                 roi_scale=0.8, roi_size=32, edge_threshold=20, mean_tolerance=25.0,
+                 edge_tolerance=0.15, settle_frames=2, frame_margin=0.1):
+        self.cnc = cnc
+        self.camera = camera
+        self.homography = homography
+        self.tags = {tag['tag']: tag for tag in tags}
+        self.reference = reference  # {tag: (media, densidad de bordes)} del tablero vacío
+        self.camera_z = camera_z  # Z a la que se mira el tablero
+        self.roi_scale = roi_scale  # Fracción del ancho del tag que se analiza
+        self.roi_size = roi_size  # Lado en píxeles al que se reduce cada región
+        self.edge_threshold = edge_threshold  # Gradiente mínimo para contar un borde
+        self.mean_tolerance = mean_tolerance
+        self.edge_tolerance = edge_tolerance
+        self.settle_frames = settle_frames
+        self.frame_margin = frame_margin  # Margen del frame que no se usa (bordes distorsionados)
+
+    def _pixel_box(self, tag, position):
+        """Rectángulo (u0, v0, u1, v1) del tag visto desde `position`."""
+        x, y = tag['location'][:2]
+        half = tag.get('width', 20) * self.roi_scale / 2
+        pixels = np.array([self.homography.machine_to_pixel(x + dx, y + dy, position)
+                           for dx in (-half, half) for dy in (-half, half)])
+        u0, v0 = pixels.min(axis=0)
+        u1, v1 = pixels.max(axis=0)
+        return u0, v0, u1, v1
+
+    def _visible(self, box, size):
+        w, h = size
+        mu, mv = w * self.frame_margin, h * self.frame_margin
+        u0, v0, u1, v1 = box
+        return u0 >= mu and v0 >= mv and u1 <= w - mu and v1 <= h - mv
+
+    def plan_views(self, size):
+        """Agrupa los tags en vistas: [(posición XY de la cámara, [tags])].
+
+        Cada vista se centra en el tag libre más a la izquierda y abajo y se
+        queda con todos los tags libres que caben enteros en el frame.
+        """
+        tool = self.homography.tool_offset
+        pending = sorted(self.tags.values(), key=lambda t: (t['location'][0], t['location'][1]))
+        views = []
+        while pending:
+            first = pending[0]
+            # Centro del frame sobre el centro de los tags cercanos al primero
+            group = [first] + [t for t in pending[1:] if self._visible(
+                self._pixel_box(t, self._position_for(first, tool)), size)]
+            cx = np.mean([t['location'][0] for t in group])
+            cy = np.mean([t['location'][1] for t in group])
+            position = (float(cx - tool[0]), float(cy - tool[1]))
+            seen = [t for t in pending if self._visible(self._pixel_box(t, position), size)]
+            if first not in seen:
+                position = self._position_for(first, tool)
+                seen = [t for t in pending if self._visible(self._pixel_box(t, position), size)]
+            if not seen:
+                seen = [first]  # Tag más grande que el frame: se analiza igualmente recortado
+            views.append((position, seen))
+            pending = [t for t in pending if t not in seen]
+        return views
+
+    @staticmethod
+    def _position_for(tag, tool):
+        x, y = tag['location'][:2]
+        return (x - tool[0], y - tool[1])
+
+    def _capture(self, position):
+        x, y = position
+        self.cnc.move_to(x=x, y=y, z=self.camera_z)
+        self.cnc.wait_for_position_reached(x=x, y=y, z=self.camera_z)
+        seq = self.camera.get_latest_frame()[0]
+        latest = self.camera.wait_for_frame(after_seq=seq + self.settle_frames, timeout=2)
+        if latest is None:
+            raise RuntimeError("No llegan frames de la cámara")
+        return latest[2]
+
+    def extract(self, frame, tags, position):
+        """Recorta las regiones de `tags` en un lote (N, roi_size, roi_size)."""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        h, w = gray.shape
+        batch = np.empty((len(tags), self.roi_size, self.roi_size), dtype=np.float32)
+        for k, tag in enumerate(tags):
+            u0, v0, u1, v1 = self._pixel_box(tag, position)
+            u0, v0 = max(int(u0), 0), max(int(v0), 0)
+            u1, v1 = min(int(np.ceil(u1)), w), min(int(np.ceil(v1)), h)
+            if u1 - u0 < 2 or v1 - v0 < 2:
+                batch[k] = np.nan
+                continue
+            batch[k] = cv2.resize(gray[v0:v1, u0:u1], (self.roi_size, self.roi_size),
+                                  interpolation=cv2.INTER_AREA)
+        return batch
+
+    def statistics(self, batch):
+        """Media y densidad de bordes de cada región del lote."""
+        means = batch.mean(axis=(1, 2))
+        gx = np.abs(np.diff(batch, axis=2))[:, :-1, :]
+        gy = np.abs(np.diff(batch, axis=1))[:, :, :-1]
+        edges = ((gx + gy) > self.edge_threshold).mean(axis=(1, 2))
+        return means, edges
+
+    def measure(self):
+        """Recorre las vistas y devuelve {tag: (media, densidad de bordes)}."""
+        latest = self.camera.get_latest_frame()
+        if latest[2] is None:
+            latest = self.camera.wait_for_frame(timeout=2)
+            if latest is None:
+                raise RuntimeError("No llegan frames de la cámara")
+        size = latest[2].shape[1::-1]
+        results = {}
+        for position, tags in self.plan_views(size):
+            frame = self._capture(position)
+            means, edges = self.statistics(self.extract(frame, tags, position))
+            for tag, mean, edge in zip(tags, means, edges):
+                if not np.isnan(mean):
+                    results[tag['tag']] = (float(mean), float(edge))
+        return results
+
+    def capture_reference(self):
+        """Mide el tablero vacío y lo guarda como referencia."""
+        self.reference = self.measure()
+        return self.reference
+
+    def scan(self):
+        """Devuelve el mapa de ocupación {tag: True/False}. Los tags que no se
+        pudieron ver o sin referencia se dan por ocupados, para no saltarlos."""
+        if self.reference is None:
+            raise ValueError("Falta la referencia del tablero vacío")
+        measured = self.measure()
+        occupancy = {}
+        for tag_id in self.tags:
+            stats = measured.get(tag_id)
+            reference = self.reference.get(tag_id)
+            if stats is None or reference is None:
+                occupancy[tag_id] = True
+                continue
+            occupancy[tag_id] = bool(abs(stats[0] - reference[0]) > self.mean_tolerance
+                                     or abs(stats[1] - reference[1]) > self.edge_tolerance)
+        print(f"Inventario: {sum(occupancy.values())} de {len(occupancy)} posiciones ocupadas")
+        return occupancy
+
+    @staticmethod
+    def save_reference(reference, path):
+        with open(path, 'w') as file:
+            json.dump({str(tag): list(stats) for tag, stats in reference.items()}, file, indent=4)
+
+    @staticmethod
+    def load_reference(path):
+        """Carga la referencia guardada, o devuelve None si no existe."""
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return None
+        except json.JSONDecodeError:
+            print(f"Error al decodificar {path}")
+            return None
+        return {int(tag): tuple(stats) for tag, stats in data.items()}
@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import deque
+
+from .cnc import CNCController
+from .estimador import MotionEstimator
+
+AXES = "XYZ"
+
+# Recorrido permitido de cada eje (coordenadas de trabajo tras el homing)
+AXIS_LIMITS = {
+    'X': (CNCController.MIN_XY, CNCController.MAX_X),
+    'Y': (CNCController.MIN_XY, CNCController.MAX_Y),
+    'Z': (CNCController.MIN_Z, 0.0),
+}
+
+
+class JogController:
+    """Jog continuo mientras se mantiene pulsado un botón, con `$J=` de GRBL.
+
+    Al empezar, un hilo envía incrementos cortos `$J=` hacia el límite del eje.
+    Cada incremento mide s = v² / (2·a·(N-1)), con N bloques del planificador,
+    así que los bloques encolados bastan para frenar desde la velocidad de jog
+    y la máquina no se detiene entre incrementos. Al soltar se envía el jog
+    cancel (0x85): GRBL frena en el acto y descarta los jogs pendientes.
+    Los destinos se dan en absoluto desde la posición de un reporte pedido al
+    empezar y se recortan a los límites de la máquina.
+    """
+
+    def __init__(self, cnc, init_commands=None, limits=None, feeds=None,
+                 planner_blocks=15, min_step_time=0.025, max_pending=2):
+        self.cnc = cnc
+        estimator = MotionEstimator.from_settings(init_commands)
+        self.max_rates = estimator.max_rates  # mm/s por eje
+        self.accels = estimator.accels  # mm/s² por eje
+        self.feeds = feeds  # mm/min por eje; por defecto la velocidad máxima
+        self.planner_blocks = planner_blocks
+        self.min_step_time = min_step_time  # Incrementos de al menos este tiempo
+        self.max_pending = max_pending  # Líneas sin `ok` antes de esperar
+        self.limits = limits or AXIS_LIMITS
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def active(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def step(self, axis):
+        """Devuelve (incremento en mm, avance en mm/min) del jog en un eje."""
+        i = AXES.index(axis)
+        feed = min(self.feeds[i] if self.feeds else self.max_rates[i] * 60.0, self.max_rates[i] * 60.0)
+        v = feed / 60.0
+        step = v ** 2 / (2.0 * self.accels[i] * (self.planner_blocks - 1))
+        return float(max(step, v * self.min_step_time)), float(feed)
+
+    def start(self, axis, direction):
+        """Empieza a mover `axis` ('X', 'Y' o 'Z') en el sentido de `direction`
+        (+1 o -1). No bloquea. Devuelve False si la máquina no puede hacer jog."""
+        if self.active:
+            return False
+        # Primera comprobación con el último reporte del sondeo, sin consultar:
+        # esto corre en el hilo de la UI. La posición de partida se pide en el
+        # hilo del jog
+        state = self.cnc.state
+        if state.state not in ("Idle", "Jog"):
+            print(f"No se puede hacer jog en estado {state.state}")
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(axis, direction),
+                                        name="cnc-jog", daemon=True)
+        self._thread.start()
+        return True
+
+    def _start_position(self, axis):
+        """Posición de trabajo del eje con la máquina parada, o None.
+
+        Un jog anterior puede seguir frenando (estado Jog) y el último reporte
+        del sondeo puede ir un periodo por detrás: se cancela lo que quede, se
+        espera a Idle y se pide un reporte nuevo antes de calcular destinos.
+        """
+        if self.cnc.state.state == "Jog":
+            self.cnc.jog_cancel()
+            self.cnc.wait_until(lambda state: state.state != "Jog", timeout=1)
+        self.cnc.query_status().result(timeout=0.5)
+        state = self.cnc.state
+        if state.state != "Idle":
+            print(f"No se puede hacer jog en estado {state.state}")
+            return None
+        return state.wpos[AXES.index(axis)]
+
+    def stop(self):
+        """Detiene el jog al instante. Se puede llamar desde el hilo de la UI."""
+        if not self.active:
+            return
+        self._stop.set()
+        self.cnc.jog_cancel()
+
+    def _run(self, axis, direction):
+        step, feed = self.step(axis)
+        low, high = self.limits[axis]
+        pending = deque()
+        try:
+            target = self._start_position(axis)
+            while target is not None and not self._stop.is_set():
+                target = min(max(target + direction * step, low), high)
+                pending.append(self.cnc.submit(f"$J=G90 {axis}{target:.3f} F{feed:.0f}"))
+                if target in (low, high):
+                    break  # Límite del eje: el jog termina solo
+                # GRBL contesta cuando el incremento entra en el planificador,
+                # así que esperar aquí mantiene el planificador lleno sin desbordarlo
+                while len(pending) >= self.max_pending:
+                    response = pending.popleft().result()[-1]
+                    if response != "ok":
+                        print(f"Jog rechazado por GRBL: {response}")
+                        self._stop.set()
+                        break
+            for future in pending:
+                future.result(timeout=1)
+        except Exception as e:
+            print(f"Error en el jog: {e}")
+        if self._stop.is_set():
+            # Un incremento que aún estaba en el buffer RX pudo entrar después
+            # del primer cancel
+            self.cnc.jog_cancel()
+
+
+class MoveCoalescer:
+    """Agrupa las pulsaciones rápidas de movimiento en un único destino.
+
+    Cada petición actualiza el destino pendiente de sus ejes (recortado a los
+    límites) y solo la primera programa un envío en el hilo de la CNC. El envío
+    espera `window` segundos desde la primera petición y manda un solo G0 con
+    el destino acumulado, así varias pulsaciones seguidas, o las que llegan
+    mientras la CNC está ocupada con otra acción, viajan en un solo comando.
+    """
+
+    def __init__(self, cnc, window=0.05, limits=None, callback=None):
+        self.cnc = cnc
+        self.window = window
+        self.limits = limits or AXIS_LIMITS
+        self.callback = callback  # Recibe el futuro de cada envío (errores)
+        self._lock = threading.Lock()
+        self._pending = {}  # Eje -> destino aún no enviado
+        self._first_request = 0.0
+        self._scheduled = False
+        self.requested = 0
+        self.sent = 0
+
+    def clamp(self, axis, value):
+        low, high = self.limits[axis]
+        return round(min(max(value, low), high), 3)
+
+    def pending_target(self, axis):
+        """Destino aún no enviado de un eje, o None."""
+        with self._lock:
+            return self._pending.get(axis)
+
+    def move_to(self, x=None, y=None, z=None):
+        """Pide mover a un destino absoluto. Devuelve {eje: destino recortado}
+        de los ejes indicados."""
+        targets = {axis: self.clamp(axis, value) for axis, value in zip(AXES, (x, y, z))
+                   if value is not None}
+        with self._lock:
+            self._pending.update(targets)
+            self.requested += 1
+            if not self._scheduled:
+                self._scheduled = True
+                self._first_request = time.monotonic()
+                self.cnc.run_in_background(self._flush, callback=self.callback)
+        return targets
+
+    def _flush(self):
+        delay = self._first_request + self.window - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        with self._lock:
+            targets, self._pending = self._pending, {}
+            self._scheduled = False
+        if targets:
+            self.sent += 1
+            self.cnc.move_to(**{axis.lower(): value for axis, value in targets.items()})
@@ -0,0 +1,154 @@
+import json
+
+from .cnc import CNCController
+from .GPIO import GPIOController
+from .coordenadas import TagStore
+from .altura import HeightMap
+
+MACHINES_FILE = './app/config/machines.json'
+
+# Sin machines.json se usa una sola máquina con la configuración de siempre
+DEFAULT_MACHINE = {
+    "name": "CNC",
+    "ports": ["/dev/ttyUSB0", "/dev/ttyUSB1"],
+    "relay_pin": 22,
+    "coordinates": "./app/config/coordinates_10.json",
+    "height_map": "./app/config/height_map.json",
+}
+
+
+class Machine:
+    """Una CNC del grupo: su controlador GRBL, su relé y sus coordenadas.
+
+    Cada CNCController tiene su hilo de E/S, su sondeo de estado, su
+    MachineState y su hilo de trabajos, así que las máquinas trabajan en
+    paralelo sin esperarse entre sí. `camera` indica la máquina que lleva la
+    cámara (la primera si ninguna lo indica).
+    """
+
+    def __init__(self, name, ports, coordinates, relay_pin=22, height_map=None, camera=False):
+        self.name = name
+        self.store = TagStore(coordinates)
+        self.cnc = CNCController(ports, init_commands=self.store.data.get('init'), name=name)
+        self.gpio = None  # Sin relé (relay_pin null o sin RPi.GPIO) la CNC va siempre encendida
+        if relay_pin is not None:
+            try:
+                self.gpio = GPIOController(pin_cnc=relay_pin)
+            except RuntimeError as e:
+                print(f"{name}: relé no disponible ({e})")
+        self.height_map_file = height_map or DEFAULT_MACHINE["height_map"]
+        self.height_map = HeightMap.load(self.height_map_file)
+        self.occupancy = None  # Posiciones con placa según el último inventario
+        self.camera = camera
+
+    @classmethod
+    def from_config(cls, config):
+        config = dict(DEFAULT_MACHINE, **config)
+        return cls(config["name"], config["ports"], config["coordinates"],
+                   relay_pin=config["relay_pin"], height_map=config["height_map"],
+                   camera=config.get("camera", False))
+
+
+class CNCPool:
+    """Varias CNC controladas desde el mismo proceso.
+
+    Los puertos de cada máquina deben ser suyos (mejor las rutas fijas de
+    /dev/serial/by-id que ttyUSBn, cuyo orden cambia al reiniciar): si dos
+    máquinas comparten puertos, la conexión de una puede quedarse con la otra.
+    """
+
+    def __init__(self, machines):
+        if not machines:
+            raise ValueError("El grupo necesita al menos una máquina")
+        self.machines = list(machines)
+        self._by_name = {machine.name: machine for machine in self.machines}
+        if len(self._by_name) != len(self.machines):
+            raise ValueError("Hay máquinas con el mismo nombre")
+        if not any(machine.camera for machine in self.machines):
+            self.machines[0].camera = True
+        self._listeners = {}  # (evento, callback) -> [(cnc, función registrada)]
+
+    @classmethod
+    def from_file(cls, path=MACHINES_FILE):
+        """Crea el grupo desde machines.json ({"machines": [...]}), o con una
+        sola máquina por defecto si el archivo no existe."""
+        try:
+            with open(path, 'r') as file:
+                configs = json.load(file).get("machines", [])
+        except FileNotFoundError:
+            configs = [DEFAULT_MACHINE]
+        except json.JSONDecodeError:
+            print(f"Error al decodificar {path}, se usa una sola máquina")
+            configs = [DEFAULT_MACHINE]
+        return cls([Machine.from_config(config) for config in configs])
+
+    def __iter__(self):
+        return iter(self.machines)
+
+    def __len__(self):
+        return len(self.machines)
+
+    def __getitem__(self, name):
+        return self._by_name[name]
+
+    @property
+    def names(self):
+        return [machine.name for machine in self.machines]
+
+    @property
+    def camera_machine(self):
+        return next(machine for machine in self.machines if machine.camera)
+
+    def add_listener(self, event, callback):
+        """Registra `callback(nombre de la máquina, dato)` en todas las máquinas."""
+        registered = self._listeners.setdefault((event, callback), [])
+        for machine in self.machines:
+            wrapper = lambda data, name=machine.name: callback(name, data)  # noqa: E731
+            machine.cnc.add_listener(event, wrapper)
+            registered.append((machine.cnc, wrapper))
+
+    def remove_listener(self, event, callback):
+        """Quita de todas las máquinas una función registrada con `add_listener`."""
+        for cnc, wrapper in self._listeners.pop((event, callback), []):
+            cnc.remove_listener(event, wrapper)
+
+    def summary(self):
+        """Estado de cada máquina: {nombre: estado GRBL}."""
+        return {machine.name: machine.cnc.state.state for machine in self.machines}
+
+    def run(self, name, func, *args, callback=None, **kwargs):
+        """Ejecuta una secuencia en el hilo de trabajos de una máquina."""
+        cnc = self[name].cnc
+        return cnc.run_in_background(func, *args, callback=callback, **kwargs)
+
+    def run_all(self, func, callback=None):
+        """Ejecuta `func(máquina)` en todas las máquinas a la vez, cada una en
+        su hilo de trabajos. Devuelve {nombre: futuro}."""
+        return {machine.name: machine.cnc.run_in_background(func, machine, callback=callback)
+                for machine in self.machines}
+
+    def submit_job(self, name, program):
+        """Encola un programa G-code en una máquina sin bloquear a las demás."""
+        cnc = self[name].cnc
+        return cnc.run_in_background(cnc.stream_commands, program)
+
+    def stop_all(self):
+        """Feed hold inmediato en todas las máquinas conectadas."""
+        for machine in self.machines:
+            if machine.cnc.connected:
+                machine.cnc.feed_hold()
+
+    def power(self, on):
+        """Activa o desactiva los relés de todas las máquinas."""
+        for machine in self.machines:
+            if machine.gpio is None:
+                continue
+            if on:
+                machine.gpio.activate_cnc()
+            else:
+                machine.gpio.deactivate_cnc()
+
+    def cleanup(self):
+        for machine in self.machines:
+            if machine.gpio is not None:
+                machine.gpio.cleanup()
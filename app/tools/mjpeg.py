@@ -0,0 +1,169 @@
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+BOUNDARY = "frame"
+
+INDEX_HTML = b"""<!DOCTYPE html>
+<html><head><title>Camara CNC</title></head>
+<body style="margin:0;background:#000">
+<img src="/stream" style="width:100%;height:auto">
+</body></html>
+"""
+
+
+class MJPEGServer:
+    """Servidor HTTP de vista previa con los frames que ya captura FrameCapture.
+
+    Sustituye a mjpg_streamer, que competía por la misma cámara UVC. Cada frame
+    se codifica en JPEG como mucho una vez, bajo demanda, sin importar cuántos
+    clientes haya; sin clientes no se codifica nada. Cada cliente tiene su hilo,
+    recibe siempre el último frame (nunca una cola) como máximo a `max_fps`, y
+    se desconecta si un envío tarda más de `send_timeout`, así un cliente lento
+    no acumula retraso ni frena la captura ni la vista previa local.
+
+    Rutas: `/` (página), `/stream` (multipart MJPEG) y `/snapshot` (un JPEG).
+    No hay autenticación: por defecto solo escucha en la propia máquina y hay
+    que pedir `host="0.0.0.0"` para publicar la cámara en la red.
+    """
+
+    def __init__(self, camera, host="127.0.0.1", port=8080, max_fps=10, quality=75,
+                 max_clients=4, send_timeout=2.0):
+        self.camera = camera
+        self.host = host
+        self.port = port
+        self.max_fps = max_fps
+        self.quality = quality
+        self.max_clients = max_clients
+        self.send_timeout = send_timeout
+        self._server = None
+        self._thread = None
+        self._encode_lock = threading.Lock()
+        self._encoded = (0, None)  # (número de frame, bytes JPEG)
+        self._clients = 0
+        self._clients_lock = threading.Lock()
+        self.frames_encoded = 0
+        self.clients_dropped = 0
+
+    def start(self):
+        """Arranca el servidor en un hilo. Devuelve False si no se pudo abrir el puerto."""
+        if self._server is not None:
+            return True
+        self.camera.start_capture()
+        handler = type("MJPEGHandler", (_MJPEGHandler,), {"mjpeg": self})
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        except OSError as e:
+            print(f"No se pudo abrir el servidor MJPEG en el puerto {self.port}: {e}")
+            return False
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mjpeg", daemon=True)
+        self._thread.start()
+        print(f"Vista previa MJPEG en http://{self.host}:{self.port}/")
+        return True
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def latest_jpeg(self):
+        """Devuelve (número de frame, JPEG) del último frame, codificándolo solo
+        si ningún cliente lo ha pedido antes."""
+        seq, _, frame = self.camera.get_latest_frame()
+        if frame is None:
+            return 0, None
+        with self._encode_lock:
+            if self._encoded[0] != seq:
+                ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                if ok:
+                    self._encoded = (seq, buffer.tobytes())
+                    self.frames_encoded += 1
+            return self._encoded
+
+    def _enter(self):
+        with self._clients_lock:
+            if self._clients >= self.max_clients:
+                return False
+            self._clients += 1
+            if self._clients == 1:
+                self.camera.add_viewer()
+            return True
+
+    def _leave(self):
+        with self._clients_lock:
+            self._clients -= 1
+            if self._clients == 0:
+                self.camera.remove_viewer()
+
+
+class _MJPEGHandler(BaseHTTPRequestHandler):
+    mjpeg = None  # MJPEGServer, asignado al crear el servidor
+
+    def log_message(self, format, *args):
+        pass  # Sin una línea por petición en la consola
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/":
+            self._send_body(INDEX_HTML, "text/html; charset=utf-8")
+        elif path == "/snapshot":
+            _, jpeg = self.mjpeg.latest_jpeg()
+            if jpeg is None:
+                self.send_error(503, "Sin frames de la cámara")
+            else:
+                self._send_body(jpeg, "image/jpeg")
+        elif path == "/stream":
+            self._stream()
+        else:
+            self.send_error(404)
+
+    def _send_body(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self):
+        server = self.mjpeg
+        if not server._enter():
+            self.send_error(503, "Demasiados clientes")
+            return
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            self.connection.settimeout(server.send_timeout)
+
+            interval = 1.0 / server.max_fps
+            last_seq = 0
+            next_send = time.monotonic()
+            while server._server is not None:
+                # Límite de fps por cliente: espera su turno y toma el frame más reciente
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                if server.camera.wait_for_frame(after_seq=last_seq, timeout=1.0) is None:
+                    continue
+                seq, jpeg = server.latest_jpeg()
+                if jpeg is None:
+                    continue
+                self.wfile.write(
+                    f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                    f"Content-Length: {len(jpeg)}\r\n\r\n".encode() + jpeg + b"\r\n")
+                last_seq = seq
+                next_send = max(next_send + interval, time.monotonic())
+        except socket.timeout:
+            server.clients_dropped += 1
+            print(f"Cliente MJPEG {self.client_address[0]} desconectado por lento")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # El cliente cerró la conexión
+        finally:
+            server._leave()
@@ -0,0 +1,106 @@
+from .estimador import MotionEstimator
+
+
+class TourPlanner:
+    """Ordena las paradas de un recorrido para minimizar el tiempo de máquina.
+
+    El coste de cada movimiento lo da MotionEstimator con la velocidad máxima
+    ($110-$112) y la aceleración ($120-$122) de los ejes, no la distancia. La
+    ruta inicial es la del vecino más cercano y se mejora con 2-opt y Or-opt.
+    """
+
+    def __init__(self, estimator):
+        self.estimator = estimator
+
+    @classmethod
+    def from_settings(cls, init_commands=None):
+        """Crea el planificador con los ajustes $ de GRBL (lista o bloque "init")."""
+        return cls(MotionEstimator.from_settings(init_commands))
+
+    def move_time(self, p, q):
+        """Tiempo estimado (s) del movimiento de `p` a `q` (XY o XYZ)."""
+        return float(self.estimator.pairwise_times([p, q])[0, 1])
+
+    def route_time(self, points, start=None, end=None):
+        """Tiempo total de recorrer los puntos en el orden dado."""
+        path = ([start] if start is not None else []) + list(points) + ([end] if end is not None else [])
+        cost = self.estimator.pairwise_times(path)
+        return float(sum(cost[i, i + 1] for i in range(len(path) - 1)))
+
+    def plan(self, stops, start=(0.0, 0.0), end=None):
+        """Ordena las paradas [(nombre, punto)] empezando en `start` y, si se
+        indica, terminando en `end`. Devuelve (paradas ordenadas, tiempo antes,
+        tiempo después)."""
+        points = [start] + [point for _, point in stops] + ([end] if end is not None else [])
+        n = len(points)
+        cost = self.estimator.pairwise_times(points).tolist()
+        last = n - 1 if end is not None else None
+        visits = list(range(1, n - 1 if end is not None else n))
+
+        def total(order):
+            path = [0] + order + ([last] if last is not None else [])
+            return sum(cost[a][b] for a, b in zip(path, path[1:]))
+
+        before = total(visits)
+        order = self._nearest_neighbour(cost, visits)
+        order = self._improve(cost, order, last)
+        after = total(order)
+
+        print(f"Ruta de {len(stops)} paradas: {before:.1f} s -> {after:.1f} s")
+        return [stops[i - 1] for i in order], before, after
+
+    @staticmethod
+    def _nearest_neighbour(cost, visits):
+        order = []
+        remaining = set(visits)
+        current = 0
+        while remaining:
+            current = min(remaining, key=lambda j: cost[current][j])
+            order.append(current)
+            remaining.remove(current)
+        return order
+
+    @staticmethod
+    def _improve(cost, order, last):
+        """Aplica 2-opt y Or-opt hasta que ningún cambio acorta la ruta."""
+        def length(order):
+            path = [0] + order + ([last] if last is not None else [])
+            return sum(cost[a][b] for a, b in zip(path, path[1:]))
+
+        def neighbours(order):
+            # 2-opt: invertir un tramo
+            for i in range(len(order) - 1):
+                for j in range(i + 1, len(order)):
+                    yield order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+            # Or-opt: mover tramos de 1 a 3 paradas, en cualquier sentido
+            for size in (1, 2, 3):
+                for i in range(len(order) - size + 1):
+                    segment = order[i:i + size]
+                    rest = order[:i] + order[i + size:]
+                    for j in range(len(rest) + 1):
+                        if j != i:
+                            yield rest[:j] + segment + rest[j:]
+                            yield rest[:j] + segment[::-1] + rest[j:]
+
+        best = length(order)
+        improved = True
+        while improved:
+            improved = False
+            for candidate in neighbours(order):
+                candidate_length = length(candidate)
+                if candidate_length < best - 1e-9:
+                    order, best, improved = candidate, candidate_length, True
+                    break
+        return order
+
+
+def collect_stops(data, include_areas=True):
+    """Paradas de un recorrido por todas las placas a partir del JSON de
+    coordenadas: los tags y, opcionalmente, las zonas de trabajo, revisión y
+    entrega. Devuelve [(nombre, (x, y))]."""
+    stops = [(tag['tag'], tuple(tag['location'][:2])) for tag in data.get('tags', [])]
+    if include_areas:
+        for area in ('work_area', 'check_area', 'delivery_area'):
+            if area in data:
+                stops.append((area, tuple(data[area][:2])))
+    return stops
@@ -0,0 +1,127 @@
+from .cnc import CNCController
+
+
+class JobBuilder:
+    """Convierte una secuencia de operaciones sobre tags en un único programa G-code.
+
+    Cada visita sube a la Z segura, hace un rápido en XY, baja a la Z del tag y
+    opcionalmente espera o recoge la placa. El programa se valida contra los
+    límites de la máquina antes de enviarlo y se transmite de una vez con
+    `CNCController.stream_commands`; GRBL solo se sincroniza en los puntos de
+    control (`G4 P0`, cuyo `ok` llega cuando el planificador se vacía).
+    """
+
+    def __init__(self, data, safe_z=0.0, probe_feed=200, limits=None, height_map=None,
+                 approach=2.0, pick_margin=2.0):
+        self.tags = {tag['tag']: tag for tag in data.get('tags', [])}
+        calibration = data.get('calibration', {})
+        self.laser_drop = calibration.get('laser-drop', -11)  # Bajada al recoger (mm)
+        self.pick_limit = data.get('pick_limit')  # Z mínima al recoger, si se indica
+        self.pick_margin = pick_margin  # mm que la recogida puede bajar del tag
+        self.safe_z = safe_z
+        self.probe_feed = probe_feed  # mm/min de la bajada al recoger
+        # Con un HeightMap la Z de cada tag sale de la superficie medida: el
+        # rápido llega a `approach` mm sobre la placa y la bajada lenta es corta
+        self.height_map = height_map
+        self.approach = approach
+        self.limits = limits or {
+            'min_xy': CNCController.MIN_XY,
+            'max_x': CNCController.MAX_X,
+            'max_y': CNCController.MAX_Y,
+            'min_z': CNCController.MIN_Z,
+        }
+        self.lines = ["G90", "G21"]  # Coordenadas absolutas en milímetros
+        self._targets = []  # (línea, x, y, z) para validar
+        self._z = None  # Z conocida tras la última línea (None tras recoger)
+
+    def _move(self, x=None, y=None, z=None):
+        if x is None and y is None and z == self._z:
+            return  # Ya está a esa altura
+        command = "G0"
+        if x is not None:
+            command += f" X{x:.3f}"
+        if y is not None:
+            command += f" Y{y:.3f}"
+        if z is not None:
+            command += f" Z{z:.3f}"
+        self.lines.append(command)
+        self._targets.append((command, x, y, z))
+        if z is not None:
+            self._z = z
+
+    def visit(self, tag_id, dwell=0.0, pick=False, z=None):
+        """Añade la visita a un tag: Z segura, rápido en XY y bajada a la Z del tag.
+
+        `dwell` añade una espera en segundos al llegar y `pick` la bajada de
+        recogida (`laser-drop`, detenida al tocar con G38.3) seguida de la
+        subida absoluta a la Z segura. La bajada no pasa de `pick_margin` mm
+        bajo el tag, ni de `pick_limit` ni de MIN_Z. `z` sustituye a la Z de `location`; con
+        mapa de alturas la Z es la de la superficie en (x, y), más el alto de
+        la placa (`height` del tag) y `approach`.
+        """
+        tag = self.tags[tag_id]
+        x, y, tag_z = tag['location']
+        if self.height_map is not None:
+            tag_z = self.height_map.height(x, y) + tag.get('height', 0)
+        if z is None:
+            if self.height_map is not None:
+                z = min(tag_z + self.approach, self.safe_z)
+            else:
+                z = tag_z
+        self._move(z=self.safe_z)
+        self._move(x=x, y=y)
+        self._move(z=z)
+        if dwell:
+            self.lines.append(f"G4 P{dwell:.3f}")
+        if pick:
+            # La bajada se detiene al tocar; su recorrido no pasa del tag ni del límite de Z
+            pick_z = max(z + self.laser_drop, tag_z - self.pick_margin, self.limits['min_z'])
+            if self.pick_limit is not None:
+                pick_z = max(pick_z, self.pick_limit)
+            self.lines.append(f"G38.3 Z{pick_z:.3f} F{self.probe_feed}")
+            self._targets.append((self.lines[-1], None, None, pick_z))
+            # Subida en absoluto (validada) en lugar de un G91 relativo al toque
+            self._z = None  # La recogida termina donde tocó
+        self._move(z=self.safe_z)
+        return self
+
+    def move_to_point(self, point):
+        """Añade un desplazamiento a un punto [x, y, z] (p. ej. `delivery_area`)
+        pasando por la Z segura."""
+        x, y = point[0], point[1]
+        self._move(z=self.safe_z)
+        self._move(x=x, y=y)
+        if len(point) > 2:
+            self._move(z=point[2])
+        return self
+
+    def checkpoint(self):
+        """Añade un punto de sincronización: su `ok` llega con la máquina parada."""
+        self.lines.append("G4 P0")
+        return self
+
+    def validate(self):
+        """Comprueba que ningún destino sale de los límites de la máquina."""
+        errors = []
+        if self.pick_limit is not None and not self.limits['min_z'] <= self.pick_limit <= 0:
+            errors.append(f"pick_limit {self.pick_limit}: fuera del recorrido de Z")
+        for command, x, y, z in self._targets:
+            if x is not None and not self.limits['min_xy'] <= x <= self.limits['max_x']:
+                errors.append(f"{command}: X fuera de límites")
+            if y is not None and not self.limits['min_xy'] <= y <= self.limits['max_y']:
+                errors.append(f"{command}: Y fuera de límites")
+            if z is not None and not self.limits['min_z'] <= z <= 0:
+                errors.append(f"{command}: Z fuera de límites")
+        if errors:
+            raise ValueError("Programa fuera de límites:\n" + "\n".join(errors))
+
+    def build(self):
+        """Devuelve las líneas del programa validado, terminado en un punto de control."""
+        self.validate()
+        if self.lines[-1] != "G4 P0":
+            self.checkpoint()
+        return list(self.lines)
+
+    def run(self, cnc):
+        """Valida y transmite el programa; devuelve las respuestas de GRBL."""
+        return cnc.stream_commands(self.build())
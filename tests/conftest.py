@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+# El código de la aplicación se importa como en app/ (`from tools...`)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+from tools.cnc import CNCController  # noqa: E402
+from tools.grbl_virtual import VirtualGrbl  # noqa: E402
+
+
+@pytest.fixture
+def grbl():
+    grbl = VirtualGrbl(time_scale=10.0)
+    grbl.start()
+    yield grbl
+    grbl.stop()
+
+
+@pytest.fixture
+def cnc(grbl):
+    """Controlador conectado al GRBL virtual y desbloqueado (arranca en alarma
+    porque los ajustes por defecto activan el homing)."""
+    cnc = CNCController([grbl.port], poll_rate=50)
+    cnc.connect()
+    assert cnc.send_command("$X") == "ok"
+    cnc.wait_until(lambda state: state.state == "Idle", timeout=2)
+    yield cnc
+    cnc.disconnect()
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from tools.altura import HeightMap, tag_bounds
+
+
+def plane(x, y):
+    return 0.5 + 0.02 * x - 0.01 * y
+
+
+def test_bilinear_reproduces_plane():
+    xs, ys = np.meshgrid(np.arange(0, 50, 10.0), np.arange(0, 40, 10.0))
+    height_map = HeightMap((0, 0), (10, 10), plane(xs, ys))
+    for x, y in ((0, 0), (12.5, 7.3), (39.9, 29.9), (25, 15)):
+        assert height_map.height(x, y) == pytest.approx(plane(x, y))
+
+
+def test_bilinear_inside_cell():
+    height_map = HeightMap((0, 0), (10, 10), [[0, 1], [2, 4]])
+    assert height_map.height(5, 5) == pytest.approx((0 + 1 + 2 + 4) / 4)
+    assert height_map.height(10, 0) == pytest.approx(1)
+    assert height_map.height(0, 10) == pytest.approx(2)
+
+
+def test_outside_grid_uses_edge():
+    height_map = HeightMap((0, 0), (10, 10), [[0, 1], [2, 4]])
+    assert height_map.height(-5, 0) == pytest.approx(0)
+    assert height_map.height(50, 50) == pytest.approx(4)
+
+
+def test_vectorized_matches_scalar():
+    rng = np.random.default_rng(1)
+    height_map = HeightMap((5, -5), (7.5, 4.0), rng.normal(size=(6, 8)))
+    xs = rng.uniform(-10, 70, 200)
+    ys = rng.uniform(-10, 30, 200)
+    expected = [height_map.height(x, y) for x, y in zip(xs, ys)]
+    assert height_map.heights(xs, ys) == pytest.approx(expected)
+
+
+def test_save_and_load(tmp_path):
+    height_map = HeightMap((0, 0), (10, 10), [[0, 1.25], [2, 4]])
+    path = tmp_path / "height_map.json"
+    height_map.save(str(path))
+    loaded = HeightMap.load(str(path))
+    assert loaded.bounds == height_map.bounds
+    assert loaded.height(3, 4) == pytest.approx(height_map.height(3, 4))
+    assert HeightMap.load(str(tmp_path / "missing.json")) is None
+
+
+def test_tag_bounds_include_width():
+    data = {"tags": [{"location": [10, 20, 0], "width": 4}, {"location": [30, 5, 0]}]}
+    assert tag_bounds(data, margin=1) == (7, 31, 4, 23)
@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+import serial
+
+from tools.grbl_virtual import VirtualGrbl
+
+
+def test_stream_commands_respects_rx_buffer(cnc, grbl):
+    program = [f"G1 X{10 + i % 7} Y{10 + i % 5} F3000" for i in range(150)] + ["G4 P0"]
+    results = cnc.stream_commands(program)
+    assert [line for line, _ in results] == program
+    assert all(response == "ok" for _, response in results)
+    assert grbl.rx_overflows == 0
+    assert grbl.lines_received >= len(program)
+
+
+def test_writer_without_character_counting_overflows_rx(grbl):
+    """El emulador detecta los desbordes que el conteo de caracteres evita."""
+    port = serial.Serial(grbl.port, 115200, timeout=0.1)
+    try:
+        port.write(b"".join(f"G1 X{i % 9} Y{i % 7} F100\n".encode() for i in range(40)))
+        port.flush()
+        deadline = time.monotonic() + 2
+        while grbl.rx_overflows == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        port.close()
+    assert grbl.rx_overflows > 0
+
+
+def test_stream_commands_reports_errors(cnc):
+    results = cnc.stream_commands(["G0 X1", "G999", "G0 X2"])
+    assert results[0][1] == "ok"
+    assert results[1][1].startswith("error")
+    assert results[2][1] == "ok"
+
+
+def test_jog_cancel_stops_and_flushes_jogs(cnc):
+    assert cnc.send_command("$J=G91 X50 F600") == "ok"
+    cnc.wait_until(lambda state: state.state == "Jog", timeout=5)
+    assert cnc.jog_cancel() is not False
+    cnc.wait_until(lambda state: state.state == "Idle", timeout=5)
+    x = cnc.state.wpos[0]
+    assert 0 < x < 50
+    # Nada del jog queda en el planificador
+    time.sleep(0.2)
+    assert cnc.state.wpos[0] == pytest.approx(x, abs=0.01)
+    assert cnc.send_command("G0 X1") == "ok"
+
+
+def test_wait_raises_on_alarm(cnc, grbl):
+    cnc.move_to(x=150)
+    threading.Timer(0.05, grbl.trigger_alarm, args=(1,)).start()
+    with pytest.raises(RuntimeError, match="ALARM:1"):
+        cnc.wait_for_position_reached(x=150, timeout=10)
+
+
+def test_realtime_ignored_when_not_connected():
+    grbl = VirtualGrbl()
+    grbl.start()
+    try:
+        from tools.cnc import CNCController
+        cnc = CNCController([grbl.port])
+        assert cnc.feed_hold() is False
+        assert not cnc.connected
+    finally:
+        grbl.stop()
@@ -0,0 +1,40 @@
+import time
+
+import pytest
+
+from tools.cnc import CNCController
+from tools.estimador import MotionEstimator
+from tools.grbl_virtual import VirtualGrbl
+
+
+@pytest.fixture
+def realtime_cnc():
+    grbl = VirtualGrbl(time_scale=1.0)
+    grbl.start()
+    cnc = CNCController([grbl.port], poll_rate=100)
+    cnc.connect()
+    cnc.send_command("$X")
+    yield cnc
+    cnc.disconnect()
+    grbl.stop()
+
+
+def test_single_move_matches_estimate(realtime_cnc):
+    estimator = MotionEstimator.from_settings()
+    expected = estimator.estimate(["G0 X40"], start=(0.0, 0.0, 0.0))[1]
+    start = time.monotonic()
+    realtime_cnc.move_to(x=40)
+    realtime_cnc.wait_for_position_reached(x=40, timeout=10)
+    elapsed = time.monotonic() - start
+    # El sondeo de estado a 100 Hz añade como mucho unos 10 ms
+    assert elapsed == pytest.approx(expected, abs=0.05)
+
+
+def test_program_with_junctions_matches_estimate(realtime_cnc):
+    program = [f"G1 X{20 + 5 * (i % 2)} Y{4 * i} F3000" for i in range(1, 10)]
+    estimator = MotionEstimator.from_settings()
+    expected = estimator.estimate(program, start=(0.0, 0.0, 0.0))[1]
+    start = time.monotonic()
+    realtime_cnc.stream_commands(program + ["G4 P0"])
+    elapsed = time.monotonic() - start
+    assert elapsed == pytest.approx(expected, rel=0.1)
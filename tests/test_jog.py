@@ -0,0 +1,30 @@
+import time
+
+from tools.jog import JogController
+
+
+def test_jog_moves_while_held_and_stops_on_release(cnc):
+    jog = JogController(cnc)
+    assert jog.start('X', 1)
+    time.sleep(0.3)
+    jog.stop()
+    jog._thread.join(timeout=2)
+    cnc.wait_until(lambda state: state.state == "Idle", timeout=5)
+    assert cnc.state.wpos[0] > 0
+
+
+def test_jog_restart_while_draining_never_goes_backwards(cnc, grbl):
+    jog = JogController(cnc)
+    assert jog.start('X', 1)
+    time.sleep(0.3)
+    jog.stop()
+    jog._thread.join(timeout=2)
+    # Nueva pulsación en el mismo sentido mientras la caché aún puede decir Jog
+    assert jog.start('X', 1)
+    time.sleep(0.05)
+    start_x = cnc.state.wpos[0]
+    time.sleep(0.2)
+    jog.stop()
+    jog._thread.join(timeout=2)
+    cnc.wait_until(lambda state: state.state == "Idle", timeout=5)
+    assert cnc.state.wpos[0] >= start_x